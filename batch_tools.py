@@ -0,0 +1,218 @@
+import os
+import logging
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Optional, Union
+
+from dedup_tools import fingerprint_file
+from pdf_tools import process_single_pdf, prepare_template
+from zip_tools import ZipError
+
+DEFAULT_MAX_WORKERS = 1
+# Jumlah tugas yang boleh antre per worker. Cukup untuk menjaga semua core
+# tetap sibuk tanpa menumpuk hasil (bytes PDF) di memori.
+TASKS_PER_WORKER = 4
+
+@dataclass
+class BatchResult:
+    """Hasil pemrosesan satu file di dalam batch."""
+    index: int
+    file_path: str
+    new_name: Optional[str]
+    # bytes hasil baca, atau path sumber jika diproses dengan return_path=True
+    content: Optional[Union[bytes, str]]
+    error: Optional[str]
+    unexpected: bool = False
+    # Path dokumen asli jika isi file ini sama dengan dokumen yang sudah ada.
+    duplicate_of: Optional[str] = None
+
+def get_max_workers_limit():
+    """Batas atas jumlah proses paralel yang masuk akal untuk mesin ini."""
+    return max(1, os.cpu_count() or 1)
+
+def resolve_duplicate_name(new_name, taken_names):
+    """
+    Menghasilkan nama unik dengan menambahkan akhiran _1, _2, ... jika
+    nama sudah dipakai oleh file lain di dalam batch yang sama.
+    """
+    counter = 1
+    original_new_name = new_name
+    while new_name in taken_names:
+        name_part, ext = original_new_name.rsplit('.', 1)
+        new_name = f"{name_part}_{counter}.{ext}"
+        counter += 1
+    return new_name
+
+def process_batch_file(index, file_path, template, template_name, return_path=False):
+    """Dijalankan di proses worker; semua error dikembalikan sebagai BatchResult."""
+    try:
+        new_name, content, error_msg = process_single_pdf(file_path, template, template_name, return_path)
+        return BatchResult(index, file_path, new_name, content, error_msg)
+    except Exception as e:
+        return BatchResult(index, file_path, None, None, f"Error tak terduga: {e}", unexpected=True)
+
+def iter_batch_results(file_paths, template, template_name, max_workers=DEFAULT_MAX_WORKERS, should_stop=None,
+                       return_path=False):
+    """
+    Memproses daftar file dan menghasilkan BatchResult sesuai urutan input.
+
+    Dengan max_workers > 1 pekerjaan dikirim ke ProcessPoolExecutor; hasil
+    tetap di-yield berurutan sehingga log, progress, dan penyelesaian nama
+    duplikat identik dengan mode satu proses.
+
+    Dengan return_path=True hasil membawa path sumber alih-alih bytes, sehingga
+    isi PDF tidak perlu dikirim antar proses maupun ditahan di memori.
+
+    Template kustom dikompilasi sekali di sini, sehingga worker hanya
+    melakukan pencocokan per file.
+    """
+    should_stop = should_stop or (lambda: False)
+    template = prepare_template(template, template_name)
+    max_workers = max(1, min(int(max_workers or 1), get_max_workers_limit()))
+
+    if max_workers == 1:
+        for i, file_path in enumerate(file_paths):
+            if should_stop(): return
+            yield process_batch_file(i, file_path, template, template_name, return_path)
+        return
+
+    logging.info(f"Menjalankan batch dengan {max_workers} proses paralel")
+    executor = ProcessPoolExecutor(max_workers=max_workers)
+    pending = deque()
+    paths = iter(enumerate(file_paths))
+    try:
+        while True:
+            while len(pending) < max_workers * TASKS_PER_WORKER:
+                next_item = next(paths, None)
+                if next_item is None: break
+                i, file_path = next_item
+                pending.append((i, file_path, executor.submit(process_batch_file, i, file_path, template, template_name, return_path)))
+            if not pending: return
+            if should_stop(): return
+
+            i, file_path, future = pending.popleft()
+            try:
+                result = future.result()
+            except Exception as e:
+                result = BatchResult(i, file_path, None, None, f"Error tak terduga: {e}", unexpected=True)
+            yield result
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+@dataclass
+class BatchSummary:
+    """Ringkasan satu batch yang sudah dijalankan oleh run_batch."""
+    total: int
+    success_count: int = 0
+    error_count: int = 0
+    duplicate_count: int = 0
+    cancelled: bool = False
+
+def find_duplicates(file_paths, duplicates):
+    """
+    Menghitung sidik setiap file (tanpa fitz) dan mencocokkannya dengan
+    indeks duplikat, termasuk dengan file lain di batch yang sama.
+    Mengembalikan ({path: Fingerprint}, {path: path dokumen asli}).
+    """
+    fingerprints, duplicate_of = {}, {}
+    for path in file_paths:
+        try:
+            fingerprint = fingerprint_file(path)
+        except OSError:
+            # File yang tidak bisa dibaca tetap diproses agar error-nya dilaporkan pdf_tools.
+            continue
+        original = duplicates.find(fingerprint)
+        if original: duplicate_of[path] = original
+        else: duplicates.remember(fingerprint)
+        fingerprints[path] = fingerprint
+    return fingerprints, duplicate_of
+
+def _merge_skipped(results, positions, skipped, should_stop):
+    """Menyisipkan hasil file yang dilewati (tanpa diproses) sesuai urutan input."""
+    next_index = 0
+    for result in results:
+        index = positions[result.index]
+        while next_index < index:
+            if next_index in skipped: yield skipped[next_index]
+            next_index += 1
+        result.index = index
+        yield result
+        next_index = index + 1
+    if should_stop(): return
+    for index in sorted(i for i in skipped if i >= next_index): yield skipped[index]
+
+def run_batch(file_paths, template, template_name, writer, max_workers=DEFAULT_MAX_WORKERS,
+              should_stop=None, on_result=None, reserved_names=(), duplicates=None, skip_duplicates=True,
+              journal=None):
+    """
+    Menjalankan satu batch dan menulis setiap file yang berhasil ke writer
+    (ZipStreamWriter atau DirectoryWriter) segera setelah selesai diproses.
+
+    on_result(result, output_name) dipanggil untuk setiap file sesuai urutan
+    input; output_name adalah nama akhir di output, atau None jika gagal.
+    Writer tidak ditutup di sini: pemanggil memutuskan close() atau abort()
+    berdasarkan BatchSummary yang dikembalikan.
+    reserved_names berisi nama yang sudah ada di output (mis. hasil yang
+    dibawa dari run sebelumnya pada mode inkremental).
+
+    Dengan duplicates (DuplicateIndex), file yang isinya sama dengan dokumen
+    dari run sebelumnya atau dengan file lain di batch ini dikenali sebelum
+    PDF dibuka: dilewati jika skip_duplicates, selain itu tetap diproses dan
+    hanya ditandai lewat result.duplicate_of. Dokumen yang berhasil ditulis
+    dicatat ke indeks.
+
+    journal (JobRun dari journal_tools) menerima hasil setiap file segera
+    setelah file itu ditulis ke writer, agar batch bisa dilanjutkan setelah
+    crash.
+    """
+    should_stop = should_stop or (lambda: False)
+    summary = BatchSummary(total=len(file_paths))
+    written_names = set(reserved_names)
+
+    fingerprints, duplicate_of, skipped = {}, {}, {}
+    if duplicates is not None: fingerprints, duplicate_of = find_duplicates(file_paths, duplicates)
+    if skip_duplicates and duplicate_of:
+        positions = []
+        for i, path in enumerate(file_paths):
+            if path in duplicate_of:
+                skipped[i] = BatchResult(i, path, None, None, f"Duplikat dari {duplicate_of[path]}",
+                                         duplicate_of=duplicate_of[path])
+            else:
+                positions.append(i)
+        process_paths = [file_paths[i] for i in positions]
+    else:
+        positions, process_paths = range(len(file_paths)), file_paths
+
+    results = iter_batch_results(process_paths, template, template_name, max_workers=max_workers,
+                                 should_stop=should_stop, return_path=True)
+    handled = 0
+    for result in _merge_skipped(results, positions, skipped, should_stop):
+        handled += 1
+        output_name = None
+        result.duplicate_of = result.duplicate_of or duplicate_of.get(result.file_path)
+        if result.duplicate_of: summary.duplicate_count += 1
+        if result.new_name and result.content:
+            new_name = resolve_duplicate_name(result.new_name, written_names)
+            try:
+                output_name = writer.add(new_name, result.content)
+            except ZipError as e:
+                # Arsip yang rusak menghentikan batch; sumber yang gagal dibaca hanya menggagalkan file ini.
+                if getattr(writer, "aborted", False): raise
+                result.error = f"Gagal menulis hasil: {e}"
+            if output_name is None:
+                result.error = result.error or "File sumber kosong atau tidak dapat dibaca saat ditulis ke output"
+        if output_name:
+            written_names.update((new_name, output_name))
+            summary.success_count += 1
+            fingerprint = fingerprints.get(result.file_path)
+            if fingerprint is not None and not result.duplicate_of: duplicates.add(fingerprint)
+        elif result.index not in skipped:
+            summary.error_count += 1
+            result.error = result.error or "Gagal memproses file"
+        if journal is not None: journal.record(result.file_path, output_name, result.error, result.index in skipped)
+        if on_result: on_result(result, output_name)
+
+    # Stop yang ditekan setelah file terakhir selesai tidak membatalkan hasil yang sudah lengkap.
+    summary.cancelled = handled < len(file_paths) and should_stop()
+    return summary
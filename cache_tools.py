@@ -0,0 +1,404 @@
+import hashlib
+import inspect
+import json
+import logging
+import marshal
+import multiprocessing.util
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+
+from utils import get_app_data_dir
+
+TEXT_CACHE_FILENAME = "text_cache.sqlite3"
+DEFAULT_TEXT_CACHE_MAX_BYTES = 512 * 1024 * 1024
+RESULT_CACHE_FILENAME = "result_cache.sqlite3"
+DEFAULT_RESULT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+HASH_CACHE_FILENAME = "hash_cache.sqlite3"
+DEFAULT_HASH_CACHE_MAX_BYTES = 16 * 1024 * 1024
+# File yang baru diubah kurang dari sekian detik tidak di-cache hash-nya:
+# pada filesystem dengan resolusi mtime kasar, perubahan berikutnya dalam
+# detik yang sama tidak akan mengubah signature stat.
+HASH_CACHE_MIN_AGE = 2.0
+# Eviction menurunkan ukuran sampai fraksi ini dari batas, agar tidak
+# terjadi eviction kecil berulang untuk setiap entri baru.
+EVICTION_TARGET_RATIO = 0.9
+# Total ukuran cache diperiksa setiap sekian kali put, bukan setiap put.
+EVICTION_CHECK_INTERVAL = 64
+# Counter hit/miss dan waktu akses terakhir dikumpulkan di memori lalu
+# ditulis sekaligus setiap sekian lookup atau detik, bukan per lookup.
+STATS_FLUSH_INTERVAL = 64
+STATS_FLUSH_SECONDS = 5.0
+# last_used hanya diperbarui jika lebih tua dari ini; cukup untuk urutan LRU.
+LAST_USED_REFRESH_SECONDS = 3600.0
+HASH_CHUNK_SIZE = 1024 * 1024
+TEXT_COMPRESSION_LEVEL = 6
+
+def hash_bytes(content):
+    return hashlib.sha256(content).hexdigest()
+
+def hash_file(file_path, chunk_size=HASH_CHUNK_SIZE):
+    """SHA-256 isi file, dibaca bertahap agar file besar tidak dimuat utuh ke memori."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk: break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _code_names(code):
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if inspect.iscode(const): names |= _code_names(const)
+    return names
+
+def source_fingerprint(*objects):
+    """
+    Hash versi dari kode sumber fungsi/kelas/modul beserta semua global
+    modul yang sama yang dirujuknya (fungsi helper, kelas, regex
+    terkompilasi, konstanta), ditelusuri secara rekursif. Mengubah satu
+    fungsi ekstraktor hanya mengubah fingerprint yang bergantung padanya.
+    Jika source tidak tersedia (mis. aplikasi dibekukan), bytecode dipakai.
+    """
+    digest = hashlib.sha256()
+    seen = set()
+
+    def update(value):
+        digest.update(value if isinstance(value, bytes) else str(value).encode('utf-8'))
+        digest.update(b"\0")
+
+    def visit(obj, module=None):
+        if isinstance(obj, (staticmethod, classmethod)): obj = obj.__func__
+        elif isinstance(obj, property): obj = obj.fget
+        elif hasattr(obj, "func") and hasattr(obj, "attrname"): obj = obj.func  # cached_property
+        if inspect.ismodule(obj):
+            # Modul hanya ditelusuri jika diberikan langsung, bukan lewat import.
+            if module is not None: return
+        elif inspect.isfunction(obj) or inspect.isclass(obj):
+            # Global hasil import dari modul lain tidak ikut; modul itu diberi fingerprint sendiri.
+            if module is not None and obj.__module__ != module: return
+        if id(obj) in seen: return
+        seen.add(id(obj))
+        if inspect.ismodule(obj):
+            for name, member in sorted(vars(obj).items()):
+                if getattr(member, "__module__", obj.__name__) == obj.__name__ and not name.startswith("__"):
+                    update(name)
+                    visit(member, obj.__name__)
+        elif inspect.isfunction(obj):
+            try:
+                update(inspect.getsource(obj))
+            except (OSError, TypeError):
+                update(marshal.dumps(obj.__code__))
+            for name in sorted(_code_names(obj.__code__)):
+                if name in obj.__globals__: visit(obj.__globals__[name], obj.__module__)
+        elif inspect.isclass(obj):
+            update(obj.__qualname__)
+            for name, member in vars(obj).items():
+                if not name.startswith("__") or name == "__init__":
+                    update(name)
+                    visit(member, obj.__module__)
+        elif isinstance(obj, re.Pattern):
+            update(repr((obj.pattern, obj.flags)))
+        elif isinstance(obj, dict):
+            for key, value in obj.items():
+                update(repr(key))
+                visit(value, module)
+        elif isinstance(obj, (list, tuple)):
+            for value in obj: visit(value, module)
+        elif isinstance(obj, (set, frozenset)):
+            update(repr(sorted(map(repr, obj))))
+        elif isinstance(obj, (str, bytes, int, float, bool, type(None))):
+            update(repr(obj))
+
+    for obj in objects: visit(obj)
+    return digest.hexdigest()
+
+@dataclass
+class CacheStats:
+    """
+    Statistik cache; hits/misses dijumlahkan dari semua proses yang memakai
+    file cache yang sama (counter proses lain masuk setelah di-flush).
+    """
+    hits: int = 0
+    misses: int = 0
+    entries: int = 0
+    total_bytes: int = 0
+    max_bytes: int = 0
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def summary(self):
+        return (f"Cache: {self.hits} hit, {self.misses} miss ({self.hit_rate:.0%}), "
+                f"{self.entries} entri, {self.total_bytes / 1024 / 1024:.1f}/{self.max_bytes / 1024 / 1024:.0f} MB")
+
+class BlobCache:
+    """
+    Cache key -> bytes di satu file SQLite dengan batas ukuran dan eviction
+    LRU (berdasarkan waktu akses terakhir). Aman dipakai dari beberapa proses
+    worker sekaligus (mode WAL); setiap proses membuka koneksinya sendiri
+    secara lazy. Semua error SQLite hanya dicatat di log dan diperlakukan
+    sebagai miss, sehingga cache tidak pernah menggagalkan pemrosesan.
+
+    Lookup hanya membaca: counter hit/miss dan last_used yang sudah basi
+    dikumpulkan di memori lalu ditulis dalam satu transaksi (setiap
+    STATS_FLUSH_INTERVAL lookup, STATS_FLUSH_SECONDS detik, saat put, dan
+    saat proses berakhir).
+    """
+    def __init__(self, path, max_bytes):
+        self.path = str(path)
+        self.max_bytes = max_bytes
+        self._conn = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._puts_since_check = 0
+        self._reset_pending()
+        self.disabled = False
+
+    def _reset_pending(self):
+        self._hits = 0
+        self._misses = 0
+        self._touched = {}
+        self._last_flush = time.monotonic()
+
+    def _connect(self):
+        # Koneksi SQLite tidak boleh dipakai lintas fork: buka ulang di proses anak.
+        if self._conn is not None and self._pid == os.getpid(): return self._conn
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB NOT NULL, "
+                     "size INTEGER NOT NULL, last_used REAL NOT NULL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+        conn.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        with conn:
+            conn.execute("INSERT OR IGNORE INTO stats VALUES ('hits', 0), ('misses', 0)")
+        if self._pid != os.getpid():
+            # Counter tertunda warisan fork milik proses induk; proses ini
+            # menulis counternya sendiri saat berakhir.
+            self._reset_pending()
+            multiprocessing.util.Finalize(self, self.flush, exitpriority=0)
+        self._conn, self._pid = conn, os.getpid()
+        return conn
+
+    def _run(self, action):
+        if self.disabled: return None
+        with self._lock:
+            try:
+                return action(self._connect())
+            except sqlite3.Error as e:
+                logging.warning(f"Cache {self.path} tidak dapat dipakai: {e}")
+                if self._pid != os.getpid() or self._conn is None: self.disabled = True
+                return None
+
+    def get(self, key):
+        def lookup(conn):
+            row = conn.execute("SELECT value, last_used FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+                now = time.time()
+                if now - row[1] >= LAST_USED_REFRESH_SECONDS: self._touched[key] = now
+            if (self._hits + self._misses >= STATS_FLUSH_INTERVAL or
+                    time.monotonic() - self._last_flush >= STATS_FLUSH_SECONDS):
+                self._flush(conn)
+            return None if row is None else row[0]
+        return self._run(lookup)
+
+    def _flush(self, conn):
+        """Menulis counter hit/miss dan last_used yang tertunda dalam satu transaksi."""
+        if self._hits or self._misses or self._touched:
+            with conn:
+                conn.executemany("UPDATE stats SET value = value + ? WHERE name = ?",
+                                 ((self._hits, 'hits'), (self._misses, 'misses')))
+                conn.executemany("UPDATE entries SET last_used = ? WHERE key = ?",
+                                 ((used, key) for key, used in self._touched.items()))
+        self._reset_pending()
+
+    def flush(self):
+        """Menulis counter yang tertunda sekarang (dipanggil otomatis saat proses berakhir)."""
+        if self._conn is not None and self._pid == os.getpid(): self._run(self._flush)
+
+    def put(self, key, value):
+        def store(conn):
+            self._flush(conn)
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)", (key, value, len(value), time.time()))
+            self._puts_since_check += 1
+            if self._puts_since_check >= EVICTION_CHECK_INTERVAL:
+                self._puts_since_check = 0
+                self._evict(conn)
+        self._run(store)
+
+    def _evict(self, conn):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes: return
+        excess = total - int(self.max_bytes * EVICTION_TARGET_RATIO)
+        keys, freed = [], 0
+        for key, size in conn.execute("SELECT key, size FROM entries ORDER BY last_used"):
+            keys.append((key,))
+            freed += size
+            if freed >= excess: break
+        with conn:
+            conn.executemany("DELETE FROM entries WHERE key = ?", keys)
+        logging.info(f"Cache {self.path}: {len(keys)} entri lama dihapus ({freed / 1024 / 1024:.1f} MB)")
+
+    def evict(self):
+        """Menjalankan eviction sekarang (mis. di akhir batch)."""
+        def flush_and_evict(conn):
+            self._flush(conn)
+            self._evict(conn)
+        self._run(flush_and_evict)
+
+    def stats(self):
+        def collect(conn):
+            self._flush(conn)
+            counters = dict(conn.execute("SELECT name, value FROM stats"))
+            entries, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+            return CacheStats(counters.get('hits', 0), counters.get('misses', 0), entries, total, self.max_bytes)
+        return self._run(collect) or CacheStats(max_bytes=self.max_bytes)
+
+    def clear(self):
+        def wipe(conn):
+            self._reset_pending()
+            with conn:
+                conn.execute("DELETE FROM entries")
+                conn.execute("UPDATE stats SET value = 0")
+        self._run(wipe)
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            if self._conn is not None and self._pid == os.getpid(): self._conn.close()
+            self._conn = None
+
+class TextCache:
+    """
+    Cache teks hasil ekstraksi PDF, dialamatkan dengan hash isi file dan
+    mode ekstraksi (mis. sort=True vs teks biasa). Teks disimpan terkompresi
+    zlib; file yang sama dengan nama berbeda berbagi entri yang sama.
+    """
+    def __init__(self, path=None, max_bytes=DEFAULT_TEXT_CACHE_MAX_BYTES):
+        self.store = BlobCache(path or get_app_data_dir() / TEXT_CACHE_FILENAME, max_bytes)
+
+    @staticmethod
+    def key(content_hash, mode):
+        return f"{content_hash}:{mode}"
+
+    def get(self, content_hash, mode):
+        value = self.store.get(self.key(content_hash, mode))
+        if value is None: return None
+        try:
+            return zlib.decompress(value).decode('utf-8')
+        except (zlib.error, UnicodeDecodeError) as e:
+            logging.warning(f"Entri cache teks rusak, diabaikan: {e}")
+            return None
+
+    def put(self, content_hash, mode, text):
+        self.store.put(self.key(content_hash, mode), zlib.compress(text.encode('utf-8'), TEXT_COMPRESSION_LEVEL))
+
+    def stats(self):
+        return self.store.stats()
+
+    def clear(self):
+        self.store.clear()
+
+class ResultCache:
+    """
+    Cache hasil akhir pemrosesan satu file (nama baru atau pesan error),
+    dialamatkan dengan hash isi file dan versi template. Versi template
+    berubah jika template (atau kode ekstraktornya) diubah, sehingga hanya
+    entri yang bergantung pada template itu yang tidak terpakai lagi; entri
+    tersebut akhirnya dibuang oleh eviction LRU.
+    """
+    def __init__(self, path=None, max_bytes=DEFAULT_RESULT_CACHE_MAX_BYTES):
+        self.store = BlobCache(path or get_app_data_dir() / RESULT_CACHE_FILENAME, max_bytes)
+
+    @staticmethod
+    def key(content_hash, template_version):
+        return f"{content_hash}:{template_version}"
+
+    def get(self, content_hash, template_version):
+        """Mengembalikan (new_name, error) atau None jika belum ada."""
+        value = self.store.get(self.key(content_hash, template_version))
+        if value is None: return None
+        try:
+            data = json.loads(value)
+            return data["name"], data["error"]
+        except (ValueError, KeyError, TypeError) as e:
+            logging.warning(f"Entri cache hasil rusak, diabaikan: {e}")
+            return None
+
+    def put(self, content_hash, template_version, new_name, error):
+        value = json.dumps({"name": new_name, "error": error}, ensure_ascii=False).encode('utf-8')
+        self.store.put(self.key(content_hash, template_version), value)
+
+    def stats(self):
+        return self.store.stats()
+
+    def clear(self):
+        self.store.clear()
+
+class FileHashCache:
+    """
+    SHA-256 isi file yang dialamatkan dengan path dan signature stat (ukuran,
+    mtime, ctime, inode), agar file yang tidak berubah sejak run sebelumnya
+    tidak perlu dibaca ulang hanya untuk mendapatkan key cache teks/hasil.
+    """
+    def __init__(self, path=None, max_bytes=DEFAULT_HASH_CACHE_MAX_BYTES):
+        self.store = BlobCache(path or get_app_data_dir() / HASH_CACHE_FILENAME, max_bytes)
+
+    @staticmethod
+    def key(file_path, st):
+        return f"{os.path.abspath(file_path)}:{st.st_size}:{st.st_mtime_ns}:{st.st_ctime_ns}:{st.st_ino}"
+
+    def hash_file(self, file_path):
+        st = os.stat(file_path)
+        key = self.key(file_path, st)
+        value = self.store.get(key)
+        if value is not None: return value.decode('ascii')
+        digest = hash_file(file_path)
+        if time.time() - st.st_mtime >= HASH_CACHE_MIN_AGE: self.store.put(key, digest.encode('ascii'))
+        return digest
+
+    def stats(self):
+        return self.store.stats()
+
+    def clear(self):
+        self.store.clear()
+
+_text_cache = None
+_result_cache = None
+_hash_cache = None
+
+def get_text_cache():
+    """Cache teks bersama per proses, atau None jika dimatikan lewat PDF_RENAMER_TEXT_CACHE=0."""
+    global _text_cache
+    if os.environ.get("PDF_RENAMER_TEXT_CACHE", "1") == "0": return None
+    if _text_cache is None:
+        _text_cache = TextCache()
+    return _text_cache
+
+def get_result_cache():
+    """Cache hasil bersama per proses, atau None jika dimatikan lewat PDF_RENAMER_RESULT_CACHE=0."""
+    global _result_cache
+    if os.environ.get("PDF_RENAMER_RESULT_CACHE", "1") == "0": return None
+    if _result_cache is None:
+        _result_cache = ResultCache()
+    return _result_cache
+
+def get_hash_cache():
+    """Cache hash file bersama per proses, atau None jika dimatikan lewat PDF_RENAMER_HASH_CACHE=0."""
+    global _hash_cache
+    if os.environ.get("PDF_RENAMER_HASH_CACHE", "1") == "0": return None
+    if _hash_cache is None:
+        _hash_cache = FileHashCache()
+    return _hash_cache
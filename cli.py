@@ -0,0 +1,575 @@
+"""
+Runner batch tanpa GUI.
+
+Contoh:
+    python -m cli /data/faktur --template "Faktur Pajak Keluaran" --output hasil.zip
+    find /data -name '*.pdf' | python -m cli - --template "Template Saya" --output-dir /data/hasil --workers 8 --jsonl
+    python -m cli /data/campuran --template auto --output-dir /data/hasil
+    python -m cli /data/bulan-ini --template "Template Saya" --output-dir /data/hasil --incremental
+    python -m cli /data/inbox --watch --template "Kode Billing Pajak" --archive-dir /data/arsip --workers 4
+    python -m cli --list-jobs
+    python -m cli --prune-jobs 14
+    python -m cli --resume 20240131-221500-a1b2 --workers 8
+    python -m cli /data/arsip-tahunan --template "Template Saya" --output hasil.zip --split-size 2G --workers 8
+    python -m cli --recover-zip hasil.tmp --output hasil-pulih.zip
+    python -m cli --verify-zip hasil_part*.zip --verify-full --workers 8
+
+Modul ini sengaja tidak mengimpor PyQt5 agar cepat dimulai dan bisa
+dijalankan di server tanpa display.
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import signal
+import sys
+import zipfile
+from dataclasses import asdict
+from pathlib import Path
+
+from batch_tools import run_batch, get_max_workers_limit
+from cache_tools import get_text_cache, get_result_cache, get_hash_cache
+from dedup_tools import DuplicateIndex, DuplicateIndexError, DUPLICATE_MODES, DUPLICATES_OFF, DUPLICATES_SKIP
+from journal_tools import (JobJournal, JournalError, JOB_COMPLETED, JOB_FAILED, JOB_CANCELLED,
+                           JOB_RETENTION_DAYS, OUTPUT_KIND_ZIP, OUTPUT_KIND_DIRECTORY)
+from manifest_tools import FileManifest
+from pdf_tools import template_version
+from universal_extractor import BUILT_IN_TEMPLATES, AUTO_TEMPLATE_NAME
+from utils import load_templates, ConfigError
+from watch_tools import FolderWatcher, DEFAULT_POLL_INTERVAL, DEFAULT_SETTLE_SECONDS
+from zip_tools import (ZipStreamWriter, DirectoryWriter, RollingZipWriter, SplitZipWriter, CompressionPolicy,
+                       ZipError, ZipValidationError, recover_zip, verify_zip_file, VERIFY_WORKERS, COMPRESSION_MODES,
+                       COMPRESSION_AUTO, OUTPUT_METHODS, OUTPUT_AUTO, OUTPUT_MOVE)
+
+EXIT_OK = 0
+EXIT_PARTIAL = 1
+EXIT_USAGE = 2
+EXIT_FAILED = 3
+EXIT_CANCELLED = 130
+
+class CLIError(Exception):
+    """Kesalahan input/konfigurasi yang dilaporkan ke pengguna CLI."""
+    pass
+
+def resolve_template(name):
+    """
+    Mencari template berdasarkan nama: template bawaan (dengan atau tanpa
+    emoji di depan, tidak peka huruf besar/kecil), 'auto' untuk deteksi jenis
+    dokumen otomatis, atau template kustom dari pdf_renamer_templates.json.
+    Mengembalikan (template, template_name).
+    """
+    if name in BUILT_IN_TEMPLATES: return {}, name
+    wanted = name.strip().lower()
+    if wanted == "auto": return {}, AUTO_TEMPLATE_NAME
+    for built_in_name in BUILT_IN_TEMPLATES:
+        plain_name = built_in_name.split(" ", 1)[-1].strip().lower()
+        if wanted in (built_in_name.lower(), plain_name): return {}, built_in_name
+
+    try:
+        templates = load_templates()
+    except ConfigError as e:
+        raise CLIError(f"Gagal memuat template: {e}")
+    if name in templates: return templates[name], name
+
+    available = [n.split(" ", 1)[-1] for n in BUILT_IN_TEMPLATES] + sorted(templates)
+    raise CLIError(f"Template tidak ditemukan: '{name}'. Tersedia: {', '.join(available)}")
+
+def collect_input_files(inputs, recursive=False, stdin=None):
+    """
+    Mengubah argumen input (file, folder, pola glob, atau '-' untuk membaca
+    daftar path dari stdin) menjadi daftar path PDF unik sesuai urutan.
+    """
+    stdin = stdin or sys.stdin
+    collected, seen = [], set()
+
+    def add(path):
+        path = str(path)
+        if path not in seen:
+            seen.add(path)
+            collected.append(path)
+
+    for item in inputs:
+        if item == "-":
+            for line in stdin:
+                line = line.strip()
+                if line: add(line)
+            continue
+        path_obj = Path(item)
+        if path_obj.is_dir():
+            pattern = "**/*" if recursive else "*"
+            for child in sorted(path_obj.glob(pattern)):
+                if child.is_file() and child.suffix.lower() == ".pdf": add(child)
+        elif path_obj.exists():
+            add(path_obj)
+        elif glob.has_magic(item):
+            for match in sorted(glob.glob(item, recursive=True)):
+                if Path(match).is_file(): add(match)
+        else:
+            # Biarkan pdf_tools yang melaporkan "File tidak ditemukan" per file.
+            add(path_obj)
+    return collected
+
+def open_writer(args, template_name="", resume_names=None):
+    if args.output_dir:
+        return DirectoryWriter(args.output_dir, args.method)
+    if args.archive_dir:
+        prefix = f"Hasil Rename ({template_name.split(' ', 1)[-1]})" if template_name else "Hasil Rename"
+        return RollingZipWriter(args.archive_dir, prefix, args.roll_count, CompressionPolicy(mode=args.compression))
+    if args.split_size or args.split_count:
+        return SplitZipWriter(args.output, args.split_size, args.split_count, CompressionPolicy(mode=args.compression),
+                              resume_names)
+    return ZipStreamWriter(args.output, CompressionPolicy(mode=args.compression), resume_names)
+
+def carry_over_outputs(writer, plan, manifest):
+    """
+    Menyesuaikan output dengan rencana inkremental sebelum batch berjalan:
+    di folder output, hasil lama dari file yang berubah/hilang dihapus; untuk
+    ZIP, hasil file yang tidak berubah disalin dari arsip sebelumnya ke arsip
+    baru. Hasil lama yang ternyata hilang diproses ulang. Mengembalikan daftar
+    nama yang dipertahankan.
+    """
+    if isinstance(writer, DirectoryWriter):
+        for entry in plan.stale.values():
+            if not entry.name: continue
+            try:
+                (writer.target_dir / entry.name).unlink()
+            except FileNotFoundError:
+                pass
+        kept = []
+        for path, entry in list(plan.unchanged.items()):
+            if not entry.name: continue
+            if (writer.target_dir / entry.name).exists(): kept.append(entry.name)
+            else:
+                manifest.requeue(path)
+                plan.to_process.append(path)
+        return kept
+
+    kept = []
+    carried = [(path, entry) for path, entry in plan.unchanged.items() if entry.name]
+    if not carried: return kept
+    try:
+        with zipfile.ZipFile(writer.save_path) as source_zip:
+            for path, entry in carried:
+                try:
+                    kept.append(writer.copy_member(source_zip, entry.name))
+                except KeyError:
+                    manifest.requeue(path)
+                    plan.to_process.append(path)
+    except (zipfile.BadZipFile, OSError) as e:
+        logging.warning(f"Arsip sebelumnya tidak bisa dibaca, semua file diproses ulang: {e}")
+        for path, _ in carried[len(kept):]:
+            manifest.requeue(path)
+            plan.to_process.append(path)
+    return kept
+
+def abort_writer(writer, manifest=None):
+    writer.abort()
+    # File di folder output tetap ada setelah abort, jadi manifest tetap dicatat.
+    if manifest is not None and isinstance(writer, DirectoryWriter): manifest.save()
+
+class ProgressReporter:
+    """Menulis progress ke stdout sebagai teks biasa atau JSON lines."""
+    def __init__(self, total, jsonl=False, stream=None):
+        self.total = total
+        self.jsonl = jsonl
+        self.stream = stream or sys.stdout
+
+    def emit(self, event, **data):
+        if self.jsonl:
+            self.stream.write(json.dumps({"event": event, **data}, ensure_ascii=False) + "\n")
+            self.stream.flush()
+
+    def start(self, template_name, output, job_id=None):
+        self.emit("start", total=self.total, template=template_name, output=str(output), job=job_id)
+        if self.jsonl: return
+        if self.total is None: print(f"Memantau inbox dengan template '{template_name}'...", file=self.stream)
+        else: print(f"Memproses {self.total} file dengan template '{template_name}'...", file=self.stream)
+        if job_id: print(f"ID job: {job_id} (lanjutkan dengan --resume {job_id} jika terhenti)", file=self.stream)
+
+    def result(self, result, output_name):
+        ok = output_name is not None
+        self.emit("file", index=result.index, total=self.total, path=result.file_path,
+                  ok=ok, name=output_name, error=None if ok else result.error, duplicate_of=result.duplicate_of)
+        if not self.jsonl:
+            position = f"{result.index + 1}/{self.total}" if self.total else f"{result.index + 1}"
+            prefix = f"[{position}] {Path(result.file_path).name}"
+            if ok: line = f"OK   {prefix} -> {output_name}"
+            elif result.duplicate_of: line = f"DUPL {prefix}: sama dengan {result.duplicate_of}"
+            else: line = f"GAGAL {prefix}: {result.error}"
+            if ok and result.duplicate_of: line += f" (duplikat dari {result.duplicate_of})"
+            print(line, file=self.stream)
+
+    def finish(self, summary, exit_code, message=""):
+        self.emit("summary", total=summary.total, success=summary.success_count, failed=summary.error_count,
+                  duplicates=summary.duplicate_count, exit_code=exit_code, message=message)
+        if not self.jsonl:
+            line = f"Berhasil: {summary.success_count} | Gagal: {summary.error_count}"
+            if summary.duplicate_count: line += f" | Duplikat: {summary.duplicate_count}"
+            print(line, file=self.stream)
+            if message: print(message, file=self.stream)
+
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+
+def parse_size(text):
+    """'500M', '2G', '750K', atau jumlah byte -> int (untuk argparse)."""
+    value = text.strip().upper().rstrip("B")
+    unit = value[-1:] if value[-1:] in SIZE_UNITS else ""
+    try:
+        size = int(float(value[:len(value) - len(unit)]) * SIZE_UNITS[unit])
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Ukuran tidak valid: '{text}' (contoh: 500M, 2G)")
+    if size < 1: raise argparse.ArgumentTypeError(f"Ukuran harus lebih dari 0: '{text}'")
+    return size
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m cli", description="Rename PDF secara massal tanpa GUI.")
+    parser.add_argument("inputs", nargs="*", help="File PDF, folder, pola glob, atau '-' untuk membaca path dari stdin")
+    parser.add_argument("-t", "--template", help="Nama template bawaan atau kustom")
+    output = parser.add_mutually_exclusive_group()
+    output.add_argument("-o", "--output", help="Path file ZIP hasil")
+    output.add_argument("-d", "--output-dir", help="Folder hasil (tanpa ZIP)")
+    output.add_argument("-a", "--archive-dir", help="Folder untuk arsip ZIP bergulir (mode --watch)")
+    parser.add_argument("-w", "--workers", type=int, default=1, help=f"Jumlah proses paralel (maks {get_max_workers_limit()})")
+    parser.add_argument("-r", "--recursive", action="store_true", help="Cari PDF di subfolder juga")
+    parser.add_argument("--compression", choices=COMPRESSION_MODES, default=COMPRESSION_AUTO, help="Kebijakan kompresi ZIP")
+    parser.add_argument("--split-size", type=parse_size, metavar="SIZE",
+                        help="Pecah --output menjadi bagian _part001.zip, ... maksimal sebesar ini (mis. 2G)")
+    parser.add_argument("--split-count", type=int, metavar="N", help="Pecah --output menjadi bagian berisi maksimal N file")
+    parser.add_argument("--method", choices=OUTPUT_METHODS, default=OUTPUT_AUTO, help="Cara menempatkan file di --output-dir")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Hanya proses file baru/berubah sejak run sebelumnya ke output yang sama")
+    parser.add_argument("--duplicates", choices=DUPLICATE_MODES, default=DUPLICATES_OFF,
+                        help="Kenali dokumen yang isinya sudah pernah diproses (antar run dan dalam batch): "
+                             "skip = lewati, flag = proses tetapi tandai")
+    parser.add_argument("--no-text-cache", action="store_true", help="Jangan pakai/isi cache teks PDF di app data dir")
+    parser.add_argument("--no-result-cache", action="store_true",
+                        help="Proses ulang semua file walaupun isi dan template tidak berubah")
+    parser.add_argument("--no-hash-cache", action="store_true",
+                        help="Selalu hitung ulang hash isi file walaupun ukuran dan waktu ubahnya sama")
+    parser.add_argument("--jsonl", action="store_true", help="Tulis progress sebagai JSON lines ke stdout")
+    watch = parser.add_argument_group("mode watch")
+    watch.add_argument("--watch", action="store_true", help="Pantau satu folder inbox terus-menerus")
+    watch.add_argument("--interval", type=float, default=DEFAULT_POLL_INTERVAL, help="Jeda polling dalam detik")
+    watch.add_argument("--settle", type=float, default=DEFAULT_SETTLE_SECONDS,
+                       help="Detik tanpa perubahan ukuran/mtime sebelum file diproses")
+    watch.add_argument("--roll-count", type=int, default=500, help="Jumlah file per arsip untuk --archive-dir")
+    watch.add_argument("--roll-idle", type=float, default=60.0,
+                       help="Finalisasi arsip aktif setelah sekian detik tanpa file baru")
+    jobs = parser.add_argument_group("jurnal job")
+    jobs.add_argument("--resume", metavar="JOB_ID", help="Lanjutkan job yang terhenti (crash/dibatalkan) dari file terakhir yang tercatat")
+    jobs.add_argument("--list-jobs", action="store_true", help="Tampilkan job terbaru di jurnal")
+    jobs.add_argument("--prune-jobs", metavar="HARI", type=float, nargs="?", const=JOB_RETENTION_DAYS,
+                      help=f"Hapus job yang tidak berjalan dan tidak diperbarui lebih dari HARI hari "
+                           f"(default {JOB_RETENTION_DAYS}) dari jurnal")
+    jobs.add_argument("--recover-zip", metavar="TMP",
+                      help="Pulihkan arsip .tmp dari run yang terputus ke --output (default: nama yang sama berakhiran .zip)")
+    jobs.add_argument("--verify-zip", metavar="ZIP", nargs="+",
+                      help="Verifikasi arsip dengan manifest checksum di dalamnya (cepat, tanpa membaca ulang isi)")
+    jobs.add_argument("--verify-full", action="store_true",
+                      help="Dengan --verify-zip: baca ulang isi semua file secara paralel dan cocokkan SHA-256-nya")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Tampilkan log detail di stderr")
+    return parser
+
+def run_watch(args, template, template_name):
+    """Mode daemon: memantau satu folder sampai dihentikan (Ctrl+C / SIGTERM)."""
+    if len(args.inputs) != 1 or not Path(args.inputs[0]).is_dir():
+        print("Error: mode --watch membutuhkan tepat satu folder inbox.", file=sys.stderr)
+        return EXIT_USAGE
+    if args.output:
+        print("Error: mode --watch memakai --output-dir atau --archive-dir, bukan --output.", file=sys.stderr)
+        return EXIT_USAGE
+    try:
+        writer = open_writer(args, template_name)
+    except (ZipError, ZipValidationError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return EXIT_USAGE
+
+    reporter = ProgressReporter(None, args.jsonl)
+    watcher = FolderWatcher(args.inputs[0], template, template_name, writer, max_workers=args.workers,
+                            poll_interval=args.interval, settle_seconds=args.settle, recursive=args.recursive,
+                            roll_idle_seconds=args.roll_idle, on_result=reporter.result)
+    signal.signal(signal.SIGTERM, lambda signum, frame: watcher.stop())
+    reporter.start(template_name, args.output_dir or args.archive_dir)
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        watcher.stop()
+    except Exception as e:
+        # Status non-nol agar supervisor (systemd, dsb.) menjalankan ulang daemon.
+        print(f"Error: watcher berhenti: {e}", file=sys.stderr)
+        return EXIT_FAILED
+    if watcher.writer_error is not None:
+        print(f"Error: gagal memfinalisasi output: {watcher.writer_error}", file=sys.stderr)
+        return EXIT_FAILED
+    return EXIT_OK
+
+def run_list_jobs(args):
+    try:
+        journal = JobJournal()
+        records = journal.list_jobs()
+        journal.close()
+    except JournalError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return EXIT_FAILED
+    for record in records:
+        if args.jsonl: print(json.dumps({"event": "job", **asdict(record)}, ensure_ascii=False))
+        else: print(record.summary())
+    if not records and not args.jsonl: print("Belum ada job di jurnal.")
+    return EXIT_OK
+
+def run_prune_jobs(args):
+    try:
+        journal = JobJournal()
+        removed = journal.prune_jobs(args.prune_jobs)
+        journal.close()
+    except JournalError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return EXIT_FAILED
+    if args.jsonl: print(json.dumps({"event": "prune_jobs", "removed": removed}))
+    else: print(f"{removed} job lama dihapus dari jurnal.")
+    return EXIT_OK
+
+def run_recover_zip(args):
+    source = Path(args.recover_zip)
+    target = Path(args.output) if args.output else source.with_suffix('.zip')
+    if not source.is_file():
+        print(f"Error: File tidak ditemukan: {source}", file=sys.stderr)
+        return EXIT_USAGE
+    if target.exists():
+        print(f"Error: File output sudah ada: {target}", file=sys.stderr)
+        return EXIT_USAGE
+    try:
+        names = recover_zip(source, target)
+    except ZipError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return EXIT_FAILED
+    if args.jsonl: print(json.dumps({"event": "recovered", "output": str(target), "count": len(names)}))
+    else: print(f"{len(names)} file dipulihkan ke {target}")
+    return EXIT_OK
+
+def run_verify_zip(args):
+    exit_code = EXIT_OK
+    for zip_path in args.verify_zip:
+        ok, message, count = verify_zip_file(zip_path, full=args.verify_full, workers=max(args.workers, VERIFY_WORKERS))
+        if not ok: exit_code = EXIT_FAILED
+        if args.jsonl:
+            print(json.dumps({"event": "verified", "zip": zip_path, "ok": ok, "count": count, "error": message or None},
+                             ensure_ascii=False))
+        else:
+            print(f"OK   {zip_path}: {count} file" if ok else f"GAGAL {zip_path}: {message}")
+    return exit_code
+
+def open_journal_job(file_paths, template, template_name, args):
+    """Mencatat batch ini sebagai job baru; jurnal yang tidak bisa dibuka hanya memberi peringatan."""
+    output_kind = OUTPUT_KIND_DIRECTORY if args.output_dir else OUTPUT_KIND_ZIP
+    output = Path(args.output_dir or args.output).resolve()
+    options = {"compression": args.compression, "method": args.method, "duplicates": args.duplicates,
+               "split_size": args.split_size, "split_count": args.split_count}
+    try:
+        return JobJournal().create_job([Path(p).resolve() for p in file_paths], template, template_name,
+                                       output, output_kind, options)
+    except JournalError as e:
+        logging.warning(f"{e}; batch berjalan tanpa jurnal dan tidak bisa dilanjutkan jika terhenti.")
+        return None
+
+def run_resume(args):
+    """
+    Melanjutkan job dari jurnal dengan template, output, dan opsi yang sama.
+    File yang sudah tercatat selesai tidak diproses ulang: di folder output
+    hasilnya sudah ada, sedangkan untuk ZIP arsip .tmp yang tertinggal
+    dipulihkan sampai member terakhir yang tercatat, dan member yang hilang
+    (setelah checkpoint terakhir) disalin ulang dari file sumber dengan nama
+    yang tercatat (tanpa ekstraksi).
+    """
+    try:
+        journal = JobJournal()
+        record = journal.get_job(args.resume)
+        job = journal.resume_job(args.resume)
+        completed = journal.completed_files(args.resume)
+        file_paths = journal.unfinished_files(args.resume)
+    except JournalError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return EXIT_USAGE
+
+    args.compression = record.options.get("compression", args.compression)
+    args.method = record.options.get("method", args.method)
+    args.duplicates = record.options.get("duplicates", args.duplicates)
+    args.split_size = record.options.get("split_size")
+    args.split_count = record.options.get("split_count")
+    args.output_dir = record.output if record.output_kind == OUTPUT_KIND_DIRECTORY else None
+    args.output = record.output if record.output_kind == OUTPUT_KIND_ZIP else None
+    try:
+        writer = open_writer(args, resume_names=[name for _, name in completed])
+    except (ZipError, ZipValidationError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return EXIT_USAGE
+
+    kept_names = []
+    for path, name in completed:
+        if isinstance(writer, DirectoryWriter):
+            if (writer.target_dir / name).exists():
+                kept_names.append(name)
+                continue
+        elif name in writer.existing_names:
+            kept_names.append(name)
+            continue
+        else:
+            try:
+                kept_names.append(writer.add(name, path))
+                continue
+            except ZipError as e:
+                if writer.aborted:
+                    print(f"Error: {e}", file=sys.stderr)
+                    return EXIT_FAILED
+                logging.warning(f"Hasil lama tidak bisa disalin ulang, diproses lagi: {e}")
+        file_paths.append(path)
+    logging.info(f"Melanjutkan job {record.job_id}: {len(kept_names)} file sudah selesai, {len(file_paths)} diproses")
+    return execute_batch(args, file_paths, record.template, record.template_name, writer,
+                         job=job, kept_names=kept_names)
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(asctime)s - %(levelname)s - %(message)s', stream=sys.stderr)
+
+    # Lewat environment agar ikut berlaku di proses worker.
+    if args.no_text_cache: os.environ["PDF_RENAMER_TEXT_CACHE"] = "0"
+    if args.no_result_cache: os.environ["PDF_RENAMER_RESULT_CACHE"] = "0"
+    if args.no_hash_cache: os.environ["PDF_RENAMER_HASH_CACHE"] = "0"
+
+    if args.list_jobs: return run_list_jobs(args)
+    if args.prune_jobs is not None: return run_prune_jobs(args)
+    if args.resume: return run_resume(args)
+    if args.recover_zip: return run_recover_zip(args)
+    if args.verify_zip: return run_verify_zip(args)
+    if not args.inputs or not args.template or not (args.output or args.output_dir or args.archive_dir):
+        print("Error: input, --template, dan salah satu dari --output/--output-dir/--archive-dir wajib diisi.",
+              file=sys.stderr)
+        return EXIT_USAGE
+
+    try:
+        template, template_name = resolve_template(args.template)
+    except CLIError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return EXIT_USAGE
+    if args.watch:
+        return run_watch(args, template, template_name)
+    if args.archive_dir:
+        print("Error: --archive-dir hanya untuk mode --watch.", file=sys.stderr)
+        return EXIT_USAGE
+
+    if args.incremental and args.method == OUTPUT_MOVE:
+        print("Error: --incremental tidak bisa dipakai dengan --method move.", file=sys.stderr)
+        return EXIT_USAGE
+    if args.split_size or args.split_count:
+        if not args.output:
+            print("Error: --split-size/--split-count hanya untuk --output ZIP.", file=sys.stderr)
+            return EXIT_USAGE
+        if args.incremental:
+            print("Error: --incremental tidak bisa dipakai dengan --split-size/--split-count.", file=sys.stderr)
+            return EXIT_USAGE
+        if args.split_count is not None and args.split_count < 1:
+            print("Error: --split-count minimal 1.", file=sys.stderr)
+            return EXIT_USAGE
+
+    manifest = plan = None
+    try:
+        file_paths = collect_input_files(args.inputs, args.recursive)
+        if not file_paths: raise CLIError("Tidak ada file PDF yang ditemukan.")
+        if args.incremental:
+            manifest = FileManifest.for_output(args.output or args.output_dir, template_version(template, template_name))
+            plan = manifest.plan(file_paths)
+            if not plan.has_changes:
+                manifest.save()
+                print(f"Tidak ada file baru atau berubah ({len(plan.unchanged)} file dilewati).")
+                return EXIT_OK
+        writer = open_writer(args)
+    except (CLIError, ZipError, ZipValidationError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return EXIT_USAGE
+
+    kept_names = []
+    if plan is not None:
+        try:
+            kept_names = carry_over_outputs(writer, plan, manifest)
+        except (ZipError, OSError) as e:
+            abort_writer(writer)
+            print(f"Error: {e}", file=sys.stderr)
+            return EXIT_FAILED
+        file_paths = plan.to_process
+
+    job = open_journal_job(file_paths, template, template_name, args)
+    return execute_batch(args, file_paths, template, template_name, writer,
+                         job=job, kept_names=kept_names, manifest=manifest, plan=plan)
+
+def execute_batch(args, file_paths, template, template_name, writer, job=None, kept_names=(), manifest=None, plan=None):
+    """Menjalankan batch ke writer yang sudah dibuka lalu menutup output, manifest, dan job."""
+    def on_result(result, output_name):
+        if manifest is not None and not result.unexpected:
+            manifest.record(result.file_path, output_name, None if output_name else result.error)
+        reporter.result(result, output_name)
+
+    def finish(status):
+        if job is not None: job.finish(status)
+
+    reporter = ProgressReporter(len(file_paths), args.jsonl)
+    reporter.start(template_name, args.output or args.output_dir, job.job_id if job else None)
+    caches = [(label, cache) for label, cache in (("teks", get_text_cache()), ("hasil", get_result_cache()),
+                                                  ("hash", get_hash_cache())) if cache]
+    cache_before = [cache.stats() for _, cache in caches]
+    duplicates = None
+    if args.duplicates != DUPLICATES_OFF:
+        try:
+            duplicates = DuplicateIndex()
+        except DuplicateIndexError as e:
+            logging.warning(f"{e}; batch berjalan tanpa deteksi duplikat.")
+    try:
+        summary = run_batch(file_paths, template, template_name, writer,
+                            max_workers=args.workers, on_result=on_result, reserved_names=kept_names,
+                            duplicates=duplicates, skip_duplicates=args.duplicates == DUPLICATES_SKIP, journal=job)
+    except KeyboardInterrupt:
+        abort_writer(writer, manifest)
+        finish(JOB_CANCELLED)
+        print("Dibatalkan.", file=sys.stderr)
+        return EXIT_CANCELLED
+    except Exception as e:
+        abort_writer(writer, manifest)
+        finish(JOB_FAILED)
+        print(f"Error: {e}", file=sys.stderr)
+        return EXIT_FAILED
+    finally:
+        if duplicates is not None: duplicates.close()
+
+    for (label, cache), before in zip(caches, cache_before):
+        after = cache.stats()
+        logging.info(f"Cache {label} batch ini: {after.hits - before.hits} hit, "
+                     f"{after.misses - before.misses} miss | {after.summary()}")
+
+    if not summary.success_count and not kept_names:
+        abort_writer(writer, manifest)
+        if summary.duplicate_count and not summary.error_count:
+            finish(JOB_COMPLETED)
+            reporter.finish(summary, EXIT_OK, "Semua file adalah duplikat; tidak ada output baru.")
+            return EXIT_OK
+        finish(JOB_FAILED)
+        reporter.finish(summary, EXIT_FAILED, "Tidak ada file yang berhasil diproses.")
+        return EXIT_FAILED
+    try:
+        writer.close()
+    except (ZipError, ZipValidationError) as e:
+        finish(JOB_FAILED)
+        reporter.finish(summary, EXIT_FAILED, f"Gagal menyimpan hasil: {e}")
+        return EXIT_FAILED
+    if manifest is not None: manifest.save()
+    finish(JOB_COMPLETED)
+
+    exit_code = EXIT_OK if summary.error_count == 0 else EXIT_PARTIAL
+    message = writer.stats.summary()
+    if isinstance(writer, SplitZipWriter): message += f"\n{len(writer.parts)} bagian arsip, daftar isi: {writer.manifest_path}"
+    if plan is not None: message += f"\n{len(plan.unchanged)} file tidak berubah dilewati, {len(kept_names)} hasil lama dipertahankan."
+    reporter.finish(summary, exit_code, message)
+    return exit_code
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,287 @@
+import hashlib
+import logging
+import math
+import os
+import sqlite3
+import struct
+from dataclasses import dataclass
+from typing import Optional
+
+from cache_tools import get_hash_cache, hash_file
+from utils import get_app_data_dir
+
+DUPLICATE_INDEX_FILENAME = "duplicate_index.sqlite3"
+BLOOM_FILENAME = "duplicate_index.bloom"
+# Potongan awal dan akhir file untuk hash parsial. PDF hasil kirim ulang
+# biasanya identik byte per byte; dua PDF berbeda dengan ukuran sama hampir
+# selalu berbeda di header/xref (awal) atau trailer/ID (akhir).
+PARTIAL_HASH_CHUNK = 64 * 1024
+DEFAULT_BLOOM_CAPACITY = 1_000_000
+BLOOM_FALSE_POSITIVE_RATE = 0.01
+
+DUPLICATES_OFF = "off"
+DUPLICATES_SKIP = "skip"
+DUPLICATES_FLAG = "flag"
+DUPLICATE_MODES = (DUPLICATES_OFF, DUPLICATES_SKIP, DUPLICATES_FLAG)
+
+@dataclass
+class Fingerprint:
+    """Sidik isi file: ukuran + hash parsial (awal/akhir), sha256 penuh hanya dihitung bila perlu."""
+    path: str
+    size: int
+    partial: int
+    sha256: Optional[bytes] = None
+
+    @property
+    def key(self):
+        return self.size, self.partial
+
+    def full_hash(self):
+        if self.sha256 is None:
+            # Hash isi yang sama biasanya sudah dihitung worker untuk cache teks/hasil.
+            hash_cache = get_hash_cache()
+            self.sha256 = bytes.fromhex(hash_cache.hash_file(self.path) if hash_cache else hash_file(self.path))
+        return self.sha256
+
+def fingerprint_file(path, chunk_size=PARTIAL_HASH_CHUNK):
+    """Membaca paling banyak 2 x chunk_size byte; file kecil di-hash seluruhnya."""
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        head = f.read(chunk_size)
+        tail = b""
+        if size > chunk_size * 2:
+            f.seek(-chunk_size, os.SEEK_END)
+            tail = f.read(chunk_size)
+        elif size > chunk_size:
+            tail = f.read()
+    digest = hashlib.blake2b(head, digest_size=8)
+    digest.update(tail)
+    fingerprint = Fingerprint(os.path.abspath(path), size, struct.unpack("<q", digest.digest())[0])
+    # Untuk file kecil hash parsial sudah mencakup seluruh isi file.
+    if size <= chunk_size * 2: fingerprint.sha256 = hashlib.sha256(head + tail).digest()
+    return fingerprint
+
+class BloomFilter:
+    """
+    Bloom filter sederhana untuk key (size, partial). Jawaban negatif pasti
+    benar, sehingga file baru (kasus paling umum) tidak perlu query SQLite.
+    """
+    HEADER = struct.Struct("<QQQ")
+
+    def __init__(self, capacity=DEFAULT_BLOOM_CAPACITY, error_rate=BLOOM_FALSE_POSITIVE_RATE):
+        self.capacity = capacity
+        self.bit_count = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.bit_count / capacity * math.log(2)))
+        self.bits = bytearray((self.bit_count + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        # partial sudah berupa hash acak 64-bit, jadi cukup dicampur dengan
+        # ukuran file untuk double hashing (tanpa menghitung hash baru).
+        size, partial = key
+        h1 = partial & 0xFFFFFFFFFFFFFFFF
+        h2 = ((size * 0x9E3779B97F4A7C15) ^ (h1 >> 17)) & 0xFFFFFFFFFFFFFFFF | 1
+        return ((h1 + i * h2) % self.bit_count for i in range(self.hash_count))
+
+    def add(self, key):
+        for pos in self._positions(key): self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    def save(self, path, row_count):
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(self.HEADER.pack(self.capacity, row_count, self.hash_count))
+            f.write(self.bits)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path, row_count):
+        """Filter tersimpan, atau None jika tidak ada/usang (jumlah baris indeks berbeda) sehingga perlu dibangun ulang."""
+        try:
+            with open(path, 'rb') as f:
+                capacity, saved_rows, hash_count = cls.HEADER.unpack(f.read(cls.HEADER.size))
+                bloom = cls(capacity)
+                bits = f.read()
+        except (OSError, struct.error):
+            return None
+        if saved_rows != row_count or hash_count != bloom.hash_count or len(bits) != len(bloom.bits): return None
+        if row_count > capacity: return None
+        bloom.bits = bytearray(bits)
+        bloom.count = row_count
+        return bloom
+
+class DuplicateIndexError(Exception):
+    """Kesalahan membuka indeks duplikat."""
+    pass
+
+class DuplicateIndex:
+    """
+    Indeks sidik dokumen yang bertahan antar run, di SQLite pada app data dir.
+
+    Prefilter murah (ukuran + hash parsial awal/akhir file) disimpan sebagai
+    dua integer berindeks, bersama sha256 penuh yang dihitung saat dokumen
+    dicatat, sehingga tabrakan prefilter di run berikutnya tetap bisa
+    diputuskan walaupun file aslinya sudah dipindah. Bloom filter
+    opsional menjawab "pasti baru" tanpa query. File yang sama (path sama)
+    yang diproses ulang tidak dianggap duplikat.
+
+    Dokumen dicatat lewat add() setelah berhasil ditulis ke output; di dalam
+    satu batch, find() juga mengenali file yang sudah dicatat lewat
+    remember() walaupun belum selesai diproses.
+    """
+    def __init__(self, path=None, use_bloom=True, bloom_capacity=DEFAULT_BLOOM_CAPACITY):
+        app_dir = get_app_data_dir()
+        self.path = str(path or app_dir / DUPLICATE_INDEX_FILENAME)
+        self.bloom_path = f"{self.path}.bloom" if path else str(app_dir / BLOOM_FILENAME)
+        self._conn = None
+        try:
+            self._conn = sqlite3.connect(self.path, timeout=30)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS documents (size INTEGER NOT NULL, partial INTEGER NOT NULL, "
+                               "sha256 BLOB, path TEXT NOT NULL)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS documents_key ON documents (size, partial)")
+            self.bloom = self._open_bloom(bloom_capacity) if use_bloom else None
+        except sqlite3.Error as e:
+            if self._conn is not None: self._conn.close()
+            raise DuplicateIndexError(f"Indeks duplikat tidak dapat dibuka: {e}")
+        self._session = {}
+        self._bloom_dirty = False
+
+    def _row_count(self):
+        return self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def _open_bloom(self, capacity):
+        row_count = self._row_count()
+        bloom = BloomFilter.load(self.bloom_path, row_count)
+        if bloom is not None: return bloom
+        bloom = BloomFilter(max(capacity, row_count * 2))
+        for key in self._conn.execute("SELECT size, partial FROM documents"): bloom.add(key)
+        logging.info(f"Bloom filter indeks duplikat dibangun ulang dari {row_count} entri")
+        return bloom
+
+    def _same_content(self, fingerprint, other_path, other_sha256):
+        """Membandingkan sha256 penuh; hash dokumen lama yang belum ada dihitung dari path-nya."""
+        if other_sha256 is None:
+            try:
+                other_sha256 = bytes.fromhex(hash_file(other_path))
+            except OSError:
+                return False, None
+        return fingerprint.full_hash() == other_sha256, other_sha256
+
+    def find(self, fingerprint):
+        """Mengembalikan path dokumen asli jika isi file ini sudah pernah ada, selain itu None."""
+        for other in self._session.get(fingerprint.key, ()):
+            if other.path == fingerprint.path: continue
+            try:
+                if fingerprint.full_hash() == other.full_hash(): return other.path
+            except OSError:
+                continue
+        if self.bloom is not None and fingerprint.key not in self.bloom: return None
+        rows = self._conn.execute("SELECT rowid, sha256, path FROM documents WHERE size = ? AND partial = ?",
+                                  fingerprint.key).fetchall()
+        for rowid, other_sha256, other_path in rows:
+            if other_path == fingerprint.path: continue
+            same, computed = self._same_content(fingerprint, other_path, other_sha256)
+            if other_sha256 is None and computed is not None:
+                with self._conn:
+                    self._conn.execute("UPDATE documents SET sha256 = ? WHERE rowid = ?", (computed, rowid))
+            if same: return other_path
+        return None
+
+    def remember(self, fingerprint):
+        """Mencatat file untuk batch ini saja (belum permanen)."""
+        self._session.setdefault(fingerprint.key, []).append(fingerprint)
+
+    def add(self, fingerprint):
+        """Mencatat dokumen secara permanen (setelah berhasil ditulis ke output)."""
+        try:
+            sha256 = fingerprint.full_hash()
+        except OSError as e:
+            # Tanpa sha256, dokumen ini hanya bisa dibandingkan selama path-nya masih ada.
+            logging.warning(f"Hash penuh {fingerprint.path} tidak dapat dihitung: {e}")
+            sha256 = None
+        exists = self._conn.execute("SELECT 1 FROM documents WHERE size = ? AND partial = ? AND path = ?",
+                                    (*fingerprint.key, fingerprint.path)).fetchone()
+        with self._conn:
+            if exists:
+                self._conn.execute("UPDATE documents SET sha256 = ? WHERE size = ? AND partial = ? AND path = ?",
+                                   (sha256, *fingerprint.key, fingerprint.path))
+                return
+            self._conn.execute("INSERT INTO documents VALUES (?, ?, ?, ?)",
+                               (*fingerprint.key, sha256, fingerprint.path))
+        if self.bloom is not None:
+            self.bloom.add(fingerprint.key)
+            self._bloom_dirty = True
+
+    def close(self):
+        try:
+            if self.bloom is not None and self._bloom_dirty:
+                row_count = self._row_count()
+                # Filter yang sudah penuh tidak disimpan; run berikutnya membangun yang lebih besar.
+                if row_count <= self.bloom.capacity: self.bloom.save(self.bloom_path, row_count)
+                elif os.path.exists(self.bloom_path): os.unlink(self.bloom_path)
+        except OSError as e:
+            logging.warning(f"Gagal menyimpan bloom filter indeks duplikat: {e}")
+        finally:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+def test_duplicate_index():
+    """
+    Duplikat dikenali antar run walaupun file aslinya sudah dipindah (sha256
+    penuh tersimpan saat add), file berbeda dengan awal/akhir yang sama
+    tidak dianggap duplikat, dan bloom filter tersimpan dipakai ulang.
+    """
+    import shutil
+    import tempfile
+
+    # Hash penuh dihitung langsung dari file, tanpa cache hash di app data dir.
+    saved_hash_cache = os.environ.get("PDF_RENAMER_HASH_CACHE")
+    os.environ["PDF_RENAMER_HASH_CACHE"] = "0"
+    try:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            index_path = os.path.join(temp_dir, "index.sqlite3")
+            original = os.path.join(temp_dir, "asli.pdf")
+            body = os.urandom(PARTIAL_HASH_CHUNK * 3)
+            with open(original, 'wb') as f: f.write(body)
+            with DuplicateIndex(index_path, bloom_capacity=1000) as index:
+                assert index.find(fingerprint_file(original)) is None, "File baru dianggap duplikat"
+                index.add(fingerprint_file(original))
+
+            moved = os.path.join(temp_dir, "arsip", "asli.pdf")
+            os.makedirs(os.path.dirname(moved))
+            shutil.move(original, moved)
+            copy = os.path.join(temp_dir, "kiriman-ulang.pdf")
+            shutil.copyfile(moved, copy)
+            # Awal dan akhir sama, bagian tengah berbeda: prefilter bertabrakan tetapi isinya lain.
+            lookalike = os.path.join(temp_dir, "mirip.pdf")
+            middle = PARTIAL_HASH_CHUNK + 10
+            with open(lookalike, 'wb') as f: f.write(body[:middle] + bytes([body[middle] ^ 1]) + body[middle + 1:])
+
+            with DuplicateIndex(index_path, bloom_capacity=1000) as index:
+                assert index.bloom.count == 1, "Bloom filter tersimpan tidak dipakai ulang"
+                assert fingerprint_file(lookalike).key == fingerprint_file(copy).key, "Prefilter seharusnya bertabrakan"
+                assert index.find(fingerprint_file(copy)) == original, "Duplikat tidak dikenali setelah file asli dipindah"
+                assert index.find(fingerprint_file(lookalike)) is None, "File berbeda dianggap duplikat"
+
+                # Di dalam satu batch, file yang baru diingat juga dikenali.
+                index.remember(fingerprint_file(lookalike))
+                second = os.path.join(temp_dir, "mirip-2.pdf")
+                shutil.copyfile(lookalike, second)
+                assert index.find(fingerprint_file(second)) == os.path.abspath(lookalike), "Duplikat dalam batch tidak dikenali"
+    finally:
+        if saved_hash_cache is None: os.environ.pop("PDF_RENAMER_HASH_CACHE", None)
+        else: os.environ["PDF_RENAMER_HASH_CACHE"] = saved_hash_cache
+    print("DuplicateIndex OK: duplikat dikenali setelah file asli dipindah, file mirip tidak.")
+
+if __name__ == "__main__":
+    # Jalankan pengujian jika file ini dieksekusi
+    test_duplicate_index()
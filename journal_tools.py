@@ -0,0 +1,329 @@
+import json
+import logging
+import os
+import socket
+import sqlite3
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from utils import get_app_data_dir
+
+JOURNAL_FILENAME = "jobs.sqlite3"
+
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+
+FILE_PENDING = "pending"
+FILE_DONE = "done"
+FILE_FAILED = "failed"
+# Dilewati dengan sengaja (mis. duplikat pada --duplicates skip); dianggap
+# selesai saat job dilanjutkan.
+FILE_SKIPPED = "skipped"
+
+OUTPUT_KIND_ZIP = "zip"
+OUTPUT_KIND_DIRECTORY = "dir"
+
+# Job yang berjalan memperbarui heartbeat paling cepat setiap sekian detik
+# (bersama pencatatan hasil file). Job dianggap masih hidup jika proses
+# pemiliknya ada dan heartbeat-nya lebih baru dari JOB_STALE_SECONDS.
+JOB_HEARTBEAT_INTERVAL = 30.0
+JOB_STALE_SECONDS = 15 * 60
+# Job selesai yang lebih tua dari ini dihapus otomatis saat job baru dibuat.
+JOB_RETENTION_DAYS = 30
+
+def _pid_alive(pid):
+    """Apakah proses dengan pid ini masih berjalan di mesin ini."""
+    if os.name == "nt":
+        # os.kill(pid, 0) di Windows mengirim CTRL_C_EVENT, jadi pakai OpenProcess.
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle: return False
+        exit_code = ctypes.c_ulong()
+        try:
+            return bool(kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code))) and exit_code.value == 259
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return True
+
+def _owner_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def _owner_alive(owner, heartbeat):
+    """Pemilik job dianggap hidup jika heartbeat masih baru dan prosesnya (di mesin ini) masih ada."""
+    if not owner or heartbeat is None or time.time() - heartbeat > JOB_STALE_SECONDS: return False
+    host, _, pid = owner.rpartition(":")
+    # Proses di mesin lain (jurnal di folder bersama) tidak bisa diperiksa; cukup heartbeat.
+    if host != socket.gethostname(): return True
+    try:
+        return _pid_alive(int(pid))
+    except ValueError:
+        return False
+
+class JournalError(Exception):
+    """Kesalahan membaca atau menulis jurnal job."""
+    pass
+
+@dataclass
+class JobRecord:
+    """Satu job batch di jurnal beserta ringkasan progresnya."""
+    job_id: str
+    status: str
+    template_name: str
+    template: dict
+    output: str
+    output_kind: str
+    options: dict
+    total: int
+    done_count: int
+    failed_count: int
+    skipped_count: int
+    created: float
+    updated: float
+    # Job berstatus running yang pemiliknya masih hidup (bukan sisa crash).
+    live: bool = False
+
+    @property
+    def pending_count(self):
+        return self.total - self.done_count - self.failed_count - self.skipped_count
+
+    def summary(self):
+        created = time.strftime("%Y-%m-%d %H:%M", time.localtime(self.created))
+        skipped = f", {self.skipped_count} dilewati" if self.skipped_count else ""
+        status = "terhenti" if self.status == JOB_RUNNING and not self.live else self.status
+        return (f"{self.job_id}  {status:<9}  {created}  {self.done_count}/{self.total} selesai, "
+                f"{self.failed_count} gagal{skipped}  '{self.template_name}' -> {self.output}")
+
+class JobJournal:
+    """
+    Jurnal write-ahead untuk batch, di SQLite (mode WAL, synchronous=FULL)
+    pada app data dir. Daftar file dicatat saat job dibuat, lalu hasil setiap
+    file (nama di output atau error) di-commit begitu file itu selesai
+    ditulis, sehingga setelah crash atau reboot job bisa dilanjutkan dari
+    file terakhir yang tercatat.
+
+    Job yang berjalan menyimpan pemiliknya (host:pid) dan heartbeat, agar
+    job yang masih hidup tidak bisa dilanjutkan oleh proses lain.
+    """
+    def __init__(self, path=None):
+        self.path = str(path or get_app_data_dir() / JOURNAL_FILENAME)
+        try:
+            self._conn = sqlite3.connect(self.path, timeout=30)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=FULL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS jobs (job_id TEXT PRIMARY KEY, status TEXT NOT NULL, "
+                               "template_name TEXT NOT NULL, template TEXT NOT NULL, output TEXT NOT NULL, "
+                               "output_kind TEXT NOT NULL, options TEXT NOT NULL, total INTEGER NOT NULL, "
+                               "created REAL NOT NULL, updated REAL NOT NULL, owner TEXT, heartbeat REAL)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS files (job_id TEXT NOT NULL, idx INTEGER NOT NULL, "
+                               "path TEXT NOT NULL, status TEXT NOT NULL, output_name TEXT, error TEXT, "
+                               "PRIMARY KEY (job_id, idx)) WITHOUT ROWID")
+            # Jurnal dari versi sebelumnya belum punya kolom pemilik.
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+            with self._conn:
+                if "owner" not in columns: self._conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+                if "heartbeat" not in columns: self._conn.execute("ALTER TABLE jobs ADD COLUMN heartbeat REAL")
+        except sqlite3.Error as e:
+            raise JournalError(f"Jurnal job tidak dapat dibuka: {e}")
+
+    def create_job(self, file_paths, template, template_name, output, output_kind, options=None):
+        """Mencatat job baru beserta seluruh daftar file-nya. Mengembalikan JobRun."""
+        job_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.urandom(2).hex()}"
+        now = time.time()
+        try:
+            self.prune_jobs(JOB_RETENTION_DAYS, statuses=(JOB_COMPLETED,))
+        except JournalError as e:
+            logging.warning(e)
+        try:
+            with self._conn:
+                self._conn.execute("INSERT INTO jobs (job_id, status, template_name, template, output, output_kind, "
+                                   "options, total, created, updated, owner, heartbeat) "
+                                   "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                   (job_id, JOB_RUNNING, template_name, json.dumps(template or {}, ensure_ascii=False),
+                                    str(output), output_kind, json.dumps(options or {}), len(file_paths), now, now,
+                                    _owner_id(), now))
+                self._conn.executemany("INSERT INTO files (job_id, idx, path, status) VALUES (?, ?, ?, ?)",
+                                       ((job_id, i, str(path), FILE_PENDING) for i, path in enumerate(file_paths)))
+        except sqlite3.Error as e:
+            raise JournalError(f"Gagal mencatat job baru: {e}")
+        return JobRun(self, job_id, [str(path) for path in file_paths])
+
+    def get_job(self, job_id):
+        row = self._conn.execute("SELECT job_id, status, template_name, template, output, output_kind, options, total, "
+                                 "created, updated, owner, heartbeat FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None: raise JournalError(f"Job tidak ditemukan: {job_id}")
+        return self._record(row)
+
+    def list_jobs(self, limit=20):
+        rows = self._conn.execute("SELECT job_id, status, template_name, template, output, output_kind, options, total, "
+                                  "created, updated, owner, heartbeat FROM jobs ORDER BY created DESC LIMIT ?",
+                                  (limit,)).fetchall()
+        return [self._record(row) for row in rows]
+
+    def _record(self, row):
+        job_id, status, template_name, template, output, output_kind, options, total, created, updated, owner, heartbeat = row
+        counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM files WHERE job_id = ? GROUP BY status", (job_id,)))
+        return JobRecord(job_id, status, template_name, json.loads(template), output, output_kind, json.loads(options),
+                         total, counts.get(FILE_DONE, 0), counts.get(FILE_FAILED, 0), counts.get(FILE_SKIPPED, 0),
+                         created, updated, status == JOB_RUNNING and _owner_alive(owner, heartbeat))
+
+    def resume_job(self, job_id):
+        """
+        JobRun untuk melanjutkan job: file yang belum tercatat selesai akan
+        diproses lagi. File yang gagal juga dicoba ulang. Job yang masih
+        dijalankan proses lain ditolak; kepemilikan diambil alih secara atomik
+        sehingga dua resume bersamaan tidak bisa sama-sama berhasil.
+        """
+        row = self._conn.execute("SELECT status, owner, heartbeat FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None: raise JournalError(f"Job tidak ditemukan: {job_id}")
+        status, owner, heartbeat = row
+        if status == JOB_COMPLETED: raise JournalError(f"Job {job_id} sudah selesai.")
+        if status == JOB_RUNNING and _owner_alive(owner, heartbeat):
+            raise JournalError(f"Job {job_id} masih berjalan di proses {owner}.")
+        now = time.time()
+        with self._conn:
+            claimed = self._conn.execute("UPDATE jobs SET status = ?, updated = ?, owner = ?, heartbeat = ? "
+                                         "WHERE job_id = ? AND owner IS ? AND heartbeat IS ?",
+                                         (JOB_RUNNING, now, _owner_id(), now, job_id, owner, heartbeat)).rowcount
+        if not claimed: raise JournalError(f"Job {job_id} sedang dilanjutkan oleh proses lain.")
+        paths = [path for (path,) in self._conn.execute("SELECT path FROM files WHERE job_id = ? ORDER BY idx", (job_id,))]
+        return JobRun(self, job_id, paths)
+
+    def prune_jobs(self, older_than_days=JOB_RETENTION_DAYS, statuses=None):
+        """
+        Menghapus job (beserta daftar file-nya) yang terakhir diperbarui lebih
+        dari older_than_days hari lalu, hanya untuk status di statuses (default:
+        semua). Job yang masih hidup tidak pernah dihapus. Mengembalikan
+        jumlah job yang dihapus.
+        """
+        cutoff = time.time() - older_than_days * 86400
+        try:
+            rows = self._conn.execute("SELECT job_id, status, owner, heartbeat FROM jobs WHERE updated < ?", (cutoff,))
+            job_ids = [(job_id,) for job_id, status, owner, heartbeat in rows.fetchall()
+                       if (statuses is None or status in statuses) and
+                       not (status == JOB_RUNNING and _owner_alive(owner, heartbeat))]
+            with self._conn:
+                self._conn.executemany("DELETE FROM files WHERE job_id = ?", job_ids)
+                self._conn.executemany("DELETE FROM jobs WHERE job_id = ?", job_ids)
+        except sqlite3.Error as e:
+            raise JournalError(f"Gagal menghapus job lama dari jurnal: {e}")
+        return len(job_ids)
+
+    def completed_files(self, job_id):
+        """[(path, output_name)] untuk file yang sudah tercatat berhasil ditulis."""
+        return self._conn.execute("SELECT path, output_name FROM files WHERE job_id = ? AND status = ? ORDER BY idx",
+                                  (job_id, FILE_DONE)).fetchall()
+
+    def unfinished_files(self, job_id):
+        """Path yang belum selesai (pending atau gagal); file yang sengaja dilewati tidak diproses lagi."""
+        return [path for (path,) in self._conn.execute(
+            "SELECT path FROM files WHERE job_id = ? AND status NOT IN (?, ?) ORDER BY idx",
+            (job_id, FILE_DONE, FILE_SKIPPED))]
+
+    def record_file(self, job_id, index, output_name, error=None, skipped=False, heartbeat=None):
+        """Mencatat hasil satu file; heartbeat (timestamp) ikut ditulis di transaksi yang sama jika diberikan."""
+        status = FILE_DONE if output_name else FILE_SKIPPED if skipped else FILE_FAILED
+        with self._conn:
+            self._conn.execute("UPDATE files SET status = ?, output_name = ?, error = ? WHERE job_id = ? AND idx = ?",
+                               (status, output_name, None if output_name else error, job_id, index))
+            if heartbeat is not None:
+                self._conn.execute("UPDATE jobs SET heartbeat = ? WHERE job_id = ?", (heartbeat, job_id))
+
+    def _set_status(self, job_id, status):
+        with self._conn:
+            self._conn.execute("UPDATE jobs SET status = ?, updated = ? WHERE job_id = ?", (status, time.time(), job_id))
+
+    def close(self):
+        self._conn.close()
+
+class JobRun:
+    """Penghubung antara satu job di jurnal dan run_batch yang sedang berjalan."""
+    def __init__(self, journal, job_id, paths):
+        self.journal = journal
+        self.job_id = job_id
+        self._index = {path: i for i, path in enumerate(paths)}
+        self._last_heartbeat = time.monotonic()
+
+    def _index_of(self, file_path):
+        index = self._index.get(str(file_path))
+        if index is None: index = self._index.get(str(Path(file_path).resolve()))
+        return index
+
+    def record(self, file_path, output_name, error=None, skipped=False):
+        """
+        Dipanggil setelah hasil file ditulis ke output (atau gagal, atau
+        sengaja dilewati); langsung di-commit.
+        """
+        index = self._index_of(file_path)
+        if index is None: return
+        heartbeat = None
+        if time.monotonic() - self._last_heartbeat >= JOB_HEARTBEAT_INTERVAL:
+            heartbeat, self._last_heartbeat = time.time(), time.monotonic()
+        try:
+            self.journal.record_file(self.job_id, index, output_name, error, skipped, heartbeat)
+        except sqlite3.Error as e:
+            logging.error(f"Gagal mencatat hasil ke jurnal job {self.job_id}: {e}")
+
+    def finish(self, status):
+        try:
+            self.journal._set_status(self.job_id, status)
+        except sqlite3.Error as e:
+            logging.error(f"Gagal memperbarui status job {self.job_id}: {e}")
+
+def test_job_journal():
+    """
+    Resume hanya mengembalikan file yang belum selesai (yang gagal dicoba
+    ulang, yang dilewati tidak), job yang masih hidup tidak bisa dilanjutkan,
+    dan prune_jobs menghapus job lama.
+    """
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        journal = JobJournal(Path(temp_dir) / "jobs.sqlite3")
+        paths = ["a.pdf", "b.pdf", "c.pdf", "d.pdf"]
+        run = journal.create_job(paths, {"rules": ["Nama"]}, "Tpl", "hasil.zip", OUTPUT_KIND_ZIP)
+        run.record("a.pdf", "A.pdf")
+        run.record("b.pdf", None, "Field tidak ditemukan: Nama")
+        run.record("c.pdf", None, "Duplikat dari a.pdf", skipped=True)
+
+        try:
+            journal.resume_job(run.job_id)
+            raise AssertionError("Job yang masih berjalan bisa dilanjutkan")
+        except JournalError:
+            pass
+
+        # Tiru crash: heartbeat pemilik sudah lama tidak diperbarui.
+        with journal._conn:
+            journal._conn.execute("UPDATE jobs SET heartbeat = ?", (time.time() - JOB_STALE_SECONDS - 1,))
+        record = journal.get_job(run.job_id)
+        assert not record.live and (record.done_count, record.failed_count, record.skipped_count) == (1, 1, 1), \
+            f"Ringkasan job salah: {record}"
+        resumed = journal.resume_job(run.job_id)
+        assert journal.completed_files(run.job_id) == [("a.pdf", "A.pdf")], "File selesai tidak tercatat"
+        assert journal.unfinished_files(run.job_id) == ["b.pdf", "d.pdf"], \
+            f"Resume memproses ulang file yang sudah selesai: {journal.unfinished_files(run.job_id)}"
+        assert journal.get_job(run.job_id).live, "Job yang dilanjutkan tidak tercatat milik proses ini"
+
+        resumed.record("b.pdf", "B.pdf")
+        resumed.record("d.pdf", "D.pdf")
+        resumed.finish(JOB_COMPLETED)
+        assert journal.get_job(run.job_id).pending_count == 0, "Masih ada file tertunda setelah job selesai"
+        assert journal.prune_jobs(older_than_days=1) == 0, "Job baru ikut dihapus"
+        assert journal.prune_jobs(older_than_days=0) == 1 and not journal.list_jobs(), "Job lama tidak dihapus"
+        journal.close()
+    print("JobJournal OK: resume melewati file yang selesai/dilewati, job hidup ditolak, prune berjalan.")
+
+if __name__ == "__main__":
+    # Jalankan pengujian jika file ini dieksekusi
+    test_job_journal()
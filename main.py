@@ -1,4 +1,5 @@
 import sys
+import multiprocessing
 from PyQt5.QtWidgets import QApplication
 from ui_main import PDFRenamerApp
 
@@ -7,6 +8,7 @@ if __name__ == "__main__":
     Titik masuk utama aplikasi.
     Menginisialisasi QApplication dan menampilkan jendela utama.
     """
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     window = PDFRenamerApp()
     window.show()
@@ -0,0 +1,192 @@
+import json
+import logging
+import os
+from dataclasses import dataclass, asdict, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from cache_tools import hash_file
+
+MANIFEST_VERSION = 1
+DIRECTORY_MANIFEST_NAME = ".pdf_renamer_manifest.json"
+
+def manifest_path_for(output):
+    """
+    Lokasi manifest untuk sebuah output: file tersembunyi di dalam folder
+    output, atau '<arsip>.manifest.json' di samping arsip ZIP.
+    """
+    output = Path(output)
+    if output.suffix.lower() == ".zip": return output.with_name(output.name + ".manifest.json")
+    return output / DIRECTORY_MANIFEST_NAME
+
+def file_signature(path):
+    """(size, mtime_ns, inode) dari stat, atau None jika file tidak bisa di-stat."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns, st.st_ino
+
+@dataclass
+class ManifestEntry:
+    """Status satu file input pada run terakhir beserta hasilnya (nama di output atau error)."""
+    size: int
+    mtime_ns: int
+    inode: int
+    hash: Optional[str]
+    name: Optional[str] = None
+    error: Optional[str] = None
+
+    @property
+    def signature(self):
+        return self.size, self.mtime_ns, self.inode
+
+@dataclass
+class IncrementalPlan:
+    """Pembagian file input untuk satu run inkremental."""
+    to_process: List[str] = field(default_factory=list)
+    # Entri yang dipakai ulang apa adanya (isi file tidak berubah).
+    unchanged: Dict[str, ManifestEntry] = field(default_factory=dict)
+    # Entri lama yang hasilnya harus dibuang dari output (file berubah atau hilang).
+    stale: Dict[str, ManifestEntry] = field(default_factory=dict)
+    # Signature dan hash file yang akan diproses, untuk dicatat setelah selesai.
+    pending: Dict[str, ManifestEntry] = field(default_factory=dict)
+
+    @property
+    def has_changes(self):
+        return bool(self.to_process or self.stale)
+
+class FileManifest:
+    """
+    Manifest (path, size, mtime_ns, inode, hash, hasil) dari run sebelumnya,
+    disimpan sebagai JSON di samping output. File yang signature stat-nya
+    sama dilewati tanpa dibuka; file yang hanya tersentuh (stat berubah,
+    hash sama) juga tidak diproses ulang. Manifest dari template atau versi
+    template lain dianggap kosong.
+    """
+    def __init__(self, path, template_version):
+        self.path = Path(path)
+        self.template_version = template_version
+        self.entries = {}
+        self.previous = {}
+        self._pending = {}
+        self._load()
+
+    @classmethod
+    def for_output(cls, output, template_version):
+        """Manifest untuk output ini; diabaikan jika output-nya sendiri sudah tidak ada."""
+        manifest = cls(manifest_path_for(output), template_version)
+        if not Path(output).exists(): manifest.entries, manifest.previous = {}, {}
+        return manifest
+
+    def _load(self):
+        if not self.path.exists(): return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            entries = {p: ManifestEntry(**entry) for p, entry in data.get("files", {}).items()}
+        except (json.JSONDecodeError, OSError, AttributeError, TypeError) as e:
+            logging.warning(f"Manifest tidak bisa dibaca, semua file diproses ulang: {e}")
+            return
+        # Entri dari template lain tetap diingat agar hasil lamanya bisa dibersihkan.
+        self.previous = entries
+        if data.get("version") == MANIFEST_VERSION and data.get("template_version") == self.template_version:
+            self.entries = entries
+
+    def plan(self, file_paths):
+        """Menentukan file mana yang perlu diproses dan hasil lama mana yang harus dibuang."""
+        plan = IncrementalPlan()
+        current = set()
+        for path in file_paths:
+            path = str(path)
+            current.add(path)
+            signature = file_signature(path)
+            entry = self.entries.get(path)
+            if signature is None:
+                # Biarkan pdf_tools yang melaporkan error-nya.
+                plan.to_process.append(path)
+                if path in self.previous: plan.stale[path] = self.previous[path]
+                continue
+            if entry is not None and entry.signature == signature:
+                plan.unchanged[path] = entry
+                continue
+            try:
+                content_hash = hash_file(path)
+            except OSError:
+                content_hash = None
+            if entry is not None and content_hash is not None and entry.hash == content_hash:
+                plan.unchanged[path] = ManifestEntry(*signature, content_hash, entry.name, entry.error)
+                continue
+            plan.to_process.append(path)
+            plan.pending[path] = ManifestEntry(*signature, content_hash)
+            if path in self.previous: plan.stale[path] = self.previous[path]
+        for path, entry in self.previous.items():
+            if path not in current: plan.stale[path] = entry
+        self.entries = dict(plan.unchanged)
+        self._pending = plan.pending
+        return plan
+
+    def requeue(self, path):
+        """Memindahkan file yang tadinya dilewati kembali ke antrean proses (mis. hasil lamanya hilang)."""
+        entry = self.entries.pop(path)
+        self._pending[path] = ManifestEntry(entry.size, entry.mtime_ns, entry.inode, entry.hash)
+
+    def record(self, path, name, error):
+        """Mencatat hasil satu file yang baru diproses."""
+        entry = self._pending.get(path)
+        if entry is None: return
+        entry.name, entry.error = name, error
+        self.entries[path] = entry
+
+    def save(self):
+        temp_path = self.path.with_name(self.path.name + ".tmp")
+        data = {"version": MANIFEST_VERSION, "template_version": self.template_version,
+                "files": {p: asdict(entry) for p, entry in self.entries.items()}}
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            temp_path.replace(self.path)
+        except OSError as e:
+            logging.error(f"Gagal menyimpan manifest: {e}")
+
+def test_file_manifest():
+    """
+    File yang tidak berubah dilewati (termasuk yang hanya tersentuh), file
+    yang isinya berubah atau hilang masuk stale, dan versi template lain
+    membuat semua file diproses ulang.
+    """
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_dir = Path(temp_dir)
+        inputs = [str(temp_dir / name) for name in ("a.pdf", "b.pdf", "c.pdf")]
+        for path in inputs: Path(path).write_bytes(f"%PDF {path}".encode())
+        output = temp_dir / "hasil"
+        output.mkdir()
+
+        manifest = FileManifest.for_output(output, "v1")
+        plan = manifest.plan(inputs)
+        assert plan.to_process == inputs and not plan.stale, "Run pertama harus memproses semua file"
+        for path in inputs: manifest.record(path, Path(path).stem.upper() + ".pdf", None)
+        manifest.save()
+
+        manifest = FileManifest.for_output(output, "v1")
+        plan = manifest.plan(inputs)
+        assert not plan.has_changes and plan.unchanged[inputs[0]].name == "A.pdf", "File tidak berubah diproses ulang"
+
+        # a hanya tersentuh (isi sama), b diubah, c dihapus dari input.
+        st = os.stat(inputs[0])
+        os.utime(inputs[0], ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+        Path(inputs[1]).write_bytes(b"%PDF isi baru")
+        plan = manifest.plan(inputs[:2])
+        assert plan.to_process == [inputs[1]], f"File yang diproses salah: {plan.to_process}"
+        assert set(plan.stale) == {inputs[1], inputs[2]}, f"Hasil lama yang dibuang salah: {set(plan.stale)}"
+        assert inputs[0] in plan.unchanged, "File yang hanya tersentuh diproses ulang"
+
+        manifest = FileManifest.for_output(output, "v2")
+        assert manifest.plan(inputs).to_process == inputs, "Versi template lain harus memproses ulang semua file"
+    print("FileManifest OK: file tidak berubah dilewati, file berubah/hilang dibuang dari output.")
+
+if __name__ == "__main__":
+    # Jalankan pengujian jika file ini dieksekusi
+    test_file_manifest()
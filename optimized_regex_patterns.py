@@ -1,8 +1,35 @@
 import re
-from typing import Dict, List, Tuple
+from array import array
+from bisect import bisect_right
+from functools import lru_cache, partial
+from itertools import accumulate, compress, count
+from operator import ge
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
 from dataclasses import dataclass
 import logging
 
+# Panjang baris minimum yang bisa menghasilkan kandidat pada strategi mana pun.
+MIN_CANDIDATE_LINE_LENGTH = 6
+
+# Strategi "label di satu baris, nilai di baris berikutnya". Tidak bisa
+# ditulis sebagai satu regex (Python menolak lookbehind dengan lebar
+# variabel), jadi dijalankan sebagai pemindaian pasangan baris; baris kosong
+# di antara label dan nilainya dilewati.
+MULTILINE_PATTERN_NAME = "aggressive_multiline"
+MULTILINE_BASE_CONFIDENCE = 0.75
+# Label 2-40 karakter yang diawali dan diakhiri karakter bukan spasi; tanpa
+# kuantifier lazy sehingga regex tidak mundur berulang di baris berspasi banyak.
+_LABEL_LINE = re.compile(r"[ \t]*([\w\-\.()][\w \t\-\.()]{0,38}[\w\-\.()])[ \t]*[:：]?[ \t]*")
+# Label terpanjang: 40 karakter + titik dua; baris yang lebih panjang setelah
+# di-strip tidak perlu diuji dengan regex.
+MAX_LABEL_LINE_LENGTH = 41
+# Kandidat dinilai dan direduksi per kelompok sebesar ini, sehingga memori
+# tidak bertambah seiring panjang dokumen.
+CANDIDATE_BATCH_SIZE = 2048
+# Label field yang sama muncul berulang di ribuan dokumen; hasil normalisasi
+# dan penalti key disimpan di cache per proses.
+FIELD_NAME_CACHE_SIZE = 8192
+
 @dataclass
 class ExtractedField:
     """Data class untuk field yang diekstrak beserta metadatanya."""
@@ -12,6 +39,215 @@ class ExtractedField:
     pattern_used: str
     line_number: int
 
+class Candidate(NamedTuple):
+    """
+    Kandidat mentah dari satu baris. Berbasis tuple (tanpa __dict__) agar
+    murah dibuat; hanya kandidat pemenang yang menjadi ExtractedField.
+    """
+    key: str
+    value: str
+    base_confidence: float
+    pattern_name: str
+    pattern_index: int
+    line_index: int
+
+class _BestCandidate:
+    """Kandidat terbaik sementara untuk satu nama field ternormalisasi."""
+    __slots__ = ("first_seen", "candidate", "confidence")
+
+    def __init__(self, first_seen, candidate, confidence):
+        self.first_seen = first_seen
+        self.candidate = candidate
+        self.confidence = confidence
+
+class LineIndex:
+    """
+    Indeks baris satu dokumen: daftar baris dan offset awal setiap baris
+    (array + bisect). Dibangun sekali per dokumen lalu dipakai bersama oleh
+    semua strategi, sehingga konversi offset -> nomor baris cukup O(log n)
+    tanpa menghitung ulang newline dari awal teks.
+    """
+    __slots__ = ("text", "lines", "starts")
+
+    def __init__(self, text: str):
+        self.text = text
+        self.lines = text.split('\n')
+        self.starts = array('q', accumulate((len(line) + 1 for line in self.lines[:-1]), initial=0))
+
+    def __len__(self) -> int:
+        return len(self.lines)
+
+    def line_number(self, offset: int) -> int:
+        """Nomor baris (mulai dari 1) untuk sebuah offset karakter di teks."""
+        return bisect_right(self.starts, offset)
+
+# Pola penilaian confidence, dikompilasi sekali untuk semua dokumen.
+STOP_WORDS = ('adalah', 'dengan', 'untuk', 'yang', 'dari', 'keterangan')
+_ALNUM = re.compile(r'[a-zA-Z0-9]')
+_DATE_PATTERNS = (
+    re.compile(r'\b\d{1,2}[-/]\d{1,2}[-/]\d{2,4}\b', re.IGNORECASE),
+    re.compile(r'\b\d{1,2}\s+(Jan|Feb|Mar|Apr|Mei|Jun|Jul|Agu|Sep|Okt|Nov|Des)\w*\s+\d{2,4}\b', re.IGNORECASE),
+)
+_ID_SEPARATORS = re.compile(r'[\s\-\.]')
+_ID_NUMBER = re.compile(r'^\d{15,18}$')
+_PHONE_SEPARATORS = re.compile(r'[\s\-\(\)]')
+_PHONE_NUMBER = re.compile(r'^(\+62|62|08)\d{8,12}$')
+_EMAIL = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+
+# Bonus per jenis nilai; urutan = prioritas (tanggal > ID > telepon > email).
+VALUE_BONUSES = {"date": 0.15, "id": 0.20, "phone": 0.20, "email": 0.25}
+
+# Keempat pemeriksaan di atas sebagai satu alternasi dengan named group, untuk
+# dijalankan sekali pada semua nilai yang digabung per baris. Pemisah yang
+# dibuang oleh re.sub menjadi bagian pola, dan whitespace dibatasi agar tidak
+# melewati newline pemisah nilai.
+_WS = r"[^\S\n]"
+_ID_SEP = r"(?:" + _WS + r"|[-.])"
+_PHONE_SEP = r"(?:" + _WS + r"|[-()])"
+_VALUE_CLASSES = re.compile(
+    r"^(?:"
+    r"(?P<date>[^\n]*?(?:\b\d{1,2}[-/]\d{1,2}[-/]\d{2,4}\b"
+    r"|\b\d{1,2}" + _WS + r"+(?i:Jan|Feb|Mar|Apr|Mei|Jun|Jul|Agu|Sep|Okt|Nov|Des)\w*" + _WS + r"+\d{2,4}\b)[^\n]*)"
+    r"|(?P<id>" + _ID_SEP + r"*(?:\d" + _ID_SEP + r"*){15,18})"
+    r"|(?P<phone>" + _PHONE_SEP + r"*(?:\+" + _PHONE_SEP + r"*6" + _PHONE_SEP + r"*2|6" + _PHONE_SEP + r"*2|0"
+    + _PHONE_SEP + r"*8)(?:" + _PHONE_SEP + r"*\d){8,12}" + _PHONE_SEP + r"*)"
+    r"|(?P<email>" + _WS + r"*[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}" + _WS + r"*)"
+    r")$", re.MULTILINE)
+
+@lru_cache(maxsize=FIELD_NAME_CACHE_SIZE)
+def _has_key_penalty(key: str) -> bool:
+    words = key.lower().split()
+    return any(word in words for word in STOP_WORDS) or len(key.split()) > 4
+
+def _apply_score(base_confidence, key_penalty, many_words, no_alnum, value_class, pattern_name) -> float:
+    # Urutan operasi sengaja sama dengan versi per kandidat agar hasil float identik.
+    confidence = base_confidence
+    if key_penalty: confidence -= 0.5
+    if many_words: confidence -= 0.2
+    if no_alnum: confidence -= 0.5
+    if value_class: confidence += VALUE_BONUSES[value_class]
+    if pattern_name == 'standard_ktp_id': confidence = 1.0
+    return min(1.0, max(0.0, confidence))
+
+def classify_values(values) -> Dict[str, Optional[str]]:
+    """
+    Mengklasifikasikan banyak nilai sekaligus sebagai 'date', 'id', 'phone',
+    'email' atau None. Nilai unik digabung per baris lalu dipindai dengan
+    satu finditer; baris hasil match dipetakan kembali lewat LineIndex.
+    """
+    classes = dict.fromkeys(values)
+    single_line = [value for value in classes if '\n' not in value]
+    if single_line:
+        joined = '\n'.join(single_line)
+        line_index = LineIndex(joined)
+        for match in _VALUE_CLASSES.finditer(joined):
+            classes[single_line[line_index.line_number(match.start()) - 1]] = match.lastgroup
+    for value in classes:
+        if '\n' in value:
+            # Newline setara spasi untuk semua pemeriksaan (whitespace / pemisah).
+            match = _VALUE_CLASSES.match(value.replace('\n', ' '))
+            classes[value] = match.lastgroup if match else None
+    return classes
+
+_FIELD_NAME_EDGES = re.compile(r'^[^\w]+|[^\w\s]+$')
+NOISE_WORDS = frozenset(['no', 'nomor', 'number', 'kode', 'id', 'tanda', 'kartu', 'isilah', 'dengan'])
+FIELD_NAME_STANDARDIZATIONS = {
+    'tgl': 'tanggal', 'telp': 'telepon', 'almt': 'alamat', 'nama lengkap': 'nama',
+    'tempat tanggal lahir': 'tempat/tgl lahir'
+}
+
+@lru_cache(maxsize=FIELD_NAME_CACHE_SIZE)
+def normalize_field_name(field_name: str) -> str:
+    """
+    Normalisasi nama field yang lebih agresif. Hasilnya di-cache karena label
+    yang sama berulang di banyak baris dan dokumen.
+    """
+    normalized = field_name.lower().strip()
+    normalized = _FIELD_NAME_EDGES.sub('', normalized).strip()
+
+    words = normalized.split()
+    cleaned_words = [w for w in words if w not in NOISE_WORDS]
+    normalized = ' '.join(cleaned_words) if cleaned_words else normalized
+    return FIELD_NAME_STANDARDIZATIONS.get(normalized, normalized)
+
+class RuleMatcher:
+    """
+    Aturan template yang sudah diproses untuk extract_fields_targeted: nama
+    ternormalisasi dan bentuk huruf kecil per aturan, serta kata kunci untuk
+    memilih baris. Setiap kata pada nama ternormalisasi adalah substring dari
+    key aslinya (huruf kecil), jadi baris tanpa kata terpanjang dari sebuah
+    target (atau singkatannya, mis. 'tgl' untuk 'tanggal') tidak mungkin
+    menghasilkan key tersebut.
+    """
+    __slots__ = ("rules", "normalized", "lowered", "targets", "needles")
+
+    def __init__(self, rules):
+        self.rules = tuple(rules)
+        self.normalized = {rule: normalize_field_name(rule) for rule in self.rules}
+        self.lowered = {rule: rule.lower() for rule in self.rules}
+        self.targets = frozenset(self.normalized.values()) - {''}
+        needles = set()
+        for target in self.targets:
+            forms = [target] + [abbrev for abbrev, full in FIELD_NAME_STANDARDIZATIONS.items() if full == target]
+            for form in forms:
+                needles.add(max(form.split(), key=len))
+        self.needles = frozenset(needles)
+
+def _label_of(line: str) -> Optional[str]:
+    """Label jika baris hanya berisi label (strategi aggressive_multiline), selain itu None."""
+    if not 2 <= len(line.strip()) <= MAX_LABEL_LINE_LENGTH: return None
+    label_match = _LABEL_LINE.fullmatch(line)
+    return label_match.group(1) if label_match else None
+
+def _is_value_line(line: str) -> bool:
+    return 2 <= len(line.strip()) <= 100
+
+def _next_content_line(lines: List[str], idx: int) -> Optional[int]:
+    """Indeks baris tidak kosong pertama setelah idx, atau None."""
+    for next_idx in range(idx + 1, len(lines)):
+        if lines[next_idx].strip(): return next_idx
+    return None
+
+def _previous_content_line(lines: List[str], idx: int) -> Optional[int]:
+    """Indeks baris tidak kosong terakhir sebelum idx, atau None."""
+    for previous_idx in range(idx - 1, -1, -1):
+        if lines[previous_idx].strip(): return previous_idx
+    return None
+
+def _consumed_as_value(lines: List[str], idx: int) -> bool:
+    """
+    Apakah baris idx sudah dipakai sebagai nilai oleh label di atasnya.
+    Pasangan label/nilai tidak tumpang tindih, jadi dalam rangkaian baris
+    label berurutan (baris kosong dilewati) pasangan terbentuk
+    berselang-seling dari awal rangkaian.
+    """
+    steps, current = 0, idx
+    while _is_value_line(lines[current]):
+        previous = _previous_content_line(lines, current)
+        if previous is None or _label_of(lines[previous]) is None: break
+        current = previous
+        steps += 1
+    return steps % 2 == 1
+
+def _label_value_pairs(lines: List[str]) -> Iterator[Tuple[str, str, int]]:
+    """
+    Pasangan (label, nilai, indeks baris nilai) strategi aggressive_multiline
+    untuk seluruh dokumen. Baris yang setelah di-strip lebih panjang dari
+    label terpanjang (mayoritas baris tabel) disaring lewat map/compress
+    tanpa loop Python per baris.
+    """
+    short_lines = compress(count(), map(partial(ge, MAX_LABEL_LINE_LENGTH), map(len, map(str.strip, lines))))
+    consumed = -1
+    for idx in short_lines:
+        # Pasangan tidak tumpang tindih: baris nilai tidak dipakai lagi sebagai label.
+        if idx == consumed: continue
+        label = _label_of(lines[idx])
+        if label is None: continue
+        value_idx = _next_content_line(lines, idx)
+        if value_idx is not None and _is_value_line(lines[value_idx]):
+            consumed = value_idx
+            yield label, lines[value_idx].strip(), value_idx
+
 class OptimizedRegexExtractor:
     """
     Extractor regex yang dioptimalkan dengan strategi yang jauh lebih agresif
@@ -38,9 +274,6 @@ class OptimizedRegexExtractor:
              
             (r"^[ \t]*([A-Z][A-Z0-9\s\-\.]{2,39})[ \t]+([^\r\n]{2,100})$",
              "aggressive_uppercase", 0.65),
-
-            (r"^(?<=\n\s*([\w\s\-\.()]{2,40}?)\s*[:：]?\s*\n)\s*([^\r\n]{2,100})$",
-             "aggressive_multiline", 0.75),
         ]
         
         compiled = []
@@ -53,124 +286,230 @@ class OptimizedRegexExtractor:
                 
         return compiled
     
-    def extract_fields_advanced(self, text: str, min_confidence: float = 0.55) -> Dict[str, ExtractedField]:
+    def extract_fields_advanced(self, text: str, min_confidence: float = 0.55,
+                                line_index: Optional[LineIndex] = None,
+                                multiline: bool = True,
+                                batch_size: int = CANDIDATE_BATCH_SIZE) -> Dict[str, ExtractedField]:
         """
-        Ekstraksi field tingkat lanjut, memproses seluruh teks sekaligus.
+        Ekstraksi field tingkat lanjut dalam satu kali pemindaian teks.
+
+        Teks dipecah per baris sekali, lalu setiap baris diuji terhadap semua
+        strategi sesuai urutan prioritasnya. Hanya kandidat terbaik per nama
+        field ternormalisasi yang disimpan selama pemindaian, sehingga tidak
+        ada daftar kandidat yang harus dideduplikasi di akhir.
+
+        Dengan multiline=True, baris yang hanya berisi label juga dipasangkan
+        dengan baris tidak kosong berikutnya sebagai nilainya (strategi
+        aggressive_multiline).
+        line_index boleh diberikan jika pemanggil sudah membangun LineIndex
+        untuk teks yang sama. Kandidat diteruskan ke reducer setiap
+        batch_size kandidat.
         """
         if not text or not text.strip():
             return {}
-        
-        all_matches = []
-        processed_text = '\n' + text
 
-        for compiled_pattern, pattern_name, base_confidence in self.compiled_patterns:
-            try:
-                for match in compiled_pattern.finditer(processed_text):
-                    groups = match.groups()
-                    if len(groups) >= 2:
-                        key, value = (groups[1], groups[2]) if pattern_name == 'aggressive_multiline' else (groups[0], groups[1])
-                        key, value = key.strip(), value.strip()
-                        
-                        if not key or not value or len(key) > 40 or len(value) > 100:
-                            continue
-                        
-                        line_number = processed_text.count('\n', 0, match.start())
-                        confidence = self._calculate_confidence(key, value, base_confidence, pattern_name)
-                        
-                        if confidence >= min_confidence:
-                            all_matches.append(ExtractedField(
-                                key=key, value=value, confidence=confidence,
-                                pattern_used=pattern_name, line_number=line_number
-                            ))
-            except Exception as e:
-                logging.debug(f"Error saat memproses dengan pola {pattern_name}: {e}")
-        
-        return self._deduplicate_fields(all_matches)
+        if line_index is None: line_index = LineIndex(text)
+        best = {}
+        candidates = []
+        multiline_index = len(self.compiled_patterns)
+        for idx, line in enumerate(line_index.lines):
+            if len(line) >= MIN_CANDIDATE_LINE_LENGTH:
+                for pattern_index, (compiled_pattern, pattern_name, base_confidence) in enumerate(self.compiled_patterns):
+                    match = compiled_pattern.match(line)
+                    if match:
+                        self._add_candidate(candidates, match.group(1), match.group(2), base_confidence,
+                                            pattern_name, pattern_index, idx)
+            if len(candidates) >= batch_size:
+                self._reduce_candidates(best, candidates, min_confidence)
+                candidates = []
+        # Reducer tidak bergantung pada urutan kandidat, jadi pasangan multiline
+        # boleh dikumpulkan dalam pemindaian kedua yang hanya menyentuh baris pendek.
+        if multiline:
+            for label, value, value_idx in _label_value_pairs(line_index.lines):
+                self._add_candidate(candidates, label, value, MULTILINE_BASE_CONFIDENCE,
+                                    MULTILINE_PATTERN_NAME, multiline_index, value_idx)
+                if len(candidates) >= batch_size:
+                    self._reduce_candidates(best, candidates, min_confidence)
+                    candidates = []
+        self._reduce_candidates(best, candidates, min_confidence)
+
+        # Urutan hasil mengikuti kemunculan pertama per strategi, sama seperti
+        # saat setiap strategi dipindai terpisah. Hanya pemenang yang menjadi
+        # ExtractedField.
+        fields = {}
+        for entry in sorted(best.values(), key=lambda entry: entry.first_seen):
+            candidate = entry.candidate
+            fields[candidate.key] = ExtractedField(key=candidate.key, value=candidate.value,
+                                                   confidence=entry.confidence, pattern_used=candidate.pattern_name,
+                                                   line_number=candidate.line_index + 1)
+        return fields
+
+    def _add_candidate(self, candidates, key, value, base_confidence, pattern_name, pattern_index, line_index):
+        """Menyimpan Candidate jika key dan nilainya lolos batas panjang."""
+        key, value = key.strip(), value.strip()
+        if not key or not value or len(key) > 40 or len(value) > 100: return
+        candidates.append(Candidate(key, value, base_confidence, pattern_name, pattern_index, line_index))
+
+    def _reduce_candidates(self, best, candidates, min_confidence):
+        """
+        Reducer "terbaik sejauh ini" per nama field ternormalisasi. Pada skor
+        yang sama, kandidat di baris lebih awal (lalu strategi lebih awal)
+        yang menang, berapa pun urutan kandidat diberikan.
+        """
+        if not candidates: return
+        for candidate, confidence in zip(candidates, self.score_candidates(candidates)):
+            if confidence < min_confidence: continue
+            normalized_key = normalize_field_name(candidate.key)
+            if not normalized_key: continue
+
+            position = (candidate.pattern_index, candidate.line_index)
+            current = best.get(normalized_key)
+            if current is None:
+                best[normalized_key] = _BestCandidate(position, candidate, confidence)
+                continue
+            if position < current.first_seen: current.first_seen = position
+            if confidence > current.confidence or (
+                    confidence == current.confidence and
+                    (candidate.line_index, candidate.pattern_index) <
+                    (current.candidate.line_index, current.candidate.pattern_index)):
+                current.candidate = candidate
+                current.confidence = confidence
+
+    def extract_fields_targeted(self, text: str, rules, min_confidence: float = 0.55,
+                                stop_confidence: float = 1.0, line_index: Optional[LineIndex] = None,
+                                multiline: bool = True) -> Dict[str, Optional[ExtractedField]]:
+        """
+        Ekstraksi khusus untuk aturan template: hanya baris yang bisa
+        menghasilkan key dengan nama ternormalisasi salah satu aturan yang
+        diuji, dan pemindaian berhenti begitu setiap aturan punya kandidat
+        dengan confidence >= stop_confidence.
+
+        Mengembalikan {rule: ExtractedField atau None}. Sebuah aturan terpenuhi
+        jika field terbaik untuk nama ternormalisasinya memiliki key yang sama
+        dengan aturan (tanpa membedakan huruf besar/kecil), persis seperti
+        mencocokkan aturan ke hasil extract_fields_advanced. Dengan
+        stop_confidence=1.0 (default) hasilnya identik, karena kandidat
+        berskor 1.0 tidak bisa dikalahkan kandidat di baris berikutnya.
+
+        rules boleh berupa daftar aturan atau RuleMatcher yang sudah disiapkan
+        sekali untuk seluruh batch.
+        """
+        matcher = rules if isinstance(rules, RuleMatcher) else RuleMatcher(rules)
+        result = dict.fromkeys(matcher.rules)
+        targets = matcher.targets
+        if not text or not text.strip() or not targets: return result
+
+        if line_index is None: line_index = LineIndex(text)
+        lines = line_index.lines
+        multiline_index = len(self.compiled_patterns)
+        best = {}
+        for idx in self._lines_with_targets(text, line_index, matcher.needles):
+            candidates = []
+            line = lines[idx]
+            if len(line) >= MIN_CANDIDATE_LINE_LENGTH:
+                for pattern_index, (compiled_pattern, pattern_name, base_confidence) in enumerate(self.compiled_patterns):
+                    match = compiled_pattern.match(line)
+                    if match:
+                        self._add_candidate(candidates, match.group(1), match.group(2), base_confidence,
+                                            pattern_name, pattern_index, idx)
+            label = _label_of(line) if multiline else None
+            if label is not None:
+                value_idx = _next_content_line(lines, idx)
+                if (value_idx is not None and _is_value_line(lines[value_idx])
+                        and not _consumed_as_value(lines, idx)):
+                    self._add_candidate(candidates, label, lines[value_idx].strip(), MULTILINE_BASE_CONFIDENCE,
+                                        MULTILINE_PATTERN_NAME, multiline_index, value_idx)
+            candidates = [c for c in candidates if normalize_field_name(c.key) in targets]
+            self._reduce_candidates(best, candidates, min_confidence)
+
+            # Kandidat multiline ada di baris nilainya; berhenti hanya jika
+            # semua pemenang sudah berada di baris yang selesai dipindai.
+            if len(best) == len(targets) and all(entry.confidence >= stop_confidence and
+                                                 entry.candidate.line_index <= idx for entry in best.values()):
+                break
+
+        for rule in matcher.rules:
+            entry = best.get(matcher.normalized[rule])
+            if entry is not None and entry.candidate.key.lower() == matcher.lowered[rule]:
+                candidate = entry.candidate
+                result[rule] = ExtractedField(key=candidate.key, value=candidate.value, confidence=entry.confidence,
+                                              pattern_used=candidate.pattern_name,
+                                              line_number=candidate.line_index + 1)
+        return result
+
+    def _lines_with_targets(self, text, line_index, needles):
+        """Indeks baris (terurut) yang memuat salah satu kata kunci RuleMatcher.needles."""
+        lowered = text.lower()
+        # str.lower() bisa memperpanjang karakter tertentu ('İ'); offset tidak
+        # lagi sejajar, jadi semua baris dipindai.
+        if len(lowered) != len(text): return range(len(line_index))
+
+        found = set()
+        for needle in needles:
+            start = lowered.find(needle)
+            while start >= 0:
+                found.add(line_index.line_number(start) - 1)
+                start = lowered.find(needle, start + 1)
+        return sorted(found)
+
+    def score_candidates(self, candidates) -> List[float]:
+        """
+        Skor confidence untuk semua kandidat satu dokumen sekaligus.
+
+        candidates berisi tuple yang diawali (key, value, base_confidence,
+        pattern_name). Setiap nilai unik diklasifikasikan sekali lewat
+        classify_values, dan penalti per key/nilai di-memo, sehingga dokumen
+        dengan ribuan baris serupa tidak menjalankan regex yang sama berulang
+        kali. Hasilnya identik dengan _calculate_confidence per kandidat.
+        """
+        candidates = candidates if isinstance(candidates, list) else list(candidates)
+        value_classes = classify_values([candidate[1] for candidate in candidates])
+        key_penalties, value_flags = {}, {}
+        scores = []
+        for key, value, base_confidence, pattern_name, *_ in candidates:
+            key_penalty = key_penalties.get(key)
+            if key_penalty is None:
+                key_penalty = key_penalties[key] = _has_key_penalty(key)
+            flags = value_flags.get(value)
+            if flags is None:
+                flags = value_flags[value] = (len(value.split()) > 10, not _ALNUM.search(value))
+            scores.append(_apply_score(base_confidence, key_penalty, flags[0], flags[1],
+                                       value_classes[value], pattern_name))
+        return scores
 
     def _calculate_confidence(self, key: str, value: str, base_confidence: float, pattern_name: str) -> float:
         """
         Logika Skor Kepercayaan yang Diperbarui.
         """
-        confidence = base_confidence
-        key_lower = key.lower()
-        
-        stop_words = ['adalah', 'dengan', 'untuk', 'yang', 'dari', 'keterangan']
-        if any(word in key_lower.split() for word in stop_words) or len(key.split()) > 4:
-            confidence -= 0.5
-        
-        if len(value.split()) > 10:
-            confidence -= 0.2
-        if not re.search(r'[a-zA-Z0-9]', value):
-            confidence -= 0.5
-            
-        if self._is_date_like(value): confidence += 0.15
-        elif self._is_id_number_like(value): confidence += 0.20
-        elif self._is_phone_like(value): confidence += 0.20
-        elif self._is_email_like(value): confidence += 0.25
-        
-        if pattern_name == 'standard_ktp_id':
-            confidence = 1.0
-
-        return min(1.0, max(0.0, confidence))
+        value_class = None
+        if self._is_date_like(value): value_class = "date"
+        elif self._is_id_number_like(value): value_class = "id"
+        elif self._is_phone_like(value): value_class = "phone"
+        elif self._is_email_like(value): value_class = "email"
+        return _apply_score(base_confidence, _has_key_penalty(key), len(value.split()) > 10,
+                            not _ALNUM.search(value), value_class, pattern_name)
 
     def _is_date_like(self, value: str) -> bool:
-        return any(re.search(p, value, re.IGNORECASE) for p in [
-            r'\b\d{1,2}[-/]\d{1,2}[-/]\d{2,4}\b',
-            r'\b\d{1,2}\s+(Jan|Feb|Mar|Apr|Mei|Jun|Jul|Agu|Sep|Okt|Nov|Des)\w*\s+\d{2,4}\b'
-        ])
+        return any(p.search(value) for p in _DATE_PATTERNS)
 
     def _is_id_number_like(self, value: str) -> bool:
-        clean_value = re.sub(r'[\s\-\.]', '', value)
-        return re.match(r'^\d{15,18}$', clean_value) is not None
+        return _ID_NUMBER.match(_ID_SEPARATORS.sub('', value)) is not None
 
     def _is_phone_like(self, value: str) -> bool:
-        clean_value = re.sub(r'[\s\-\(\)]', '', value)
-        return re.match(r'^(\+62|62|08)\d{8,12}$', clean_value) is not None
+        return _PHONE_NUMBER.match(_PHONE_SEPARATORS.sub('', value)) is not None
 
     def _is_email_like(self, value: str) -> bool:
-        return re.match(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$', value.strip()) is not None
-
-    def _deduplicate_fields(self, matches: List[ExtractedField]) -> Dict[str, ExtractedField]:
-        """
-        Deduplikasi yang lebih pintar.
-        """
-        field_groups = {}
-        for match in matches:
-            normalized_key = self._normalize_field_name(match.key)
-            if not normalized_key: continue
-            if normalized_key not in field_groups:
-                field_groups[normalized_key] = []
-            field_groups[normalized_key].append(match)
-        
-        best_matches = {}
-        for normalized_key, group in field_groups.items():
-            group.sort(key=lambda x: (-x.confidence, x.line_number))
-            best_match = group[0]
-            best_matches[best_match.key] = best_match
-        
-        return best_matches
+        return _EMAIL.match(value.strip()) is not None
 
     def _normalize_field_name(self, field_name: str) -> str:
-        """
-        Normalisasi nama field yang lebih agresif.
-        """
-        normalized = field_name.lower().strip()
-        normalized = re.sub(r'^[^\w]+|[^\w\s]+$', '', normalized).strip()
-        
-        noise_words = ['no', 'nomor', 'number', 'kode', 'id', 'tanda', 'kartu', 'isilah', 'dengan']
-        words = normalized.split()
-        cleaned_words = [w for w in words if w not in noise_words]
-        normalized = ' '.join(cleaned_words) if cleaned_words else normalized
-        
-        standardizations = {
-            'tgl': 'tanggal', 'telp': 'telepon', 'almt': 'alamat', 'nama lengkap': 'nama',
-            'tempat tanggal lahir': 'tempat/tgl lahir'
-        }
-        for abbrev, full in standardizations.items():
-            if normalized == abbrev:
-                normalized = full
-        
-        return normalized
+        return normalize_field_name(field_name)
+
+_extractor_instance = None
+def get_regex_extractor() -> OptimizedRegexExtractor:
+    """Instance bersama agar pola hanya dikompilasi sekali per proses."""
+    global _extractor_instance
+    if _extractor_instance is None: _extractor_instance = OptimizedRegexExtractor()
+    return _extractor_instance
 
 def test_regex_performance():
     """Menguji performa dan akurasi pendekatan regex baru."""
@@ -204,6 +543,276 @@ def test_regex_performance():
     for key, field_obj in fields.items():
         print(f"  - Key: '{key}', Value: '{field_obj.value}' (Confidence: {field_obj.confidence:.2f}, Pattern: {field_obj.pattern_used})")
 
+def _legacy_confidence(key, value, base_confidence, pattern_name):
+    """Salinan penilaian per kandidat sebelum batch scorer, sebagai acuan test_confidence_parity."""
+    confidence = base_confidence
+    if any(word in key.lower().split() for word in ['adalah', 'dengan', 'untuk', 'yang', 'dari', 'keterangan']) \
+            or len(key.split()) > 4: confidence -= 0.5
+    if len(value.split()) > 10: confidence -= 0.2
+    if not re.search(r'[a-zA-Z0-9]', value): confidence -= 0.5
+    if any(re.search(p, value, re.IGNORECASE) for p in [
+            r'\b\d{1,2}[-/]\d{1,2}[-/]\d{2,4}\b',
+            r'\b\d{1,2}\s+(Jan|Feb|Mar|Apr|Mei|Jun|Jul|Agu|Sep|Okt|Nov|Des)\w*\s+\d{2,4}\b']): confidence += 0.15
+    elif re.match(r'^\d{15,18}$', re.sub(r'[\s\-\.]', '', value)): confidence += 0.20
+    elif re.match(r'^(\+62|62|08)\d{8,12}$', re.sub(r'[\s\-\(\)]', '', value)): confidence += 0.20
+    elif re.match(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$', value.strip()): confidence += 0.25
+    if pattern_name == 'standard_ktp_id': confidence = 1.0
+    return min(1.0, max(0.0, confidence))
+
+def test_confidence_parity(samples=50000, seed=0):
+    """
+    Memastikan score_candidates dan _calculate_confidence memberi skor yang
+    persis sama dengan penilaian lama, pada nilai acak yang sengaja dibuat
+    mirip tanggal, NIK/NPWP, nomor telepon, dan email.
+    """
+    import random
+
+    rng = random.Random(seed)
+    separators = ["", " ", "-", ".", "/", "(", ")", "\t", "\xa0", "\u2003", "\n"]
+    digits = "0123456789٣"
+
+    def number(length):
+        return "".join(rng.choice(digits) + (rng.choice(separators) if rng.random() < 0.2 else "")
+                       for _ in range(length))
+
+    date_separators, spaces = ["-", "/", "."], [" ", "  ", "\n", "", "\xa0", "\t"]
+    months = ["Jan", "mei", "DESEMBER", "Agustus", "Okt", "Sept"]
+    phone_prefixes = ["+62", "62", "08", "+ 62", "(08)", "+6", "0 8", "+08"]
+    generators = [
+        lambda: (number(rng.randint(1, 3)) + rng.choice(date_separators) + number(rng.randint(1, 3))
+                 + rng.choice(date_separators) + number(rng.randint(1, 5))),
+        lambda: (number(rng.randint(1, 3)) + rng.choice(spaces) + rng.choice(months) + rng.choice(spaces)
+                 + number(rng.randint(1, 5))),
+        lambda: number(rng.randint(13, 20)),
+        lambda: rng.choice(phone_prefixes) + number(rng.randint(6, 14)),
+        lambda: (rng.choice(spaces) + rng.choice(["budi", "a.b", "x_y%", "ſ"]) + "@" + rng.choice(["mail", "a-b.c", ""])
+                 + "." + rng.choice(["id", "com", "c", "co.id", "K"]) + rng.choice(spaces)),
+        lambda: "".join(rng.choice(["a", "Budi", " ", "!!", "?", "Rp", "1.000,00", "x1", "  "]) for _ in range(rng.randint(1, 14))),
+    ]
+    keys = ["Nama", "Tanggal Lahir", "No Telp", "Email", "Keterangan", "nomor yang dari", "A B C D E", "NPWP"]
+    base_confidences = [1.0, 0.90, 0.75, 0.70, 0.65]
+    pattern_names = ["standard_ktp_id", "flexible_separator", MULTILINE_PATTERN_NAME, "aggressive_table"]
+
+    candidates = []
+    for _ in range(samples):
+        value = rng.choice(generators)()
+        if rng.random() < 0.3: value = f"{rng.choice(generators)()} {value}"
+        candidates.append((rng.choice(keys), value, rng.choice(base_confidences), rng.choice(pattern_names)))
+    for value in ["01-02-2024", "1 Januari 2024", "3276 0110 0890 0001", "01.234.567.8-901.000",
+                  "+62 812-3456-7890", "(0812) 3456 7890", "budi.h@mail.co.id", " a@b.id ", "12 345"]:
+        candidates.append(("Nilai", value, 0.90, "flexible_separator"))
+
+    extractor = get_regex_extractor()
+    expected = [_legacy_confidence(*candidate) for candidate in candidates]
+    batch = extractor.score_candidates(candidates)
+    single = [extractor._calculate_confidence(*candidate) for candidate in candidates]
+    mismatches = [(c, e, b) for c, e, b, s in zip(candidates, expected, batch, single) if not e == b == s]
+    for candidate, old_score, new_score in mismatches[:5]:
+        print(f"  Berbeda: {candidate!r} lama={old_score} baru={new_score}")
+    assert not mismatches, f"{len(mismatches)} skor berbeda dari penilaian lama"
+    print(f"Paritas skor confidence OK untuk {len(candidates):,} kandidat.")
+
+def benchmark_confidence_scoring(lines=20000, repeat=3):
+    """Membandingkan penilaian per kandidat (pola lama) dengan batch scorer pada dokumen padat kandidat."""
+    import time
+
+    rows = ["Tanggal : 0{d}-01-2024", "No Telp : 0812 3456 {n:04d}", "NIK : 3276 0110 0890 {n:04d}",
+            "Email : user{n}@mail.co.id", "Keterangan : transfer ke rekening {n}", "Jumlah : Rp {n}.000,00"]
+    candidates = []
+    for n in range(lines):
+        # Nilai banyak berulang seperti pada laporan sungguhan (tanggal, teller, nominal).
+        key, value = rows[n % len(rows)].format(d=n % 9 + 1, n=n % 700).split(" : ")
+        candidates.append((key, value, 0.90, "flexible_separator"))
+    extractor = get_regex_extractor()
+
+    def best_of(func):
+        timings = []
+        for _ in range(repeat):
+            start_time = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start_time)
+        return min(timings)
+
+    legacy_time = best_of(lambda: [_legacy_confidence(*candidate) for candidate in candidates])
+    single_time = best_of(lambda: [extractor._calculate_confidence(*candidate) for candidate in candidates])
+    batch_time = best_of(lambda: extractor.score_candidates(candidates))
+    print(f"--- Benchmark skor confidence ({len(candidates):,} kandidat) ---")
+    print(f"Pola lama per kandidat  : {legacy_time:.3f} detik")
+    print(f"Terkompilasi per kandidat: {single_time:.3f} detik")
+    print(f"Batch scorer            : {batch_time:.3f} detik ({legacy_time / batch_time:.1f}x)")
+
+def measure_extraction_memory(pages=200):
+    """
+    Mengukur memori puncak (tracemalloc) dan jumlah objek yang dibuat oleh
+    ekstraksi pada laporan sintetis: reducer per kelompok kandidat versus
+    menampung semua kandidat sekaligus, serta ExtractedField yang dibuat
+    dibanding jumlah kandidat.
+    """
+    import tracemalloc
+
+    page = ("LAPORAN REKENING KORAN\nNama Nasabah : PT MAJU JAYA\nPeriode\n01-01-2024 s/d 31-01-2024\n" +
+            "".join(f"0{day % 9 + 1}-01-2024  TRANSFER MASUK {day:06d}  0,00  1.500.000,00\n"
+                    f"Keterangan : berita transfer {day}\n" for day in range(40)) +
+            "Saldo Akhir\nRp 12.345.678,00\n")
+    text = page * pages
+    line_index = LineIndex(text)
+
+    class CountingExtractor(OptimizedRegexExtractor):
+        candidate_count = 0
+        def _reduce_candidates(self, best, candidates, min_confidence):
+            self.candidate_count += len(candidates)
+            super()._reduce_candidates(best, candidates, min_confidence)
+
+    def measure(batch_size):
+        extractor = CountingExtractor()
+        normalize_field_name.cache_clear()
+        tracemalloc.start()
+        try:
+            fields = extractor.extract_fields_advanced(text, line_index=line_index, batch_size=batch_size)
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return peak, extractor.candidate_count, len(fields), normalize_field_name.cache_info()
+
+    print(f"--- Memori ekstraksi ({len(line_index):,} baris) ---")
+    for label, batch_size in (("Per kelompok", CANDIDATE_BATCH_SIZE), ("Semua sekaligus", len(line_index) * 2)):
+        peak, candidate_count, field_count, cache = measure(batch_size)
+        print(f"{label:<15}: puncak {peak / 1024:8.1f} KiB | {candidate_count:,} kandidat -> "
+              f"{field_count} ExtractedField | cache normalisasi {cache.hits:,} hit / {cache.misses:,} miss")
+
+def test_targeted_extraction(pages=200, repeat=5):
+    """
+    Membandingkan extract_fields_targeted dengan ekstraksi penuh lalu
+    pencocokan aturan seperti sebelumnya (hasil harus sama), dan mengukur
+    waktunya pada laporan 200 halaman dengan 3 aturan template.
+    """
+    import time
+
+    page = ("LAPORAN REKENING KORAN\nNama Nasabah : PT MAJU JAYA\nNo Rekening : 123-456-789\nPeriode\n"
+            "01-01-2024 s/d 31-01-2024\n" +
+            "".join(f"0{day % 9 + 1}-01-2024  TRANSFER MASUK {day:06d}  0,00  1.500.000,00\n"
+                    f"Keterangan : berita transfer {day}\n" for day in range(40)) +
+            "Saldo Akhir : Rp 12.345.678,00\n")
+    text = page * pages
+    rules = ["Nama Nasabah", "No Rekening", "Saldo Akhir"]
+    extractor = get_regex_extractor()
+
+    def full_then_match():
+        fields = extractor.extract_fields_advanced(text)
+        return {rule: next((fields[k].value for k in fields if k.lower() == rule.lower()), None) for rule in rules}
+
+    def targeted():
+        return {rule: field.value if field else None
+                for rule, field in extractor.extract_fields_targeted(text, rules).items()}
+
+    expected, result = full_then_match(), targeted()
+    assert expected == result, f"Hasil berbeda: {expected} vs {result}"
+
+    # Tata letak label/nilai di baris terpisah, dengan baris kosong di antaranya
+    # dan label berurutan (pasangan tidak tumpang tindih).
+    layouts = {
+        "Nama Nasabah\n\n   \nPT MAJU JAYA\n": {"Nama Nasabah": "PT MAJU JAYA"},
+        "Periode\nNo Rekening\n\nSaldo Akhir\nRp 1.000,00\n": {"Periode": "No Rekening", "Saldo Akhir": "Rp 1.000,00"},
+        "Nama Nasabah :\n\nx\n": {"Nama Nasabah": None},
+    }
+    for layout, wanted in layouts.items():
+        fields = extractor.extract_fields_advanced(layout)
+        found = extractor.extract_fields_targeted(layout, list(wanted))
+        for rule, value in wanted.items():
+            assert (fields[rule].value if rule in fields else None) == value, f"{layout!r}: {rule}"
+            assert (found[rule].value if found[rule] else None) == value, f"{layout!r}: {rule} (terarah)"
+    timings = {}
+    for label, func in (("Ekstraksi penuh + cocokkan", full_then_match), ("Ekstraksi terarah", targeted)):
+        start_time = time.perf_counter()
+        for _ in range(repeat): func()
+        timings[label] = (time.perf_counter() - start_time) / repeat
+    print(f"--- Ekstraksi terarah ({len(text):,} karakter, aturan {rules}) ---")
+    for label, elapsed in timings.items():
+        print(f"{label:<27}: {elapsed * 1000:8.1f} ms")
+    print(f"Hasil: {result}")
+
+def benchmark_line_index(target_size=5 * 1024 * 1024, sample_matches=2000):
+    """
+    Benchmark regresi konversi offset -> nomor baris pada teks sintetis
+    sekitar 5 MB. Cara lama (str.count dari awal teks untuk setiap match)
+    hanya dijalankan pada sampel match lalu diekstrapolasi, karena versi
+    penuhnya bisa berjalan berjam-jam.
+    """
+    import time
+
+    block = ("Tanggal Transaksi : 01-02-2024\nKeterangan   TRANSFER MASUK DARI NASABAH\n"
+             "Saldo Akhir : Rp 1.000.000,00\nTeller 0001\n")
+    text = block * (target_size // len(block) + 1)
+    processed_text = '\n' + text
+    pattern = re.compile(r"^[ \t]*([\w \t\-\.()]{2,40}?)[ \t]*[:：=-][ \t]+([^\r\n]{2,100})$", re.MULTILINE)
+    offsets = [match.start() for match in pattern.finditer(text)]
+    step = max(1, len(offsets) // sample_matches)
+    sampled = offsets[::step]
+
+    print(f"--- Benchmark nomor baris ({len(text) / 1024 / 1024:.1f} MB, {len(offsets):,} match) ---")
+    start_time = time.perf_counter()
+    legacy_numbers = [processed_text.count('\n', 0, offset + 1) for offset in sampled]
+    legacy_time = (time.perf_counter() - start_time) * len(offsets) / len(sampled)
+
+    start_time = time.perf_counter()
+    line_index = LineIndex(text)
+    build_time = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    numbers = [line_index.line_number(offset) for offset in offsets]
+    lookup_time = time.perf_counter() - start_time
+
+    assert numbers[::step] == legacy_numbers, "Nomor baris LineIndex berbeda dengan cara lama"
+    print(f"str.count per match (estimasi): {legacy_time:9.2f} detik")
+    print(f"LineIndex bangun + lookup     : {build_time + lookup_time:9.2f} detik "
+          f"(bangun {build_time:.3f}, lookup {lookup_time:.3f})")
+
+    start_time = time.perf_counter()
+    fields = get_regex_extractor().extract_fields_advanced(text, line_index=line_index)
+    print(f"Ekstraksi penuh               : {time.perf_counter() - start_time:9.2f} detik ({len(fields)} field)")
+
+def benchmark_multiline(page_counts=(50, 200), repeat=15, budget=10.0):
+    """
+    Mengukur tambahan waktu strategi aggressive_multiline terhadap ekstraksi
+    tanpa multiline pada laporan sintetis berbagai panjang (target: kurang
+    dari budget persen, termasuk dokumen pendek).
+    """
+    import time
+
+    page = ("LAPORAN REKENING KORAN\nNama Nasabah : PT MAJU JAYA\nPeriode\n\n01-01-2024 s/d 31-01-2024\n"
+            "Tanggal    Keterangan    Debet    Kredit\n" +
+            "02-01-2024  TRANSFER MASUK 000123  0,00  1.500.000,00\n" * 40 +
+            "Saldo Akhir\nRp 12.345.678,00\nHalaman\n1\n")
+    extractor = get_regex_extractor()
+    overheads = {}
+    for pages in page_counts:
+        text = page * pages
+        line_index = LineIndex(text)
+        # Kedua varian dijalankan bergantian dan diambil waktu terbaiknya agar
+        # gangguan sesaat (GC, CPU lain) tidak masuk ke selisih. Dokumen pendek
+        # diulang lebih banyak supaya total waktunya sebanding.
+        timings = {False: [], True: []}
+        fields = {}
+        for _ in range(max(repeat, repeat * 200 // pages)):
+            for multiline in (False, True):
+                start_time = time.perf_counter()
+                fields[multiline] = extractor.extract_fields_advanced(text, line_index=line_index, multiline=multiline)
+                timings[multiline].append(time.perf_counter() - start_time)
+        assert fields[True]["Periode"].value == "01-01-2024 s/d 31-01-2024", "Pasangan label/nilai tidak ditemukan"
+        base_time, full_time = min(timings[False]), min(timings[True])
+        overheads[pages] = (full_time - base_time) / base_time * 100
+        print(f"--- Benchmark multiline ({pages} halaman, {len(line_index):,} baris) ---")
+        print(f"Tanpa multiline : {base_time:.3f} detik ({len(fields[False])} field)")
+        print(f"Dengan multiline: {full_time:.3f} detik ({len(fields[True])} field)")
+        status = "OK" if overheads[pages] < budget else f"melebihi target {budget:.0f}%"
+        print(f"Tambahan waktu  : {overheads[pages]:.1f}% ({status})")
+    return overheads
+
 if __name__ == "__main__":
     # Jalankan pengujian jika file ini dieksekusi
-    test_regex_performance()
\ No newline at end of file
+    test_regex_performance()
+    benchmark_line_index()
+    benchmark_multiline()
+    test_confidence_parity()
+    benchmark_confidence_scoring()
+    measure_extraction_memory()
+    test_targeted_extraction()
\ No newline at end of file
@@ -1,11 +1,15 @@
 import fitz  # PyMuPDF
+import hashlib
+import json
 import re
-from pathlib import Path
-import logging
-from typing import Dict, List, Tuple, Optional
 from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional, Tuple
 
 from universal_extractor import run_universal_extraction, BUILT_IN_TEMPLATES
+from optimized_regex_patterns import get_regex_extractor, RuleMatcher
+from cache_tools import get_text_cache, get_result_cache, get_hash_cache, hash_bytes, hash_file, source_fingerprint
 
 class PDFProcessingError(Exception):
     """Custom exception for PDF processing errors."""
@@ -15,130 +19,138 @@ class FileValidationError(Exception):
     """Custom exception for file validation errors."""
     pass
 
-@dataclass
-class ExtractedField:
-    """Data class for extracted field with metadata."""
-    key: str
-    value: str
-    confidence: float
-    pattern_used: str
-    line_number: int
+MAX_PDF_SIZE = 100 * 1024 * 1024
+# Bagian dari key cache teks: teks hasil MuPDF versi lain tidak dipakai ulang.
+TEXT_EXTRACTION_VERSION = getattr(fitz, "VersionBind", "")
 
-class OptimizedRegexExtractor:
-    """
-    Extractor regex yang dioptimalkan dengan strategi agresif
-    untuk menangani format PDF yang tidak terstruktur saat membuat template custom.
-    """
-    def __init__(self):
-        self.compiled_patterns = self._compile_patterns()
-        
-    def _compile_patterns(self) -> List[Tuple[re.Pattern, str, float]]:
-        patterns = [
-            (r"^(Nama|Tempat/Tgl Lahir|Jenis Kelamin|Alamat|Agama|Status Perkawinan|Pekerjaan|Kewarganegaraan)\s*:\s*(.+)$", "standard_ktp_id", 1.0),
-            (r"^[ \t]*([\w\s\-\.()]{2,40}?)\s*[:：=-]\s+([^\r\n]{2,100})$", "flexible_separator", 0.90),
-            (r"^[ \t]*([\w\s\-\.()]{2,40}?)[ \t]{2,}([^\r\n]{2,100})$", "aggressive_table", 0.70),
-            (r"^[ \t]*([A-Z][A-Z0-9\s\-\.]{2,39})[ \t]+([^\r\n]{2,100})$", "aggressive_uppercase", 0.65),
-            (r"^(?<=\n\s*([\w\s\-\.()]{2,40}?)\s*[:：]?\s*\n)\s*([^\r\n]{2,100})$", "aggressive_multiline", 0.75),
-        ]
-        compiled = []
-        for pattern_str, name, confidence in patterns:
-            try:
-                compiled_pattern = re.compile(pattern_str, re.IGNORECASE | re.MULTILINE)
-                compiled.append((compiled_pattern, name, confidence))
-            except re.error as e:
-                logging.warning(f"Gagal mengompilasi pola regex '{name}': {e}")
-        return compiled
-    
-    def extract_fields_advanced(self, text: str, min_confidence: float = 0.55) -> Dict[str, ExtractedField]:
-        if not text or not text.strip(): return {}
-        all_matches = []
-        processed_text = '\n' + text
-        for compiled_pattern, pattern_name, base_confidence in self.compiled_patterns:
-            try:
-                for match in compiled_pattern.finditer(processed_text):
-                    groups = match.groups()
-                    if len(groups) >= 2:
-                        key, value = (groups[1], groups[2]) if pattern_name == 'aggressive_multiline' else (groups[0], groups[1])
-                        key, value = key.strip(), value.strip()
-                        if not key or not value or len(key) > 40 or len(value) > 100: continue
-                        line_number = processed_text.count('\n', 0, match.start())
-                        confidence = self._calculate_confidence(key, value, base_confidence, pattern_name)
-                        if confidence >= min_confidence:
-                            all_matches.append(ExtractedField(
-                                key=key, value=value, confidence=confidence,
-                                pattern_used=pattern_name, line_number=line_number
-                            ))
-            except Exception as e:
-                logging.debug(f"Error saat memproses dengan pola {pattern_name}: {e}")
-        return self._deduplicate_fields(all_matches)
-
-    def _calculate_confidence(self, key: str, value: str, base_confidence: float, pattern_name: str) -> float:
-        confidence = base_confidence
-        key_lower = key.lower()
-        stop_words = ['adalah', 'dengan', 'untuk', 'yang', 'dari', 'keterangan']
-        if any(word in key_lower.split() for word in stop_words) or len(key.split()) > 4: confidence -= 0.5
-        if len(value.split()) > 10: confidence -= 0.2
-        if not re.search(r'[a-zA-Z0-9]', value): confidence -= 0.5
-        if self._is_date_like(value): confidence += 0.15
-        elif self._is_id_number_like(value): confidence += 0.20
-        elif self._is_phone_like(value): confidence += 0.20
-        elif self._is_email_like(value): confidence += 0.25
-        if pattern_name == 'standard_ktp_id': confidence = 1.0
-        return min(1.0, max(0.0, confidence))
-
-    def _is_date_like(self, value: str) -> bool: return any(re.search(p, value, re.IGNORECASE) for p in [r'\b\d{1,2}[-/]\d{1,2}[-/]\d{2,4}\b', r'\b\d{1,2}\s+(Jan|Feb|Mar|Apr|Mei|Jun|Jul|Agu|Sep|Okt|Nov|Des)\w*\s+\d{2,4}\b'])
-    def _is_id_number_like(self, value: str) -> bool: return re.match(r'^\d{15,18}$', re.sub(r'[\s\-\.]', '', value)) is not None
-    def _is_phone_like(self, value: str) -> bool: return re.match(r'^(\+62|62|08)\d{8,12}$', re.sub(r'[\s\-\(\)]', '', value)) is not None
-    def _is_email_like(self, value: str) -> bool: return re.match(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$', value.strip()) is not None
-
-    def _deduplicate_fields(self, matches: List[ExtractedField]) -> Dict[str, ExtractedField]:
-        field_groups = {}
-        for match in matches:
-            normalized_key = self._normalize_field_name(match.key)
-            if not normalized_key: continue
-            if normalized_key not in field_groups: field_groups[normalized_key] = []
-            field_groups[normalized_key].append(match)
-        best_matches = {}
-        for normalized_key, group in field_groups.items():
-            group.sort(key=lambda x: (-x.confidence, x.line_number))
-            best_match = group[0]
-            best_matches[best_match.key] = best_match
-        return best_matches
-
-    def _normalize_field_name(self, field_name: str) -> str:
-        normalized = field_name.lower().strip()
-        normalized = re.sub(r'^[^\w]+|[^\w\s]+$', '', normalized).strip()
-        noise_words = ['no', 'nomor', 'number', 'kode', 'id', 'tanda', 'kartu', 'isilah', 'dengan']
-        words = normalized.split()
-        cleaned_words = [w for w in words if w not in noise_words]
-        normalized = ' '.join(cleaned_words) if cleaned_words else normalized
-        standardizations = {'tgl': 'tanggal', 'telp': 'telepon', 'almt': 'alamat', 'nama lengkap': 'nama', 'tempat tanggal lahir': 'tempat/tgl lahir'}
-        for abbrev, full in standardizations.items():
-            if normalized == abbrev: normalized = full
-        return normalized
-
-_extractor_instance = None
-def get_regex_extractor() -> OptimizedRegexExtractor:
-    global _extractor_instance
-    if _extractor_instance is None: _extractor_instance = OptimizedRegexExtractor()
-    return _extractor_instance
+def _validate_pdf_path(file_path):
+    """Validasi murah berbasis metadata file, tanpa membuka isi PDF."""
+    path_obj = Path(file_path)
+    if not path_obj.exists(): return False, f"File tidak ditemukan: {file_path}"
+    if not path_obj.is_file(): return False, f"Path bukan file: {file_path}"
+    if path_obj.suffix.lower() != '.pdf': return False, f"File bukan PDF: {file_path}"
+    file_size = path_obj.stat().st_size
+    if file_size == 0: return False, f"File kosong: {file_path}"
+    if file_size > MAX_PDF_SIZE: return False, f"File terlalu besar (>{MAX_PDF_SIZE//1024//1024}MB): {file_path}"
+    return True, ""
+
+def _validate_pdf_document(doc, file_path):
+    """Validasi pada dokumen fitz yang sudah terbuka."""
+    if doc.page_count == 0: return False, f"PDF tidak memiliki halaman: {file_path}"
+    return True, ""
 
 def validate_pdf_file(file_path):
     try:
-        path_obj = Path(file_path)
-        if not path_obj.exists(): return False, f"File tidak ditemukan: {file_path}"
-        if not path_obj.is_file(): return False, f"Path bukan file: {file_path}"
-        if path_obj.suffix.lower() != '.pdf': return False, f"File bukan PDF: {file_path}"
-        file_size = path_obj.stat().st_size
-        if file_size == 0: return False, f"File kosong: {file_path}"
-        max_size = 100 * 1024 * 1024
-        if file_size > max_size: return False, f"File terlalu besar (>{max_size//1024//1024}MB): {file_path}"
+        is_valid, error_msg = _validate_pdf_path(file_path)
+        if not is_valid: return False, error_msg
         with fitz.open(file_path) as doc:
-            if doc.page_count == 0: return False, f"PDF tidak memiliki halaman: {file_path}"
-        return True, ""
+            return _validate_pdf_document(doc, file_path)
     except Exception as e:
         return False, f"Error validasi file: {str(e)}"
 
+class LoadedPDF:
+    """
+    PDF yang dibaca dari disk tepat satu kali. Buffer yang sama dipakai fitz
+    untuk parsing dan diteruskan apa adanya ke tahap output (ZIP).
+    Jika dimuat dengan read_content=False, content bernilai None dan tahap
+    output menyalin langsung dari file_path.
+
+    Dokumen fitz baru dibuka saat pertama kali dibutuhkan: jika teks sudah
+    ada di cache teks (berdasarkan hash isi file), MuPDF tidak dipakai sama
+    sekali.
+    """
+    def __init__(self, file_path, content, document=None):
+        self.file_path = file_path
+        self.content = content
+        self._document = document
+        self._content_hash = None
+        self._closed = False
+
+    @property
+    def document(self):
+        if self._document is None and not self._closed:
+            self._document = _open_document(self.file_path, self.content)
+        return self._document
+
+    @property
+    def content_hash(self):
+        """
+        SHA-256 isi file; dari buffer jika sudah dibaca. Tanpa buffer, hash
+        diambil dari cache hash (signature stat) dan file hanya dibaca
+        bertahap jika berubah sejak terakhir di-hash.
+        """
+        if self._content_hash is None:
+            if self.content is not None:
+                self._content_hash = hash_bytes(self.content)
+            else:
+                hash_cache = get_hash_cache()
+                self._content_hash = hash_cache.hash_file(self.file_path) if hash_cache else hash_file(self.file_path)
+        return self._content_hash
+
+    def get_text(self, sort=False):
+        cache = get_text_cache()
+        if cache is None: return self._extract_text(sort)
+        mode = f"{'sort' if sort else 'plain'}:{TEXT_EXTRACTION_VERSION}"
+        text = cache.get(self.content_hash, mode)
+        if text is None:
+            text = self._extract_text(sort)
+            cache.put(self.content_hash, mode, text)
+        return text
+
+    def _extract_text(self, sort):
+        if sort: return "".join(page.get_text("text", sort=True) for page in self.document)
+        return "".join(page.get_text("text") for page in self.document)
+
+    @property
+    def output_source(self):
+        """Buffer untuk tahap output, atau path sumber jika file tidak dibaca ke memori."""
+        return self.content if self.content is not None else self.file_path
+
+    def close(self):
+        self._closed = True
+        if self._document is not None:
+            self._document.close()
+            self._document = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+def _open_document(file_path, content):
+    """Membuka dan memvalidasi dokumen fitz. Melempar FileValidationError jika tidak valid."""
+    try:
+        document = fitz.open(stream=content, filetype="pdf") if content is not None else fitz.open(file_path)
+    except Exception as e:
+        raise FileValidationError(f"Error validasi file: {str(e)}")
+    is_valid, error_msg = _validate_pdf_document(document, file_path)
+    if not is_valid:
+        document.close()
+        raise FileValidationError(error_msg)
+    return document
+
+def load_pdf(file_path, read_content=True):
+    """
+    Membaca file sekali; dokumen di-parsing dari buffer tersebut saat pertama
+    kali dibutuhkan. Melempar FileValidationError jika path tidak valid, atau
+    saat dokumen dibuka jika isinya bukan PDF yang valid.
+
+    Dengan read_content=False fitz membuka file langsung dari path sehingga
+    isi file tidak pernah menjadi satu objek bytes utuh di memori Python.
+    """
+    try:
+        is_valid, error_msg = _validate_pdf_path(file_path)
+        if not is_valid: raise FileValidationError(error_msg)
+        content = None
+        if read_content:
+            with open(file_path, 'rb') as f: content = f.read()
+    except FileValidationError:
+        raise
+    except Exception as e:
+        raise FileValidationError(f"Error validasi file: {str(e)}")
+    return LoadedPDF(file_path, content)
+
 def validate_template_name(name):
     if not name or not name.strip(): return False, "Nama template tidak boleh kosong"
     if len(name) < 2: return False, "Nama template minimal 2 karakter"
@@ -154,16 +166,37 @@ def validate_filename_component(value):
     return cleaned[:100].rstrip('. ')
 
 def extract_pdf_fields(file_path, min_confidence=0.55):
-    is_valid, error_msg = validate_pdf_file(file_path)
-    if not is_valid: raise FileValidationError(error_msg)
+    with load_pdf(file_path) as pdf:
+        return extract_fields_from_pdf(pdf, min_confidence)
+
+def extract_fields_from_pdf(pdf, min_confidence=0.55):
+    """Ekstraksi field dari LoadedPDF yang sudah terbuka (tanpa membaca ulang file)."""
     try:
-        text = "".join(page.get_text("text") for page in fitz.open(file_path))
+        text = pdf.get_text()
         if not text.strip(): raise PDFProcessingError("Tidak ada teks yang dapat dibaca.")
         extractor = get_regex_extractor()
         extracted_fields_obj = extractor.extract_fields_advanced(text, min_confidence)
         detected_fields = {field_name: field_obj.value for field_name, field_obj in extracted_fields_obj.items()}
         if not detected_fields: raise PDFProcessingError("Tidak ada field yang dapat dideteksi.")
         return detected_fields
+    except FileValidationError:
+        raise
+    except Exception as e:
+        raise PDFProcessingError(f"Error saat ekstraksi field: {str(e)}")
+
+def extract_template_fields_from_pdf(pdf, rules, min_confidence=0.55):
+    """
+    Ekstraksi terarah untuk template custom: hanya field yang diminta aturan.
+    rules boleh berupa daftar aturan atau RuleMatcher yang sudah disiapkan.
+    Mengembalikan {rule: nilai atau None}.
+    """
+    try:
+        text = pdf.get_text()
+        if not text.strip(): raise PDFProcessingError("Tidak ada teks yang dapat dibaca.")
+        extracted = get_regex_extractor().extract_fields_targeted(text, rules, min_confidence)
+        return {rule: field_obj.value if field_obj else None for rule, field_obj in extracted.items()}
+    except FileValidationError:
+        raise
     except Exception as e:
         raise PDFProcessingError(f"Error saat ekstraksi field: {str(e)}")
 
@@ -176,59 +209,143 @@ def validate_template_rules(rules):
         if len(rule.strip()) > 50: return False, f"Aturan template terlalu panjang: {rule}"
     return True, ""
 
-def process_pdf_with_built_in_template(file_path, template_name):
-    """Memproses PDF menggunakan SATU pola spesifik dari template bawaan."""
+@dataclass(frozen=True)
+class CompiledTemplate:
+    """
+    Template kustom yang sudah divalidasi dan diproses sekali per batch:
+    aturan, pemisah yang sudah dibersihkan, dan RuleMatcher (indeks nama
+    aturan ternormalisasi/huruf kecil beserta kata kunci baris). Jika
+    template tidak valid, error berisi pesan yang dikembalikan untuk setiap
+    file. Objek ini kecil dan picklable sehingga murah dikirim ke worker.
+    """
+    rules: Tuple[str, ...]
+    separator: str
+    matcher: Optional[RuleMatcher]
+    error: Optional[str]
+    digest: str
+
+@lru_cache(maxsize=32)
+def _compile_template_json(template_json):
+    digest = hashlib.sha256(template_json.encode("utf-8")).hexdigest()
+    template = json.loads(template_json)
+    rules = template.get("aturan", [])
+    is_valid, error_msg = validate_template_rules(rules)
+    if not is_valid: return CompiledTemplate((), "", None, f"Template tidak valid: {error_msg}", digest)
+    separator = validate_filename_component(template.get("pemisah", " - ")) or "-"
+    return CompiledTemplate(tuple(rules), separator, RuleMatcher(rules), None, digest)
+
+def compile_template(template):
+    """
+    Mengubah template kustom (dict) menjadi CompiledTemplate. Hasil di-cache
+    berdasarkan hash isi JSON template, jadi template yang sama tidak
+    divalidasi ulang.
+    """
+    if isinstance(template, CompiledTemplate): return template
+    if not isinstance(template, dict): return CompiledTemplate((), "", None, "Template harus berupa dictionary", "")
     try:
-        is_valid, error_msg = validate_pdf_file(file_path)
-        if not is_valid: return None, None, error_msg
+        template_json = json.dumps(template, sort_keys=True, ensure_ascii=False)
+    except (TypeError, ValueError) as e:
+        return CompiledTemplate((), "", None, f"Template tidak valid: {e}", "")
+    return _compile_template_json(template_json)
+
+def prepare_template(template, template_name):
+    """Dipanggil sekali per batch: template bawaan apa adanya, template kustom dikompilasi."""
+    if template_name in BUILT_IN_TEMPLATES: return template
+    return compile_template(template)
+
+def _cached_result(pdf, template_version, compute):
+    """
+    Mengembalikan (new_name, error) dari cache hasil jika isi file dan versi
+    template sama dengan run sebelumnya; selain itu menjalankan compute().
+    Hanya hasil normal yang disimpan: exception tidak pernah di-cache.
+    """
+    cache = get_result_cache()
+    if cache is None: return compute()
+    cached = cache.get(pdf.content_hash, template_version)
+    if cached is not None: return cached
+    new_name, error = compute()
+    cache.put(pdf.content_hash, template_version, new_name, error)
+    return new_name, error
 
-        text = "".join(page.get_text("text", sort=True) for page in fitz.open(file_path))
-        if not text.strip(): return None, None, "Tidak ada teks yang dapat dibaca dari PDF."
+def _built_in_name(pdf, template_name):
+    text = pdf.get_text(sort=True)
+    if not text.strip(): return None, "Tidak ada teks yang dapat dibaca dari PDF."
+    new_name = run_universal_extraction(text, template_name)
+    if not new_name: return None, f"Pola '{template_name}' tidak cocok dengan dokumen ini."
+    return new_name, None
 
-        new_name = run_universal_extraction(text, template_name)
-        if not new_name: return None, None, f"Pola '{template_name}' tidak cocok dengan dokumen ini."
+@lru_cache(maxsize=None)
+def built_in_template_version(template_name):
+    """Versi template bawaan: fingerprint fungsi ekstraktornya beserta helper yang dipakai."""
+    return source_fingerprint(TEXT_EXTRACTION_VERSION, LoadedPDF, _built_in_name, BUILT_IN_TEMPLATES[template_name])
 
-        with open(file_path, 'rb') as f: content = f.read()
-        return new_name, content, None
+def process_pdf_with_built_in_template(file_path, template_name, return_path=False):
+    """Memproses PDF menggunakan SATU pola spesifik dari template bawaan."""
+    try:
+        with load_pdf(file_path, read_content=not return_path) as pdf:
+            new_name, error = _cached_result(pdf, built_in_template_version(template_name),
+                                             lambda: _built_in_name(pdf, template_name))
+            if error: return None, None, error
+            return new_name, pdf.output_source, None
+    except FileValidationError as e:
+        return None, None, str(e)
     except Exception as e:
         return None, None, f"Error saat memproses dengan template bawaan: {str(e)}"
 
-def process_single_pdf(file_path, template, template_name):
-    """Memproses satu file PDF berdasarkan template (custom atau bawaan)."""
+def _custom_name(pdf, compiled):
+    fields_in_file = extract_template_fields_from_pdf(pdf, compiled.matcher, min_confidence=0.55)
+
+    missing_fields, new_name_parts = [], []
+    for rule in compiled.rules:
+        value = fields_in_file.get(rule)
+        if value is not None:
+            clean_value = validate_filename_component(value)
+            if clean_value: new_name_parts.append(clean_value)
+            else: missing_fields.append(f"{rule} (nilai kosong)")
+        else:
+            missing_fields.append(rule)
+
+    if missing_fields: return None, f"Field tidak ditemukan: {', '.join(missing_fields)}"
+    if not new_name_parts: return None, "Tidak ada bagian nama file yang valid."
+
+    new_name = compiled.separator.join(new_name_parts) + ".pdf"
+    if len(new_name) > 220: return None, "Nama file hasil terlalu panjang."
+    return new_name, None
+
+@lru_cache(maxsize=None)
+def _custom_extractor_version():
+    return source_fingerprint(TEXT_EXTRACTION_VERSION, LoadedPDF, _custom_name, get_regex_extractor, RuleMatcher)
+
+def custom_template_version(compiled):
+    """Versi template kustom: hash JSON template digabung dengan fingerprint kode ekstraktornya."""
+    return hashlib.sha256(f"{compiled.digest}:{_custom_extractor_version()}".encode("utf-8")).hexdigest()
+
+def template_version(template, template_name):
+    """Versi template bawaan atau kustom; berubah jika template atau kode ekstraktornya diubah."""
+    if template_name in BUILT_IN_TEMPLATES: return built_in_template_version(template_name)
+    return custom_template_version(compile_template(template))
+
+def process_single_pdf(file_path, template, template_name, return_path=False):
+    """
+    Memproses satu file PDF berdasarkan template (custom atau bawaan).
+
+    Mengembalikan (new_name, content, error). Dengan return_path=True elemen
+    kedua adalah path sumber, bukan bytes, untuk disalin bertahap oleh zip_tools.
+    Hasil (nama atau error) di-cache per (hash isi file, versi template), jadi
+    file yang tidak berubah hanya perlu di-hash pada run berikutnya.
+    """
     if template_name in BUILT_IN_TEMPLATES:
-        return process_pdf_with_built_in_template(file_path, template_name)
+        return process_pdf_with_built_in_template(file_path, template_name, return_path)
 
     try:
-        if not isinstance(template, dict): return None, None, "Template harus berupa dictionary"
-        
-        rules = template.get("aturan", [])
-        separator = template.get("pemisah", " - ")
-        
-        is_valid, error_msg = validate_template_rules(rules)
-        if not is_valid: return None, None, f"Template tidak valid: {error_msg}"
-        
-        separator = validate_filename_component(separator) or "-"
-        fields_in_file = extract_pdf_fields(file_path, min_confidence=0.55)
-        
-        missing_fields, new_name_parts = [], []
-        for rule in rules:
-            found_key = next((k for k in fields_in_file if k.lower() == rule.lower()), None)
-            if found_key:
-                clean_value = validate_filename_component(fields_in_file[found_key])
-                if clean_value: new_name_parts.append(clean_value)
-                else: missing_fields.append(f"{rule} (nilai kosong)")
-            else:
-                missing_fields.append(rule)
-        
-        if missing_fields: return None, None, f"Field tidak ditemukan: {', '.join(missing_fields)}"
-        if not new_name_parts: return None, None, "Tidak ada bagian nama file yang valid."
-        
-        new_name = separator.join(new_name_parts) + ".pdf"
-        if len(new_name) > 220: return None, None, "Nama file hasil terlalu panjang."
-        
-        with open(file_path, 'rb') as f: original_content = f.read()
-        return new_name, original_content, None
-            
+        compiled = compile_template(template)
+        if compiled.error: return None, None, compiled.error
+
+        with load_pdf(file_path, read_content=not return_path) as pdf:
+            new_name, error = _cached_result(pdf, custom_template_version(compiled), lambda: _custom_name(pdf, compiled))
+            if error: return None, None, error
+            return new_name, pdf.output_source, None
+
     except (FileValidationError, PDFProcessingError) as e:
         return None, None, str(e)
     except Exception as e:
@@ -3,19 +3,23 @@ import os
 from PyQt5.QtWidgets import (
     QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QStackedWidget,
     QLabel, QFileDialog, QLineEdit, QListWidget, QListWidgetItem, QProgressBar,
-    QMessageBox, QComboBox, QTextEdit, QGroupBox, QScrollArea)
+    QMessageBox, QComboBox, QTextEdit, QGroupBox, QScrollArea, QSpinBox)
 from PyQt5.QtCore import QThread, pyqtSignal, Qt
 from PyQt5.QtGui import QFont
 from pathlib import Path
 import logging
 import datetime
 
-from pdf_tools import (extract_pdf_fields, process_single_pdf, validate_pdf_file, 
+from pdf_tools import (extract_pdf_fields, validate_pdf_file,
                       validate_template_name, FileValidationError, PDFProcessingError)
 from utils import (load_templates, save_templates, TemplateError, ConfigError,
                    load_config, save_config)
-from zip_tools import save_zip, ZipError, ZipValidationError
+from zip_tools import (ZipStreamWriter, DirectoryWriter, ZipError, ZipValidationError, CompressionPolicy,
+                       COMPRESSION_AUTO, COMPRESSION_STORED, COMPRESSION_DEFLATED, COMPRESSION_MODES)
 from universal_extractor import BUILT_IN_TEMPLATES
+from batch_tools import run_batch, get_max_workers_limit, DEFAULT_MAX_WORKERS
+from journal_tools import (JobJournal, JournalError, JOB_COMPLETED, JOB_FAILED, JOB_CANCELLED,
+                           OUTPUT_KIND_ZIP, OUTPUT_KIND_DIRECTORY)
 
 logging.basicConfig(
     level=logging.INFO,
@@ -23,6 +27,9 @@ logging.basicConfig(
     handlers=[logging.FileHandler('pdf_renamer.log'), logging.StreamHandler()]
 )
 
+OUTPUT_ZIP = "zip"
+OUTPUT_DIRECTORY = "directory"
+
 class BulkProcessWorker(QThread):
     progress = pyqtSignal(int)
     log = pyqtSignal(str)
@@ -30,11 +37,16 @@ class BulkProcessWorker(QThread):
     finished = pyqtSignal(str, int, int)
     error = pyqtSignal(str)
 
-    def __init__(self, uploaded_files, template, save_path):
+    def __init__(self, uploaded_files, template, save_path, max_workers=DEFAULT_MAX_WORKERS, compression=None,
+                 output_mode=OUTPUT_ZIP):
         super().__init__()
         self.uploaded_files = uploaded_files
         self.template = template
         self.save_path = save_path
+        self.max_workers = max_workers
+        self.compression = compression
+        self.output_mode = output_mode
+        self.output_error_prefix = "Gagal menulis ke folder" if output_mode == OUTPUT_DIRECTORY else "Gagal membuat ZIP"
         self.template_name = ""
         self.is_running = True
         self.success_count = 0
@@ -42,55 +54,95 @@ class BulkProcessWorker(QThread):
 
     def run(self):
         total_files = len(self.uploaded_files)
-        renamed_data = {}
         self.log.emit(f"🚀 Memulai proses untuk {total_files} file dengan template '{self.template_name}'...")
         
-        for i, file_path in enumerate(self.uploaded_files):
-            if not self.is_running:
-                self.log.emit("❌ Proses dibatalkan oleh pengguna.")
-                return
-            
-            try:
-                new_name, original_content, error_msg = process_single_pdf(
-                    file_path, self.template, self.template_name
-                )
-                
-                if new_name and original_content:
-                    counter = 1
-                    original_new_name = new_name
-                    while new_name in renamed_data:
-                        name_part, ext = original_new_name.rsplit('.', 1)
-                        new_name = f"{name_part}_{counter}.{ext}"
-                        counter += 1
-                    
-                    renamed_data[new_name] = original_content
-                    self.success_count += 1
-                    self.log.emit(f"✅ [{i+1}/{total_files}] {Path(file_path).name} → {new_name}")
-                else:
-                    self.error_count += 1
-                    error_message = error_msg or "Gagal memproses file"
-                    self.log.emit(f"❌ [{i+1}/{total_files}] {Path(file_path).name}: {error_message}")
-            
-            except Exception as e:
-                self.error_count += 1
-                self.log.emit(f"💥 [{i+1}/{total_files}] {Path(file_path).name}: Error tak terduga: {e}")
-            
-            progress_percent = int((i + 1) / total_files * 90)
-            self.progress.emit(progress_percent)
+        try:
+            writer = self.open_writer()
+        except (ZipError, ZipValidationError) as e:
+            self.error.emit(f"{self.output_error_prefix}: {e}")
+            return
+        
+        job = self.open_job()
+        try:
+            summary = run_batch(
+                self.uploaded_files, self.template, self.template_name, writer,
+                max_workers=self.max_workers, should_stop=lambda: not self.is_running,
+                on_result=lambda result, output_name: self.report_result(result, output_name, total_files),
+                journal=job
+            )
+        except ZipError as e:
+            writer.abort()
+            self.finish_job(job, JOB_FAILED)
+            self.error.emit(f"{self.output_error_prefix}: {e}")
+            return
+        except Exception as e:
+            logging.exception("Batch berhenti karena error tak terduga")
+            writer.abort()
+            self.finish_job(job, JOB_FAILED)
+            self.error.emit(f"Error tak terduga: {e}")
+            return
+        
+        if summary.cancelled:
+            writer.abort()
+            self.finish_job(job, JOB_CANCELLED)
+            self.log.emit("❌ Proses dibatalkan oleh pengguna.")
+            return
         
         self.log.emit(f"\n📊 Ringkasan: ✅ Berhasil: {self.success_count} | ❌ Gagal: {self.error_count}")
         
-        if not renamed_data:
+        if not summary.success_count:
+            writer.abort()
+            self.finish_job(job, JOB_FAILED)
             self.error.emit("Tidak ada file yang berhasil diproses.")
             return
         
         try:
-            self.log.emit(f"\n📦 Membuat file ZIP...")
-            save_zip(renamed_data, self.save_path)
+            self.log.emit(f"\n📦 Menyelesaikan output...")
+            writer.close()
+            self.finish_job(job, JOB_COMPLETED)
+            self.log.emit(f"🗜️ {writer.stats.summary()}")
             self.progress.emit(100)
             self.finished.emit(self.save_path, self.success_count, total_files)
         except (ZipError, ZipValidationError, Exception) as e:
-            self.error.emit(f"Gagal membuat ZIP: {e}")
+            self.finish_job(job, JOB_FAILED)
+            self.error.emit(f"{self.output_error_prefix}: {e}")
+
+    def open_job(self):
+        """Mencatat batch di jurnal job agar bisa dilanjutkan dengan 'python -m cli --resume' setelah crash."""
+        output_kind = OUTPUT_KIND_DIRECTORY if self.output_mode == OUTPUT_DIRECTORY else OUTPUT_KIND_ZIP
+        compression = self.compression.mode if self.compression else COMPRESSION_AUTO
+        try:
+            job = JobJournal().create_job([Path(f).resolve() for f in self.uploaded_files], self.template,
+                                          self.template_name, Path(self.save_path).resolve(), output_kind,
+                                          {"compression": compression})
+        except JournalError as e:
+            self.log.emit(f"⚠️ {e}")
+            return None
+        self.log.emit(f"🧾 ID job: {job.job_id}")
+        return job
+
+    def finish_job(self, job, status):
+        if job is not None: job.finish(status)
+
+    def report_result(self, result, output_name, total_files):
+        i, file_path = result.index, result.file_path
+        if output_name:
+            self.success_count += 1
+            self.log.emit(f"✅ [{i+1}/{total_files}] {Path(file_path).name} → {output_name}")
+            self.file_processed.emit(file_path, True, output_name)
+        else:
+            self.error_count += 1
+            icon = "💥" if result.unexpected else "❌"
+            self.log.emit(f"{icon} [{i+1}/{total_files}] {Path(file_path).name}: {result.error}")
+            self.file_processed.emit(file_path, False, result.error)
+        
+        progress_percent = int((i + 1) / total_files * 90)
+        self.progress.emit(progress_percent)
+
+    def open_writer(self):
+        if self.output_mode == OUTPUT_DIRECTORY:
+            return DirectoryWriter(self.save_path)
+        return ZipStreamWriter(self.save_path, self.compression)
 
     def stop(self):
         self.is_running = False
@@ -105,6 +157,12 @@ class ValidationUtils:
         msg_box.exec_()
 
 class PDFRenamerApp(QMainWindow):
+    COMPRESSION_OPTIONS = {
+        "Otomatis (lewati file yang sudah terkompresi)": COMPRESSION_AUTO,
+        "Tanpa kompresi (paling cepat)": COMPRESSION_STORED,
+        "Deflate (selalu kompres)": COMPRESSION_DEFLATED,
+    }
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("PDF Renamer Pro")
@@ -112,6 +170,8 @@ class PDFRenamerApp(QMainWindow):
         
         self.config = load_config()
         self.default_save_path = self.config.get("default_save_path", "")
+        self.max_workers = self.config.get("max_workers", DEFAULT_MAX_WORKERS)
+        self.zip_compression = self.config.get("zip_compression", COMPRESSION_AUTO)
         
         try:
             self.templates = load_templates()
@@ -305,6 +365,11 @@ class PDFRenamerApp(QMainWindow):
         layout1.addWidget(self.process_combo)
         self.process_format_label = QLabel("Format: ")
         layout1.addWidget(self.process_format_label)
+        layout1.addWidget(QLabel("Simpan Hasil Sebagai:"))
+        self.process_output_combo = QComboBox()
+        self.process_output_combo.addItem("📦 Arsip ZIP", OUTPUT_ZIP)
+        self.process_output_combo.addItem("📁 Folder (tanpa ZIP)", OUTPUT_DIRECTORY)
+        layout1.addWidget(self.process_output_combo)
         layout.addWidget(group1)
 
         # Grup 2: File
@@ -370,9 +435,53 @@ class PDFRenamerApp(QMainWindow):
         path_layout.addWidget(browse_btn)
         save_layout.addLayout(path_layout)
         layout.addWidget(save_group)
+
+        parallel_group = QGroupBox("Pemrosesan Paralel")
+        parallel_layout = QVBoxLayout(parallel_group)
+        parallel_layout.addWidget(QLabel("Jumlah proses yang dipakai untuk memproses PDF secara bersamaan."))
+        workers_layout = QHBoxLayout()
+        workers_layout.addWidget(QLabel("Jumlah Proses:"))
+        self.max_workers_spin = QSpinBox()
+        self.max_workers_spin.setRange(1, get_max_workers_limit())
+        self.max_workers_spin.setValue(min(max(1, int(self.max_workers)), get_max_workers_limit()))
+        self.max_workers_spin.valueChanged.connect(self.set_max_workers)
+        workers_layout.addWidget(self.max_workers_spin)
+        workers_layout.addStretch()
+        parallel_layout.addLayout(workers_layout)
+        layout.addWidget(parallel_group)
+
+        compression_group = QGroupBox("Kompresi ZIP")
+        compression_layout = QVBoxLayout(compression_group)
+        compression_layout.addWidget(QLabel("Otomatis menyimpan PDF yang sudah terkompresi tanpa deflate ulang."))
+        self.compression_combo = QComboBox()
+        for label, mode in self.COMPRESSION_OPTIONS.items():
+            self.compression_combo.addItem(label, mode)
+        index = self.compression_combo.findData(self.zip_compression)
+        self.compression_combo.setCurrentIndex(max(0, index))
+        self.compression_combo.currentIndexChanged.connect(self.set_zip_compression)
+        compression_layout.addWidget(self.compression_combo)
+        layout.addWidget(compression_group)
         
         layout.addStretch()
         return widget
+
+    def set_zip_compression(self, index):
+        """Menyimpan kebijakan kompresi ZIP ke file konfigurasi."""
+        self.zip_compression = self.compression_combo.itemData(index)
+        self.config["zip_compression"] = self.zip_compression
+        try:
+            save_config(self.config)
+        except ConfigError as e:
+            logging.error(f"Gagal menyimpan kebijakan kompresi: {e}")
+
+    def set_max_workers(self, value):
+        """Menyimpan jumlah proses paralel ke file konfigurasi."""
+        self.max_workers = value
+        self.config["max_workers"] = value
+        try:
+            save_config(self.config)
+        except ConfigError as e:
+            logging.error(f"Gagal menyimpan jumlah proses: {e}")
     
     def set_default_save_location(self):
         """Membuka dialog untuk memilih folder dan menyimpannya."""
@@ -401,15 +510,21 @@ class PDFRenamerApp(QMainWindow):
         elif template_name not in self.built_in_templates:
             ValidationUtils.show_message(self, "Template Tidak Valid", "Silakan pilih template yang valid.", QMessageBox.Warning)
             return
-        timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")    
-        default_filename = os.path.join(self.default_save_path, f"Hasil Rename ({template_name})({timestamp}).zip")
-        save_path, _ = QFileDialog.getSaveFileName(self, "Simpan Hasil ke ZIP", default_filename, "Zip Files (*.zip)")
+        output_mode = self.process_output_combo.currentData()
+        if output_mode == OUTPUT_DIRECTORY:
+            save_path = QFileDialog.getExistingDirectory(self, "Pilih Folder Hasil", self.default_save_path)
+        else:
+            timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")    
+            default_filename = os.path.join(self.default_save_path, f"Hasil Rename ({template_name})({timestamp}).zip")
+            save_path, _ = QFileDialog.getSaveFileName(self, "Simpan Hasil ke ZIP", default_filename, "Zip Files (*.zip)")
         
         if not save_path: return
 
         self.process_run_btn.setEnabled(False)
         self.process_stop_btn.setEnabled(True)
-        self.worker = BulkProcessWorker(self.uploaded_files, template_to_use, save_path)
+        compression = CompressionPolicy(mode=self.zip_compression if self.zip_compression in COMPRESSION_MODES else COMPRESSION_AUTO)
+        self.worker = BulkProcessWorker(self.uploaded_files, template_to_use, save_path, self.max_workers, compression,
+                                        output_mode)
         self.worker.template_name = template_name
         
         self.worker.log.connect(self.process_log.append)
@@ -1,4 +1,5 @@
 import re
+from functools import cached_property
 
 def clean_filename(name):
     """
@@ -11,66 +12,131 @@ def clean_filename(name):
     return re.sub(r'[\\*?:"<>|]', '', name).strip()
 
 
+# Semua pola dikompilasi sekali saat modul dimuat.
+_RE_PEMBELI_BLOCK = re.compile(r"Pembeli Barang Kena Pajak.*?(Alamat|NPWP)", re.DOTALL)
+_RE_PKP_BLOCK = re.compile(r"Pengusaha Kena Pajak.*?(Alamat|NPWP)", re.DOTALL)
+_RE_BLOCK_NAMA = re.compile(r"Nama\s*[:：]\s*(.*?)\s*(?:\n|$)")
+_RE_NPWP_LIKE = re.compile(r"\d{2}\.\d{3}")
+_RE_REFERENSI = re.compile(r"\(Referensi:\s*(.*?)\)")
+_RE_REFERENSI_MASUKAN = re.compile(r"\(Referensi:\s*([^)]+)\)")
+_RE_PERJ = re.compile(r"Perj*[:：]\s*(.*?)\s*(?:\n|$)")
+_RE_NO_FAKTUR = re.compile(r"No\.\s*Faktur\s*[:：]\s*(\S+)")
+_RE_MASA_PAJAK_BUPOT = re.compile(r"MASA PAJAK.*?\n.*?(\d{2}-\d{4})", re.DOTALL)
+_RE_NAMA_BUPOT = re.compile(r"NAMA\s*:\s*([^\n]+)")
+_RE_NOMOR_DOKUMEN = re.compile(r"Nomor Dokumen\s*:\s*(\S+)")
+_RE_KODE_BILLING = re.compile(r"KODE BILLING\s*[:：]\s*(\d+)")
+_RE_NAMA_BILLING = re.compile(r"NAMA\s*[:：]\s*(.*?)\s*(?:\n|$)")
+_RE_MASA_PAJAK_BILLING = re.compile(r"\b\d{6}-\d{3}\s+(\d{8})\b")
+_RE_UNIFIKASI = re.compile(r"\b41112\d*-\d+\b")
+_RE_NOMINAL_TF = re.compile(r"Jumlah\s*:\s*(Rp\s*[\d,]+\.\d{2})")
+_RE_TANGGAL_TF = re.compile(r"Disetujui\s+(\d{2}/\d{2}/\d{4})")
+_RE_WHITESPACE = re.compile(r'\s+')
+
+class DocumentContext:
+    """
+    Hasil analisis satu dokumen yang dipakai bersama oleh semua pola.
+
+    Offset jangkar, blok yang dipakai lebih dari satu pola (mis. blok
+    "Pengusaha Kena Pajak" untuk Faktur Masukan dan Indomarco) dan daftar
+    baris hanya dihitung sekali per dokumen, saat pertama kali dibutuhkan.
+    Pencarian blok dimulai dari offset jangkarnya dan dilewati sama sekali
+    jika jangkarnya tidak ada.
+    """
+    def __init__(self, text):
+        self.text = text
+        self._offsets = {}
+
+    @classmethod
+    def of(cls, text_or_context):
+        if isinstance(text_or_context, cls): return text_or_context
+        return cls(text_or_context)
+
+    def offset(self, anchor):
+        """Posisi kemunculan pertama anchor di teks, atau -1."""
+        if anchor not in self._offsets:
+            self._offsets[anchor] = self.text.find(anchor)
+        return self._offsets[anchor]
+
+    def has(self, *anchors):
+        return all(self.offset(anchor) >= 0 for anchor in anchors)
+
+    def search(self, pattern, anchor):
+        """pattern.search mulai dari offset anchor; None tanpa memindai jika anchor tidak ada."""
+        start = self.offset(anchor)
+        if start < 0: return None
+        return pattern.search(self.text, start)
+
+    def _block_nama(self, pattern, anchor):
+        block_match = self.search(pattern, anchor)
+        if not block_match: return None
+        return _RE_BLOCK_NAMA.search(block_match.group(0))
+
+    @cached_property
+    def pembeli_nama(self):
+        """Match 'Nama' di dalam blok Pembeli Barang Kena Pajak."""
+        return self._block_nama(_RE_PEMBELI_BLOCK, "Pembeli Barang Kena Pajak")
+
+    @cached_property
+    def pkp_nama(self):
+        """Match 'Nama' di dalam blok Pengusaha Kena Pajak."""
+        return self._block_nama(_RE_PKP_BLOCK, "Pengusaha Kena Pajak")
+
+    @cached_property
+    def lines(self):
+        return self.text.split('\n')
+
 def try_faktur_pattern(text):
     """Pola Faktur Pembeli yang paling andal."""
-    buyer_block_match = re.search(r"Pembeli Barang Kena Pajak.*?(Alamat|NPWP)", text, re.DOTALL)
-    if buyer_block_match:
-        buyer_block_text = buyer_block_match.group(0)
-        nama_match = re.search(r"Nama\s*[:：]\s*(.*?)\s*(?:\n|$)", buyer_block_text)
-        if nama_match:
-            referensi_match = re.search(r"\(Referensi:\s*(.*?)\)", text)
-            if referensi_match:
-                referensi = clean_filename(referensi_match.group(1))
-                nama = clean_filename(nama_match.group(1))
-                if not re.match(r"\d{2}\.\d{3}", nama):
-                    return f"{referensi} {nama}.pdf"
+    ctx = DocumentContext.of(text)
+    nama_match = ctx.pembeli_nama
+    if nama_match:
+        referensi_match = ctx.search(_RE_REFERENSI, "(Referensi:")
+        if referensi_match:
+            referensi = clean_filename(referensi_match.group(1))
+            nama = clean_filename(nama_match.group(1))
+            if not _RE_NPWP_LIKE.match(nama):
+                return f"{referensi} {nama}.pdf"
     return None
 
 def try_faktur_masukan_pattern(text):
     """Pola Faktur Masukan/Pengusaha yang paling andal."""
-    pkp_block_match = re.search(r"Pengusaha Kena Pajak.*?(Alamat|NPWP)", text, re.DOTALL)
-    if pkp_block_match:
-        pkp_block_text = pkp_block_match.group(0)
-        nama_match = re.search(r"Nama\s*[:：]\s*(.*?)\s*(?:\n|$)", pkp_block_text)
-        if nama_match:
-            referensi_match = re.search(r"\(Referensi:\s*([^)]+)\)", text)
-            if referensi_match:
-                referensi = clean_filename(referensi_match.group(1))
-                nama = clean_filename(nama_match.group(1))
-                if not re.match(r"\d{2}\.\d{3}", nama):
-                    return f"{nama} {referensi}.pdf"
+    ctx = DocumentContext.of(text)
+    nama_match = ctx.pkp_nama
+    if nama_match:
+        referensi_match = ctx.search(_RE_REFERENSI_MASUKAN, "(Referensi:")
+        if referensi_match:
+            referensi = clean_filename(referensi_match.group(1))
+            nama = clean_filename(nama_match.group(1))
+            if not _RE_NPWP_LIKE.match(nama):
+                return f"{nama} {referensi}.pdf"
     return None
     
 def try_faktur2_indomarco_pattern(text):
     """Pola Faktur Indomarco yang paling andal."""
-    pkp_block_match = re.search(r"Pengusaha Kena Pajak.*?(Alamat|NPWP)", text, re.DOTALL)
-    if pkp_block_match:
-        pkp_block_text = pkp_block_match.group(0)
-        nama_match = re.search(r"Nama\s*[:：]\s*(.*?)\s*(?:\n|$)", pkp_block_text)
-        if nama_match:
-            referensi_match = re.search(r"Perj*[:：]\s*(.*?)\s*(?:\n|$)", text)
-            if referensi_match:
-                referensi = clean_filename(referensi_match.group(1))
-                nama = clean_filename(nama_match.group(1))
-                if not re.match(r"\d{2}\.\d{3}", nama):
-                    return f"{referensi} {nama}.pdf"
+    ctx = DocumentContext.of(text)
+    nama_match = ctx.pkp_nama
+    if nama_match:
+        referensi_match = ctx.search(_RE_PERJ, "Per")
+        if referensi_match:
+            referensi = clean_filename(referensi_match.group(1))
+            nama = clean_filename(nama_match.group(1))
+            if not _RE_NPWP_LIKE.match(nama):
+                return f"{referensi} {nama}.pdf"
     return None
 
 def try_faktur_penjualan_pattern(text):
-    pola = r"No\.\s*Faktur\s*[:：]\s*(\S+)"
-    match = re.search(pola, text)
+    ctx = DocumentContext.of(text)
+    match = ctx.search(_RE_NO_FAKTUR, "No.")
     if match:
         referensi = clean_filename(match.group(1))
         return f"No Faktur - {referensi}.pdf"
     return None
 
 def try_bukti_potong_pattern(text):
-    pola_masa = r"MASA PAJAK.*?\n.*?(\d{2}-\d{4})"
-    pola_nama = r"NAMA\s*:\s*([^\n]+)"
-    pola_dokumen = r"Nomor Dokumen\s*:\s*(\S+)"
-    match_masa = re.search(pola_masa, text, re.DOTALL)
-    match_nama = re.search(pola_nama, text)
-    match_dokumen = re.search(pola_dokumen, text)
+    ctx = DocumentContext.of(text)
+    match_masa = ctx.search(_RE_MASA_PAJAK_BUPOT, "MASA PAJAK")
+    match_nama = ctx.search(_RE_NAMA_BUPOT, "NAMA")
+    match_dokumen = ctx.search(_RE_NOMOR_DOKUMEN, "Nomor Dokumen")
     if match_masa and match_nama and match_dokumen:
         masa_pajak = clean_filename(match_masa.group(1))
         nama_wp = clean_filename(match_nama.group(1))
@@ -79,31 +145,32 @@ def try_bukti_potong_pattern(text):
     return None
 
 def try_billing_pattern(text):
-    kode_billing_match = re.search(r"KODE BILLING\s*[:：]\s*(\d+)", text)
-    nama_match = re.search(r"NAMA\s*[:：]\s*(.*?)\s*(?:\n|$)", text)
-    masa_pajak_match = re.search(r"\b\d{6}-\d{3}\s+(\d{8})\b", text)
+    ctx = DocumentContext.of(text)
+    kode_billing_match = ctx.search(_RE_KODE_BILLING, "KODE BILLING")
+    nama_match = ctx.search(_RE_NAMA_BILLING, "NAMA")
+    masa_pajak_match = kode_billing_match and nama_match and _RE_MASA_PAJAK_BILLING.search(ctx.text)
     if kode_billing_match and nama_match and masa_pajak_match:
         kode_billing = clean_filename(kode_billing_match.group(1))
         nama = clean_filename(nama_match.group(1))
         masa_pajak = clean_filename(masa_pajak_match.group(1))
-        unifikasi_part = "-Unifikasi" if re.search(r"\b41112\d*-\d+\b", text) else ""
+        unifikasi_part = "-Unifikasi" if _RE_UNIFIKASI.search(ctx.text) else ""
         return f"{kode_billing}-{nama}{unifikasi_part}-{masa_pajak}.pdf"
     return None
 
 def try_bukti_tf_pattern(text):
+    ctx = DocumentContext.of(text)
     nama_penerima, nominal_transfer, tanggal_setuju = None, None, None
-    for baris in text.split('\n'):
-        if "Rekening Tujuan" in baris and "/" in baris:
-            try:
-                nama_penerima = baris.split('/')[1].replace('(Rp)', '')
-                break
-            except IndexError: continue
-    pola_nominal = r"Jumlah\s*:\s*(Rp\s*[\d,]+\.\d{2})"
-    cocok_nominal = re.search(pola_nominal, text)
+    if ctx.has("Rekening Tujuan"):
+        for baris in ctx.lines:
+            if "Rekening Tujuan" in baris and "/" in baris:
+                try:
+                    nama_penerima = baris.split('/')[1].replace('(Rp)', '')
+                    break
+                except IndexError: continue
+    cocok_nominal = ctx.search(_RE_NOMINAL_TF, "Jumlah")
     if cocok_nominal:
-        nominal_transfer = re.sub(r'\s+', ' ', cocok_nominal.group(1))
-    pola_tanggal = r"Disetujui\s+(\d{2}/\d{2}/\d{4})"
-    cocok_tanggal = re.search(pola_tanggal, text)
+        nominal_transfer = _RE_WHITESPACE.sub(' ', cocok_nominal.group(1))
+    cocok_tanggal = ctx.search(_RE_TANGGAL_TF, "Disetujui")
     if cocok_tanggal:
         tanggal_setuju = cocok_tanggal.group(1)
     if nama_penerima and nominal_transfer and tanggal_setuju:
@@ -112,6 +179,53 @@ def try_bukti_tf_pattern(text):
         return f"{nama_penerima_clean} - {nominal_transfer} - {tanggal_setuju_clean}.pdf".replace(',', '.')
     return None
 
+AUTO_TEMPLATE_NAME = "🔎 Deteksi Otomatis"
+
+# Kata kunci jangkar yang WAJIB ada agar sebuah pola bisa cocok (diambil
+# dari bagian literal regex-nya). Urutan dict = prioritas saat mode otomatis;
+# Faktur Keluaran dan Masukan memiliki jangkar yang sama, sehingga dokumen
+# faktur pajak standar dikenali sebagai Keluaran.
+TEMPLATE_ANCHORS = {
+    "📄 Faktur Pajak Keluaran": ("Pembeli Barang Kena Pajak", "(Referensi:", "Nama"),
+    "📄 Faktur Pajak Masukan": ("Pengusaha Kena Pajak", "(Referensi:", "Nama"),
+    "📄 Faktur Penjualan": ("No.", "Faktur"),
+    "📄 Faktur Pajak Indomarco": ("Pengusaha Kena Pajak", "Per", "Nama"),
+    "🧾 Bukti Potong Pajak": ("MASA PAJAK", "NAMA", "Nomor Dokumen"),
+    "💳 Kode Billing Pajak": ("KODE BILLING", "NAMA"),
+    "💸 Bukti Transfer": ("Rekening Tujuan", "Jumlah", "Disetujui"),
+}
+_ANCHORS = tuple(dict.fromkeys(anchor for anchors in TEMPLATE_ANCHORS.values() for anchor in anchors))
+
+def find_anchors(text):
+    """
+    Mengembalikan {anchor: offset pertama} untuk jangkar yang muncul di teks.
+    Setiap jangkar dicari dengan str.find (pencarian substring di C), yang
+    terukur beberapa kali lebih cepat daripada satu regex alternasi untuk
+    belasan jangkar literal.
+    """
+    ctx = DocumentContext.of(text)
+    return {anchor: ctx.offset(anchor) for anchor in _ANCHORS if ctx.offset(anchor) >= 0}
+
+def detect_document_types(text):
+    """Template bawaan yang semua jangkarnya ada di teks, sesuai urutan prioritas."""
+    ctx = DocumentContext.of(text)
+    return [name for name, anchors in TEMPLATE_ANCHORS.items() if ctx.has(*anchors)]
+
+def detect_and_extract(text):
+    """
+    Mengklasifikasikan dokumen lalu hanya menjalankan pola yang lolos
+    prefilter jangkar. Mengembalikan (template_name, new_name) atau (None, None).
+    """
+    ctx = DocumentContext.of(text)
+    for template_name in detect_document_types(ctx):
+        new_name = BUILT_IN_TEMPLATES[template_name](ctx)
+        if new_name: return template_name, new_name
+    return None, None
+
+def try_auto_detect_pattern(text):
+    """Mode otomatis: jenis dokumen dideteksi per file."""
+    return detect_and_extract(text)[1]
+
 BUILT_IN_TEMPLATES = {
     "📄 Faktur Pajak Keluaran": try_faktur_pattern,
     "📄 Faktur Pajak Masukan": try_faktur_masukan_pattern,
@@ -119,11 +233,66 @@ BUILT_IN_TEMPLATES = {
     "📄 Faktur Pajak Indomarco": try_faktur2_indomarco_pattern,
     "🧾 Bukti Potong Pajak": try_bukti_potong_pattern,
     "💳 Kode Billing Pajak": try_billing_pattern,
-    "💸 Bukti Transfer": try_bukti_tf_pattern
+    "💸 Bukti Transfer": try_bukti_tf_pattern,
+    AUTO_TEMPLATE_NAME: try_auto_detect_pattern
 }
 
 def run_universal_extraction(text, template_name):
+    """text boleh berupa str atau DocumentContext yang sudah dianalisis."""
     if template_name in BUILT_IN_TEMPLATES:
         extractor_func = BUILT_IN_TEMPLATES[template_name]
         return extractor_func(text)
-    return None
\ No newline at end of file
+    return None
+
+def benchmark_extraction(iterations=200):
+    """
+    Membandingkan waktu per dokumen saat semua pola bawaan dijalankan:
+    pola lama (re.search dengan string literal, setiap pola memindai ulang
+    teks) versus pola terkompilasi dengan DocumentContext bersama.
+    """
+    import time
+
+    header = "Faktur Pajak\nKode dan Nomor Seri Faktur Pajak : 010.000-24.00000001\n"
+    body = "Barang dagangan No. 1 Harga Jual 1.000.000,00 Potongan 0,00\n" * 150
+    sample_text = (header +
+        "Pengusaha Kena Pajak\nNama : PT PENJUAL MAKMUR\nAlamat : Jl. Industri 1\nNPWP : 01.234.567.8-901.000\n" +
+        "Pembeli Barang Kena Pajak / Penerima Jasa Kena Pajak\nNama : PT PEMBELI SEJAHTERA\n" +
+        "Alamat : Jl. Niaga 2\nNPWP : 02.345.678.9-012.000\n" + body + "(Referensi: INV/2024/0001)\n")
+
+    def legacy_all(text):
+        # Setara dengan implementasi sebelumnya: tiap pola mencari ulang blok yang sama.
+        for block in ("Pembeli Barang Kena Pajak", "Pengusaha Kena Pajak", "Pengusaha Kena Pajak"):
+            match = re.search(block + r".*?(Alamat|NPWP)", text, re.DOTALL)
+            if match: re.search(r"Nama\s*[:：]\s*(.*?)\s*(?:\n|$)", match.group(0))
+        re.search(r"\(Referensi:\s*(.*?)\)", text)
+        re.search(r"\(Referensi:\s*([^)]+)\)", text)
+        re.search(r"Perj*[:：]\s*(.*?)\s*(?:\n|$)", text)
+        re.search(r"No\.\s*Faktur\s*[:：]\s*(\S+)", text)
+        re.search(r"MASA PAJAK.*?\n.*?(\d{2}-\d{4})", text, re.DOTALL)
+        re.search(r"NAMA\s*:\s*([^\n]+)", text)
+        re.search(r"Nomor Dokumen\s*:\s*(\S+)", text)
+        re.search(r"KODE BILLING\s*[:：]\s*(\d+)", text)
+        re.search(r"NAMA\s*[:：]\s*(.*?)\s*(?:\n|$)", text)
+        re.search(r"\b\d{6}-\d{3}\s+(\d{8})\b", text)
+        text.split('\n')
+        re.search(r"Jumlah\s*:\s*(Rp\s*[\d,]+\.\d{2})", text)
+        re.search(r"Disetujui\s+(\d{2}/\d{2}/\d{4})", text)
+
+    def shared_all(text):
+        ctx = DocumentContext(text)
+        for name, extractor_func in BUILT_IN_TEMPLATES.items():
+            if name != AUTO_TEMPLATE_NAME: extractor_func(ctx)
+
+    print(f"--- Benchmark ekstraksi ({len(sample_text):,} karakter, {iterations} iterasi) ---")
+    timings = {}
+    for label, func in (("Pola lama", legacy_all), ("Konteks bersama", shared_all),
+                        ("Deteksi otomatis", try_auto_detect_pattern)):
+        start_time = time.perf_counter()
+        for _ in range(iterations): func(sample_text)
+        timings[label] = (time.perf_counter() - start_time) / iterations
+        print(f"{label:<17}: {timings[label] * 1e6:9.1f} µs/dokumen")
+    print(f"Percepatan konteks bersama: {timings['Pola lama'] / timings['Konteks bersama']:.1f}x")
+    print(f"Hasil deteksi otomatis: {detect_and_extract(sample_text)}")
+
+if __name__ == "__main__":
+    benchmark_extraction()
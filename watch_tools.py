@@ -0,0 +1,284 @@
+import hashlib
+import json
+import logging
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+from batch_tools import BatchResult, process_batch_file
+from pdf_tools import prepare_template
+from utils import get_app_data_dir
+
+WATCH_STATE_DIR = "watch_state"
+DEFAULT_POLL_INTERVAL = 2.0
+DEFAULT_SETTLE_SECONDS = 5.0
+# Jeda minimal antar penulisan file state agar inbox yang ramai tidak
+# membuat file JSON ditulis ulang untuk setiap PDF.
+STATE_SAVE_INTERVAL = 5.0
+# Berapa kali sebuah file boleh ikut dalam pool yang crash sebelum dianggap
+# sebagai penyebabnya dan ditandai gagal.
+MAX_CRASH_RETRIES = 2
+
+class WatchState:
+    """
+    Daftar file yang sudah diproses beserta signature (size, mtime_ns) saat
+    diproses, disimpan sebagai JSON di app data dir agar restart daemon tidak
+    memproses ulang isi inbox. File yang berubah setelah diproses akan
+    diproses lagi.
+    """
+    def __init__(self, watch_dir):
+        key = hashlib.sha1(str(Path(watch_dir).resolve()).encode("utf-8")).hexdigest()[:16]
+        state_dir = get_app_data_dir() / WATCH_STATE_DIR
+        state_dir.mkdir(exist_ok=True)
+        self.path = state_dir / f"{key}.json"
+        self.processed = {}
+        self._dirty = False
+        self._last_save = 0.0
+        self._load()
+
+    def _load(self):
+        if not self.path.exists(): return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.processed = {p: tuple(sig) for p, sig in json.load(f).get("processed", {}).items()}
+        except (json.JSONDecodeError, OSError, AttributeError, TypeError) as e:
+            logging.warning(f"State watcher tidak bisa dibaca, mulai dari kosong: {e}")
+            self.processed = {}
+
+    def is_processed(self, path, signature):
+        return self.processed.get(path) == signature
+
+    def mark(self, path, signature):
+        self.processed[path] = signature
+        self._dirty = True
+
+    def prune(self, existing_paths):
+        """Membuang entri untuk file yang sudah tidak ada di inbox (mis. dipindah)."""
+        stale = [p for p in self.processed if p not in existing_paths]
+        for p in stale: del self.processed[p]
+        if stale: self._dirty = True
+
+    def save(self, force=False):
+        if not self._dirty: return
+        if not force and time.monotonic() - self._last_save < STATE_SAVE_INTERVAL: return
+        temp_path = self.path.with_suffix('.tmp')
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({"processed": self.processed}, f)
+            temp_path.replace(self.path)
+            self._dirty = False
+            self._last_save = time.monotonic()
+        except OSError as e:
+            logging.error(f"Gagal menyimpan state watcher: {e}")
+
+class FolderWatcher:
+    """
+    Daemon yang memantau sebuah folder inbox dengan polling.
+
+    Sebuah PDF baru diproses hanya setelah ukuran dan mtime-nya tidak
+    berubah selama settle_seconds (debounce untuk file yang masih disalin
+    oleh scanner). Pemrosesan berjalan di ProcessPoolExecutor dengan jumlah
+    tugas aktif yang dibatasi; file rusak (bahkan yang membuat worker crash)
+    hanya dicatat sebagai gagal dan tidak menghentikan daemon. Hasil ditulis
+    langsung ke writer (DirectoryWriter atau RollingZipWriter).
+
+    Dengan RollingZipWriter, file baru ditandai selesai setelah arsip yang
+    memuatnya difinalisasi; file di arsip yang terbuang (mis. disk penuh)
+    tidak ditandai sehingga diproses ulang.
+    """
+    def __init__(self, watch_dir, template, template_name, writer, max_workers=1,
+                 poll_interval=DEFAULT_POLL_INTERVAL, settle_seconds=DEFAULT_SETTLE_SECONDS,
+                 recursive=False, roll_idle_seconds=None, on_result=None):
+        self.watch_dir = Path(watch_dir)
+        if not self.watch_dir.is_dir():
+            raise ValueError(f"Folder inbox tidak ditemukan: {self.watch_dir}")
+        self.template = prepare_template(template, template_name)
+        self.template_name = template_name
+        self.writer = writer
+        self.max_workers = max(1, int(max_workers or 1))
+        self.max_in_flight = self.max_workers * 2
+        self.poll_interval = poll_interval
+        self.settle_seconds = settle_seconds
+        self.recursive = recursive
+        self.roll_idle_seconds = roll_idle_seconds
+        self.on_result = on_result
+        self.state = WatchState(self.watch_dir)
+        self.success_count = 0
+        self.error_count = 0
+        self._candidates = {}
+        self._crash_counts = {}
+        self._in_flight = {}
+        self._executor = None
+        self._last_write = None
+        self._sequence = 0
+        self._running = False
+        # (path, signature) yang sudah ditulis ke arsip bergulir yang belum difinalisasi.
+        self._unfinalized = deque()
+        self._finalized_seen = getattr(writer, "finalized_count", 0)
+        self._discarded_seen = getattr(writer, "discarded_count", 0)
+        self.writer_error = None
+
+    def _scan(self):
+        """Mengembalikan {path: (size, mtime_ns)} untuk semua PDF di inbox."""
+        pattern = "**/*" if self.recursive else "*"
+        found = {}
+        for path in self.watch_dir.glob(pattern):
+            if path.suffix.lower() != ".pdf" or path.name.startswith("."): continue
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            if not path.is_file(): continue
+            found[str(path)] = (st.st_size, st.st_mtime_ns)
+        return found
+
+    def _stable_files(self, found, now):
+        """Debounce: file dianggap siap jika signature-nya tidak berubah selama settle_seconds."""
+        ready = []
+        for path, signature in found.items():
+            if path in self._in_flight or self.state.is_processed(path, signature): continue
+            previous = self._candidates.get(path)
+            if previous is None or previous[0] != signature:
+                self._candidates[path] = (signature, now)
+            elif signature[0] > 0 and now - previous[1] >= self.settle_seconds:
+                ready.append(path)
+        for path in list(self._candidates):
+            if path not in found: del self._candidates[path]
+        return ready
+
+    def _ensure_executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    def _submit(self, path):
+        signature = self._candidates.pop(path)[0]
+        future = self._ensure_executor().submit(
+            process_batch_file, self._sequence, path, self.template, self.template_name, True)
+        self._in_flight[path] = (self._sequence, signature, future)
+        self._sequence += 1
+
+    def _collect(self, wait=False):
+        """Menulis hasil dari tugas yang sudah selesai ke writer."""
+        for path, (index, signature, future) in list(self._in_flight.items()):
+            if not wait and not future.done(): continue
+            try:
+                result = future.result()
+            except BrokenProcessPool as e:
+                # Worker mati (mis. MuPDF crash pada file rusak): buat pool baru.
+                # Semua tugas di pool ikut gagal, jadi file dicoba ulang beberapa
+                # kali sebelum dianggap sebagai penyebab crash.
+                if self._executor is not None:
+                    self._executor.shutdown(wait=False, cancel_futures=True)
+                    self._executor = None
+                del self._in_flight[path]
+                self._crash_counts[path] = self._crash_counts.get(path, 0) + 1
+                if self._crash_counts[path] < MAX_CRASH_RETRIES: continue
+                result = BatchResult(index, path, None, None, f"Worker berhenti tak terduga: {e}", unexpected=True)
+                self._handle_result(result, signature)
+                continue
+            except Exception as e:
+                result = BatchResult(index, path, None, None, f"Error tak terduga: {e}", unexpected=True)
+            del self._in_flight[path]
+            self._handle_result(result, signature)
+
+    def _handle_result(self, result, signature):
+        output_name = None
+        archive_lost = False
+        if result.new_name and result.content:
+            discarded_before = getattr(self.writer, "discarded_count", 0)
+            try:
+                output_name = self.writer.add(result.new_name, result.content)
+                if output_name is None: result.error = "File sumber kosong atau tidak dapat dibaca saat ditulis"
+                self._last_write = time.monotonic()
+            except Exception as e:
+                result.error = f"Gagal menulis hasil: {e}"
+            # Arsip aktif ikut terbuang: kesalahan ada di arsip, bukan di file ini.
+            archive_lost = getattr(self.writer, "discarded_count", 0) != discarded_before
+        if output_name:
+            self.success_count += 1
+            logging.info(f"✅ {Path(result.file_path).name} → {output_name}")
+        else:
+            self.error_count += 1
+            result.error = result.error or "Gagal memproses file"
+            logging.warning(f"❌ {Path(result.file_path).name}: {result.error}")
+        # File gagal juga ditandai agar tidak diproses berulang kali; akan
+        # dicoba lagi hanya jika isinya berubah.
+        if output_name and hasattr(self.writer, "finalized_count"):
+            self._unfinalized.append((result.file_path, signature))
+        elif not archive_lost:
+            self.state.mark(result.file_path, signature)
+        self._settle_archives()
+        self._crash_counts.pop(result.file_path, None)
+        if self.on_result:
+            try:
+                self.on_result(result, output_name)
+            except Exception as e:
+                logging.error(f"Callback hasil watcher gagal: {e}")
+
+    def _settle_archives(self):
+        """Menandai file di arsip yang sudah difinalisasi; file di arsip yang terbuang akan diproses ulang."""
+        if not hasattr(self.writer, "finalized_count"): return
+        finalized = self.writer.finalized_count - self._finalized_seen
+        discarded = self.writer.discarded_count - self._discarded_seen
+        self._finalized_seen += finalized
+        self._discarded_seen += discarded
+        for _ in range(min(finalized, len(self._unfinalized))):
+            self.state.mark(*self._unfinalized.popleft())
+        for _ in range(min(discarded, len(self._unfinalized))):
+            path, _signature = self._unfinalized.popleft()
+            self.success_count -= 1
+            logging.warning(f"⚠️ Arsip aktif terbuang, {Path(path).name} akan diproses ulang")
+
+    def _maybe_roll(self):
+        roll = getattr(self.writer, "roll", None)
+        if roll is None or self.roll_idle_seconds is None or self._last_write is None: return
+        if not self._in_flight and time.monotonic() - self._last_write >= self.roll_idle_seconds:
+            self._last_write = None
+            try:
+                archive = roll()
+            finally:
+                self._settle_archives()
+            if archive: logging.info(f"📦 Arsip difinalisasi: {archive}")
+
+    def poll_once(self):
+        """Satu siklus: kumpulkan hasil, pindai inbox, kirim file yang sudah stabil."""
+        self._collect()
+        found = self._scan()
+        self.state.prune(found)
+        for path in self._stable_files(found, time.monotonic()):
+            if len(self._in_flight) >= self.max_in_flight: break
+            self._submit(path)
+        self._maybe_roll()
+        self.state.save()
+
+    def run(self, should_stop=None):
+        """Loop utama daemon sampai should_stop() bernilai True atau stop() dipanggil."""
+        should_stop = should_stop or (lambda: False)
+        self._running = True
+        logging.info(f"👀 Memantau {self.watch_dir} dengan template '{self.template_name}'")
+        try:
+            while self._running and not should_stop():
+                try:
+                    self.poll_once()
+                except Exception as e:
+                    logging.error(f"Error pada siklus watcher: {e}")
+                time.sleep(self.poll_interval)
+        finally:
+            self._collect(wait=True)
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+            try:
+                self.writer.close()
+            except Exception as e:
+                # Dilaporkan lewat writer_error agar pemanggil bisa keluar dengan status gagal.
+                self.writer_error = e
+                logging.error(f"Gagal memfinalisasi output watcher: {e}")
+            self._settle_archives()
+            self.state.save(force=True)
+            logging.info(f"Watcher berhenti. Berhasil: {self.success_count} | Gagal: {self.error_count}")
+
+    def stop(self):
+        self._running = False
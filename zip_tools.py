@@ -1,6 +1,17 @@
 import zipfile
+import zlib
+import errno
+import hashlib
+import json
 import os
+import shutil
+import struct
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Optional
 import logging
 import re 
 
@@ -10,6 +21,136 @@ class ZipError(Exception):
 class ZipValidationError(Exception):
     pass
 
+class _SourceReadError(Exception):
+    """Sumber member gagal dibaca atau berubah saat disalin; arsipnya sendiri tetap utuh."""
+    pass
+
+COMPRESSION_STORED = "stored"
+COMPRESSION_DEFLATED = "deflated"
+COMPRESSION_AUTO = "auto"
+COMPRESSION_MODES = (COMPRESSION_AUTO, COMPRESSION_STORED, COMPRESSION_DEFLATED)
+# Ukuran potongan saat menyalin file sumber ke dalam arsip.
+COPY_CHUNK_SIZE = 1024 * 1024
+# Checkpoint: isi arsip .tmp di-fsync ke disk setiap sekian member atau byte,
+# sehingga setelah listrik padam recover_zip bisa menyelamatkan semua member
+# sampai checkpoint terakhir.
+CHECKPOINT_MEMBERS = 100
+CHECKPOINT_BYTES = 64 * 1024 * 1024
+
+# Member manifest di dalam setiap arsip: ukuran, CRC, dan SHA-256 tiap file,
+# dihitung saat file ditulis sehingga verifikasi tidak perlu membaca ulang.
+CHECKSUM_MEMBER_NAME = ".pdf_renamer_checksums.json"
+CHECKSUM_MANIFEST_VERSION = 1
+VERIFY_WORKERS = 4
+
+_LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+_LOCAL_SIGNATURE = b"PK\x03\x04"
+_ZIP64_EXTRA_ID = 0x0001
+_FLAG_DATA_DESCRIPTOR = 0x08
+_FLAG_UTF8 = 0x800
+# Atribut internal ZipFile yang diubah saat membuang member yang gagal ditulis.
+_ZIPFILE_STATE = ("filelist", "NameToInfo", "fp", "start_dir")
+
+OUTPUT_AUTO = "auto"
+OUTPUT_LINK = "link"
+OUTPUT_MOVE = "move"
+OUTPUT_COPY = "copy"
+OUTPUT_METHODS = (OUTPUT_AUTO, OUTPUT_LINK, OUTPUT_MOVE, OUTPUT_COPY)
+
+@dataclass
+class CompressionPolicy:
+    """
+    Kebijakan kompresi member ZIP.
+
+    - stored: tanpa kompresi.
+    - deflated: selalu deflate dengan level tertentu.
+    - auto: kompres sampel kecil dari tiap file; jika penghematannya di bawah
+      min_gain (mis. PDF yang stream-nya sudah terkompresi) file disimpan apa adanya.
+    """
+    mode: str = COMPRESSION_AUTO
+    level: int = 6
+    sample_size: int = 64 * 1024
+    min_gain: float = 0.05
+
+    def validate(self):
+        if self.mode not in COMPRESSION_MODES:
+            raise ZipValidationError(f"Mode kompresi tidak dikenal: {self.mode}")
+        if not 0 <= self.level <= 9:
+            raise ZipValidationError(f"Level kompresi harus 0-9: {self.level}")
+
+    def choose(self, content_bytes):
+        """Menentukan compress_type untuk satu member berupa bytes."""
+        if self.mode != COMPRESSION_AUTO: return self._fixed_type()
+        return self._choose_from_sample(self._sample(content_bytes))
+
+    def choose_for_file(self, file_path, file_size):
+        """Menentukan compress_type untuk member yang disalin dari file di disk."""
+        if self.mode != COMPRESSION_AUTO: return self._fixed_type()
+        return self._choose_from_sample(self._sample_file(file_path, file_size))
+
+    def _fixed_type(self):
+        return zipfile.ZIP_STORED if self.mode == COMPRESSION_STORED else zipfile.ZIP_DEFLATED
+
+    def _choose_from_sample(self, sample):
+        if not sample: return zipfile.ZIP_STORED
+        gain = 1 - len(zlib.compress(sample, self.level)) / len(sample)
+        return zipfile.ZIP_DEFLATED if gain >= self.min_gain else zipfile.ZIP_STORED
+
+    def _sample_offsets(self, size):
+        # Ambil potongan awal, tengah, dan akhir: header PDF biasanya teks
+        # polos, sedangkan stream besar (gambar/font) ada di tengah file.
+        part = self.sample_size // 3
+        return part, (0, size // 2, size - part)
+
+    def _sample(self, content_bytes):
+        if len(content_bytes) <= self.sample_size: return content_bytes
+        part, offsets = self._sample_offsets(len(content_bytes))
+        return b"".join(content_bytes[offset:offset + part] for offset in offsets)
+
+    def _sample_file(self, file_path, file_size):
+        with open(file_path, 'rb') as f:
+            if file_size <= self.sample_size: return f.read()
+            part, offsets = self._sample_offsets(file_size)
+            chunks = []
+            for offset in offsets:
+                f.seek(offset)
+                chunks.append(f.read(part))
+            return b"".join(chunks)
+
+@dataclass
+class CompressionStats:
+    """Ringkasan biaya dan hasil kompresi untuk satu arsip."""
+    policy: str
+    stored_count: int = 0
+    deflated_count: int = 0
+    bytes_in: int = 0
+    bytes_out: int = 0
+    cpu_seconds: float = 0.0
+
+    @property
+    def bytes_saved(self):
+        return self.bytes_in - self.bytes_out
+
+    def merge(self, other):
+        """Menjumlahkan statistik arsip lain (mis. bagian arsip bergulir) ke statistik ini."""
+        self.stored_count += other.stored_count
+        self.deflated_count += other.deflated_count
+        self.bytes_in += other.bytes_in
+        self.bytes_out += other.bytes_out
+        self.cpu_seconds += other.cpu_seconds
+
+    def summary(self):
+        return (f"Kompresi '{self.policy}': {self.deflated_count} deflate, {self.stored_count} stored, "
+                f"hemat {self.bytes_saved / 1024:.1f} KB dari {self.bytes_in / 1024:.1f} KB, "
+                f"CPU {self.cpu_seconds:.2f} detik")
+
+@dataclass
+class MemberChecksum:
+    """Ukuran, CRC-32, dan SHA-256 isi satu member; sha256 None untuk member hasil pemulihan."""
+    size: int
+    crc: int
+    sha256: Optional[str] = None
+
 def sanitize_filename(filename):
 
     if not isinstance(filename, str):
@@ -20,6 +161,16 @@ def sanitize_filename(filename):
         return "unnamed_file"
     return cleaned_name
 
+def _source_size(content):
+    """Ukuran konten member (bytes atau path), 0 jika tidak valid."""
+    if isinstance(content, bytes): return len(content)
+    if isinstance(content, (str, os.PathLike)):
+        try:
+            return os.path.getsize(content)
+        except OSError:
+            return 0
+    return 0
+
 def validate_zip_path(save_path):
     """Validates the ZIP file save path."""
     try:
@@ -39,58 +190,1150 @@ def validate_zip_data(renamed_data):
     if not renamed_data: return False, "Tidak ada data untuk di-zip"
     return True, ""
 
-def save_zip(renamed_data, save_path):
+def _split_zip64_extra(extra):
+    """Memisahkan field ZIP64 (0x0001) dari extra header lokal: (data zip64, extra sisanya)."""
+    zip64, rest, offset = b"", b"", 0
+    while offset + 4 <= len(extra):
+        field_id, length = struct.unpack_from("<2H", extra, offset)
+        field = extra[offset:offset + 4 + length]
+        if field_id == _ZIP64_EXTRA_ID: zip64 = field[4:]
+        else: rest += field
+        offset += 4 + length
+    return zip64, rest
+
+def _read_member_data(f, offset, compress_size, compress_type, digest=None):
+    """
+    Membaca data satu member (stored/deflate) langsung dari offset-nya.
+    Mengembalikan (ukuran, CRC) data asli, atau None jika terpotong/rusak.
+    digest (mis. hashlib.sha256()) ikut di-update bila diberikan.
+    """
+    f.seek(offset)
+    decompressor = zlib.decompressobj(-15) if compress_type == zipfile.ZIP_DEFLATED else None
+    remaining, size, crc = compress_size, 0, 0
+
+    def consume(data):
+        nonlocal size, crc
+        size += len(data)
+        crc = zlib.crc32(data, crc)
+        if digest is not None: digest.update(data)
+
+    try:
+        while remaining:
+            chunk = f.read(min(COPY_CHUNK_SIZE, remaining))
+            if not chunk: return None
+            remaining -= len(chunk)
+            consume(chunk if decompressor is None else decompressor.decompress(chunk))
+        if decompressor is not None: consume(decompressor.flush())
+    except zlib.error:
+        return None
+    return size, crc
+
+def _member_data_ok(f, offset, compress_size, file_size, compress_type, crc):
+    """Membaca ulang data satu member dan mencocokkan ukuran serta CRC-nya."""
+    return _read_member_data(f, offset, compress_size, compress_type) == (file_size, crc)
+
+def _scan_local_entries(f, total_size, keep=None):
+    """
+    Menelusuri header lokal dari awal file dan mengembalikan ([ZipInfo],
+    offset akhir member utuh terakhir). Penelusuran berhenti di member
+    pertama yang terpotong atau rusak, atau yang namanya tidak ada di keep.
+    """
+    entries, offset = [], 0
+    while offset + _LOCAL_HEADER.size <= total_size:
+        f.seek(offset)
+        (signature, extract_version, flags, compress_type, dos_time, dos_date, crc,
+         compress_size, file_size, name_length, extra_length) = _LOCAL_HEADER.unpack(f.read(_LOCAL_HEADER.size))
+        if signature != _LOCAL_SIGNATURE: break
+        # Tanpa ukuran di header lokal (data descriptor) batas member tidak bisa ditentukan.
+        if flags & _FLAG_DATA_DESCRIPTOR: break
+        if compress_type not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED): break
+        name_bytes = f.read(name_length)
+        zip64, extra = _split_zip64_extra(f.read(extra_length))
+        if len(name_bytes) != name_length: break
+        sizes = list(struct.unpack_from(f"<{len(zip64) // 8}Q", zip64))
+        if file_size == 0xFFFFFFFF and sizes: file_size = sizes.pop(0)
+        if compress_size == 0xFFFFFFFF and sizes: compress_size = sizes.pop(0)
+        data_offset = offset + _LOCAL_HEADER.size + name_length + extra_length
+        if data_offset + compress_size > total_size: break
+        if not _member_data_ok(f, data_offset, compress_size, file_size, compress_type, crc): break
+
+        name = name_bytes.decode('utf-8' if flags & _FLAG_UTF8 else 'cp437')
+        if keep is not None and name not in keep: break
+        date_time = ((dos_date >> 9) + 1980, (dos_date >> 5) & 0xF, dos_date & 0x1F,
+                     dos_time >> 11, (dos_time >> 5) & 0x3F, (dos_time & 0x1F) * 2)
+        try:
+            zinfo = zipfile.ZipInfo(name, date_time=date_time)
+        except ValueError:
+            zinfo = zipfile.ZipInfo(name)
+        zinfo.compress_type = compress_type
+        zinfo.flag_bits = flags
+        zinfo.extract_version = extract_version
+        zinfo.extra = extra
+        zinfo.external_attr = 0o600 << 16
+        zinfo.CRC = crc
+        zinfo.compress_size = compress_size
+        zinfo.file_size = file_size
+        zinfo.header_offset = offset
+        entries.append(zinfo)
+        offset = data_offset + compress_size
+    return entries, offset
+
+def _set_compress_level(zinfo, level):
+    """Level kompresi untuk member yang ditulis lewat ZipFile.open(zinfo, 'w')."""
+    if hasattr(zinfo, "compress_level"):
+        zinfo.compress_level = level
+    else:
+        # Sebelum Python 3.13 belum ada atribut publiknya; writestr(compresslevel=...) mengisi atribut yang sama.
+        zinfo._compresslevel = level
+
+def recover_zip(path, output_path=None, keep=None):
+    """
+    Memulihkan arsip yang penulisannya terputus (mis. file .tmp dari
+    ZipStreamWriter setelah crash atau listrik padam). Arsip seperti itu
+    belum punya central directory, jadi member-nya dibaca ulang dari header
+    lokal; setiap member diperiksa ukuran dan CRC-nya, dan sisa yang
+    terpotong dibuang. Central directory lalu ditulis ulang sehingga arsip
+    bisa dibuka biasa. Tanpa output_path, file dipulihkan di tempat. Jika
+    keep diberikan, arsip dipotong sebelum member pertama yang namanya
+    tidak ada di keep (mis. belum tercatat di jurnal job). Mengembalikan daftar nama member yang berhasil diselamatkan.
+    """
+    path = Path(path)
+    target = Path(output_path) if output_path else path
+    try:
+        with open(path, 'rb') as f:
+            entries, valid_end = _scan_local_entries(f, os.fstat(f.fileno()).st_size, keep)
+            if target != path:
+                f.seek(0)
+                with open(target, 'xb') as out:
+                    remaining = valid_end
+                    while remaining:
+                        chunk = f.read(min(COPY_CHUNK_SIZE, remaining))
+                        if not chunk: break
+                        out.write(chunk)
+                        remaining -= len(chunk)
+        with open(target, 'r+b') as f:
+            f.truncate(valid_end)
+            # Tanpa end-of-central-directory, mode 'a' menulis mulai dari akhir file.
+            with zipfile.ZipFile(f, 'a') as zf:
+                for zinfo in entries:
+                    zf.filelist.append(zinfo)
+                    zf.NameToInfo[zinfo.filename] = zinfo
+            f.flush()
+            os.fsync(f.fileno())
+        with zipfile.ZipFile(target, 'r') as zf:
+            names = zf.namelist()
+    except (OSError, zipfile.BadZipFile, struct.error) as e:
+        logging.error(f"Gagal memulihkan arsip {path}: {e}")
+        raise ZipError(f"Gagal memulihkan arsip {path}: {e}")
+    if len(names) != len(entries):
+        raise ZipError(f"Gagal memulihkan arsip {path}: central directory tidak konsisten")
+    names = [name for name in names if name != CHECKSUM_MEMBER_NAME]
+    logging.info(f"{len(names)} file dipulihkan dari {path} ({valid_end} byte utuh)")
+    return names
+
+class ZipStreamWriter:
+    """
+    Penulis arsip ZIP inkremental. Arsip dibuka di awal batch dan setiap file
+    langsung ditambahkan begitu selesai diproses, sehingga pemakaian memori
+    tetap datar. Data ditulis ke file .tmp lalu di-rename ke path tujuan saat
+    close(), sama seperti save_zip.
+
+    Setiap checkpoint_members file atau checkpoint_bytes byte, isi .tmp
+    di-fsync; jika proses terputus, recover_zip menyelamatkan semua member
+    sampai checkpoint terakhir (biasanya lebih). Dengan resume_names (nama
+    member yang tercatat selesai), .tmp yang tertinggal dipulihkan sampai
+    member terakhir yang tercatat lalu ditambah, bukan ditimpa; nama member
+    yang dipertahankan tersedia di existing_names.
+    """
+    def __init__(self, save_path, compression=None, resume_names=None,
+                 checkpoint_members=CHECKPOINT_MEMBERS, checkpoint_bytes=CHECKPOINT_BYTES):
+        self.compression = compression or CompressionPolicy()
+        self.compression.validate()
+        is_valid_path, path_error_msg = validate_zip_path(save_path)
+        if not is_valid_path:
+            raise ZipValidationError(f"Path tidak valid: {path_error_msg}")
+
+        self.save_path = Path(save_path)
+        self.temp_path = self.save_path.with_suffix('.tmp')
+        self.file_count = 0
+        self.aborted = False
+        self.stats = CompressionStats(policy=self.compression.mode)
+        self.checkpoint_members = checkpoint_members
+        self.checkpoint_bytes = checkpoint_bytes
+        self._members_since_checkpoint = 0
+        self._bytes_since_checkpoint = 0
+        self.existing_names = set()
+        self.checksums = {}
+        if resume_names is not None and self.temp_path.exists():
+            self.existing_names = set(recover_zip(self.temp_path, keep=set(resume_names)))
+        try:
+            self._zf = zipfile.ZipFile(self.temp_path, 'a' if self.existing_names else 'w', zipfile.ZIP_DEFLATED,
+                                       compresslevel=self.compression.level)
+        except Exception as e:
+            logging.error(f"Terjadi kesalahan saat membuat file Zip: {e}")
+            raise ZipError(f"Terjadi kesalahan saat membuat file Zip: {e}")
+        # SHA-256 member yang dipulihkan tidak diketahui tanpa membaca ulang; cukup CRC-nya.
+        for zinfo in self._zf.infolist():
+            self.checksums[zinfo.filename] = MemberChecksum(zinfo.file_size, zinfo.CRC)
+
+    def add(self, original_name, content):
+        """
+        Menambahkan satu file ke arsip. content boleh berupa bytes atau path
+        file sumber; path disalin per potongan tanpa memuat seluruh isinya.
+        Mengembalikan nama di dalam ZIP, atau None jika dilewati.
+        """
+        safe_name = sanitize_filename(original_name)
+
+        if original_name != safe_name:
+            logging.warning(f"Nama file diubah demi keamanan: '{original_name}' -> '{safe_name}'")
+
+        source_size = _source_size(content)
+        if not source_size:
+            logging.warning(f"File kosong atau konten tidak valid dilewati: {safe_name}")
+            return None
+
+        cpu_start = time.thread_time()
+        source_file = None
+        if not isinstance(content, bytes):
+            # Sumber yang hilang/terkunci tidak boleh merusak arsip yang sedang ditulis.
+            try:
+                compress_type = self.compression.choose_for_file(content, source_size)
+                source_file = open(content, 'rb')
+            except OSError as e:
+                raise ZipError(f"Gagal membaca file sumber {content}: {e}")
+
+        try:
+            if source_file is None:
+                compress_type = self.compression.choose(content)
+                self._zf.writestr(safe_name, content, compress_type=compress_type)
+                self._remember_checksum(hashlib.sha256(content).hexdigest())
+            else:
+                with source_file:
+                    self._write_file(safe_name, source_file, source_size, compress_type)
+            self._record(compress_type, source_size, cpu_start)
+        except _SourceReadError as e:
+            raise ZipError(f"Gagal membaca file sumber {content}: {e}")
+        except Exception as e:
+            self.abort()
+            logging.error(f"Terjadi kesalahan saat membuat file Zip: {e}")
+            raise ZipError(f"Terjadi kesalahan saat membuat file Zip: {e}")
+        self.file_count += 1
+        return safe_name
+
+    def copy_member(self, source_zip, member_name):
+        """
+        Menyalin satu anggota dari arsip lain (mis. arsip run sebelumnya pada
+        mode inkremental) dengan nama dan metode kompresi yang sama.
+        """
+        zinfo = source_zip.getinfo(member_name)
+        cpu_start = time.thread_time()
+        try:
+            source_file = source_zip.open(zinfo)
+        except (OSError, zipfile.BadZipFile, zlib.error) as e:
+            raise ZipError(f"Gagal membaca {member_name} dari arsip sumber: {e}")
+        try:
+            with source_file:
+                self._write_file(member_name, source_file, zinfo.file_size, zinfo.compress_type)
+            self._record(zinfo.compress_type, zinfo.file_size, cpu_start)
+        except _SourceReadError as e:
+            raise ZipError(f"Gagal membaca {member_name} dari arsip sumber: {e}")
+        except Exception as e:
+            self.abort()
+            logging.error(f"Terjadi kesalahan saat membuat file Zip: {e}")
+            raise ZipError(f"Terjadi kesalahan saat membuat file Zip: {e}")
+        self.file_count += 1
+        return member_name
+
+    def _write_file(self, safe_name, source_file, file_size, compress_type):
+        zinfo = zipfile.ZipInfo(safe_name, date_time=time.localtime(time.time())[:6])
+        zinfo.compress_type = compress_type
+        _set_compress_level(zinfo, self.compression.level)
+        zinfo.external_attr = 0o600 << 16
+        # file_size dipakai zipfile untuk memutuskan perlu ZIP64 atau tidak.
+        zinfo.file_size = file_size
+        digest = hashlib.sha256()
+        copied, source_error = 0, None
+        with self._zf.open(zinfo, 'w') as dst:
+            while True:
+                try:
+                    chunk = source_file.read(COPY_CHUNK_SIZE)
+                except (OSError, zipfile.BadZipFile, zlib.error) as e:
+                    source_error = e
+                    break
+                if not chunk: break
+                copied += len(chunk)
+                digest.update(chunk)
+                dst.write(chunk)
+        if source_error is None and copied != file_size:
+            source_error = f"ukuran berubah saat disalin ({file_size} -> {copied} byte)"
+        if source_error is not None:
+            self._discard_member(zinfo)
+            raise _SourceReadError(source_error)
+        self._remember_checksum(digest.hexdigest())
+
+    def _discard_member(self, zinfo):
+        """
+        Membuang member yang baru saja ditulis; arsip kembali seperti sebelum
+        member itu ditambahkan. zipfile tidak punya API publik untuk ini, jadi
+        bila atribut internal yang dibutuhkan tidak ada, ZipError dilempar dan
+        add() membatalkan arsip.
+        """
+        zf = self._zf
+        if not all(hasattr(zf, name) for name in _ZIPFILE_STATE) or zf.infolist()[-1:] != [zinfo]:
+            raise ZipError(f"Member gagal {zinfo.filename} tidak dapat dibuang dari arsip")
+        zf.filelist.pop()
+        if zf.NameToInfo.get(zinfo.filename) is zinfo: del zf.NameToInfo[zinfo.filename]
+        zf.fp.seek(zinfo.header_offset)
+        zf.fp.truncate()
+        zf.start_dir = zinfo.header_offset
+
+    def _remember_checksum(self, sha256):
+        # CRC dan ukuran sudah dihitung zipfile saat menulis member terakhir.
+        zinfo = self._zf.infolist()[-1]
+        self.checksums[zinfo.filename] = MemberChecksum(zinfo.file_size, zinfo.CRC, sha256)
+
+    def _record(self, compress_type, size, cpu_start):
+        self.stats.cpu_seconds += time.thread_time() - cpu_start
+        self.stats.bytes_in += size
+        self.stats.bytes_out += self._zf.infolist()[-1].compress_size
+        if compress_type == zipfile.ZIP_STORED: self.stats.stored_count += 1
+        else: self.stats.deflated_count += 1
+        self._members_since_checkpoint += 1
+        self._bytes_since_checkpoint += self._zf.infolist()[-1].compress_size
+        if (self._members_since_checkpoint >= self.checkpoint_members
+                or self._bytes_since_checkpoint >= self.checkpoint_bytes):
+            self.checkpoint()
+
+    @property
+    def bytes_written(self):
+        """Ukuran data member yang sudah ditulis (belum termasuk central directory)."""
+        return self._zf.fp.tell()
+
+    def checkpoint(self):
+        """Memastikan semua member yang sudah ditulis benar-benar ada di disk."""
+        self._zf.fp.flush()
+        os.fsync(self._zf.fp.fileno())
+        self._members_since_checkpoint = 0
+        self._bytes_since_checkpoint = 0
+
+    def _write_checksum_manifest(self):
+        members = {name: {"size": c.size, "crc": c.crc, "sha256": c.sha256} for name, c in self.checksums.items()}
+        data = {"version": CHECKSUM_MANIFEST_VERSION, "members": members}
+        self._zf.writestr(CHECKSUM_MEMBER_NAME, json.dumps(data, ensure_ascii=False), compress_type=zipfile.ZIP_DEFLATED)
+
+    def close(self):
+        """
+        Menulis manifest checksum, menutup arsip, dan memindahkan file .tmp
+        ke path tujuan secara atomik.
+        """
+        try:
+            if self.checksums: self._write_checksum_manifest()
+            self._zf.close()
+            if self.temp_path.exists():
+                self.temp_path.replace(self.save_path)
+            logging.info(f"ZIP file berhasil dibuat: {self.save_path}")
+            logging.info(self.stats.summary())
+        except Exception as e:
+            self.abort()
+            logging.error(f"Terjadi kesalahan saat membuat file Zip: {e}")
+            raise ZipError(f"Terjadi kesalahan saat membuat file Zip: {e}")
+
+    def abort(self):
+        """Membatalkan penulisan dan menghapus file .tmp."""
+        self.aborted = True
+        try:
+            self._zf.close()
+        except Exception:
+            pass
+        if self.temp_path.exists():
+            try:
+                self.temp_path.unlink()
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+def save_zip(renamed_data, save_path, compression=None, max_part_bytes=None, max_part_members=None):
     """
     Menyimpan data file ke dalam sebuah arsip Zip dengan validasi
-    dan pembersihan nama file otomatis.
+    dan pembersihan nama file otomatis. Nilai dict boleh berupa bytes atau
+    path file sumber. Jika max_part_bytes/max_part_members diisi, arsip
+    dipecah menjadi beberapa bagian (lihat SplitZipWriter). Mengembalikan
+    CompressionStats.
     """
-    is_valid_path, path_error_msg = validate_zip_path(save_path)
-    if not is_valid_path:
-        raise ZipValidationError(f"Path tidak valid: {path_error_msg}")
-    
     is_valid_data, data_error_msg = validate_zip_data(renamed_data)
     if not is_valid_data:
         raise ZipValidationError(f"Data tidak valid: {data_error_msg}")
 
-    temp_path = Path(save_path).with_suffix('.tmp')
-    
-    try:
-        logging.info(f"Membuat ZIP file dengan {len(renamed_data)} file...")
-        
-        with zipfile.ZipFile(temp_path, 'w', zipfile.ZIP_DEFLATED) as zf:
-            for original_name, content_bytes in renamed_data.items():
-                safe_name = sanitize_filename(original_name)
-                
-                if original_name != safe_name:
-                    logging.warning(f"Nama file diubah demi keamanan: '{original_name}' -> '{safe_name}'")
-
-                if isinstance(content_bytes, bytes) and len(content_bytes) > 0:
-                    zf.writestr(safe_name, content_bytes)
-                else:
-                    logging.warning(f"File kosong atau konten tidak valid dilewati: {safe_name}")
-
-        if temp_path.exists():
-            temp_path.rename(save_path)
-        
-        logging.info(f"ZIP file berhasil dibuat: {save_path}")
+    logging.info(f"Membuat ZIP file dengan {len(renamed_data)} file...")
+    if max_part_bytes or max_part_members:
+        writer = SplitZipWriter(save_path, max_part_bytes, max_part_members, compression)
+    else:
+        writer = ZipStreamWriter(save_path, compression)
+    with writer:
+        for original_name, content_bytes in renamed_data.items():
+            writer.add(original_name, content_bytes)
+    return writer.stats
+
+class RollingZipWriter:
+    """
+    Menulis hasil ke serangkaian arsip ZIP di satu folder. Arsip aktif
+    difinalisasi (dan langsung bisa dibaca) setelah max_members file, atau
+    ketika roll() dipanggil, misalnya oleh watcher saat inbox sedang sepi.
+    Antarmukanya sama dengan ZipStreamWriter (add/close/abort).
+
+    File sumber yang gagal dibaca hanya menggagalkan file itu; arsip aktif
+    baru dibuang jika arsipnya sendiri rusak. finalized_count dan
+    discarded_count menghitung file di arsip yang sudah difinalisasi dan
+    yang ikut terbuang, sesuai urutan add(), agar pemanggil tahu kapan
+    sebuah file benar-benar aman.
+    """
+    def __init__(self, archive_dir, prefix="Hasil Rename", max_members=500, compression=None):
+        is_valid_path, path_error_msg = validate_output_dir(archive_dir)
+        if not is_valid_path:
+            raise ZipValidationError(f"Path tidak valid: {path_error_msg}")
+        if max_members < 1:
+            raise ZipValidationError("Jumlah file per arsip minimal 1")
+
+        self.archive_dir = Path(archive_dir)
+        self.prefix = sanitize_filename(prefix)
+        self.max_members = max_members
+        self.compression = compression or CompressionPolicy()
+        self.compression.validate()
+        self.file_count = 0
+        self.finalized_count = 0
+        self.discarded_count = 0
+        self.archives = []
+        self.stats = CompressionStats(policy=self.compression.mode)
+        self._current = None
+        self._current_names = set()
+
+    def _next_archive_path(self):
+        timestamp = time.strftime("%Y-%m-%d_%H-%M-%S")
+        for candidate in _candidate_names(f"{self.prefix} ({timestamp}).zip"):
+            path = self.archive_dir / candidate
+            if not path.exists() and not path.with_suffix('.tmp').exists(): return path
+
+    def add(self, original_name, content):
+        if self._current is None:
+            self._current = ZipStreamWriter(self._next_archive_path(), self.compression)
+            self._current_names = set()
+        # Nama harus unik di dalam satu arsip; antar arsip boleh sama.
+        for candidate in _candidate_names(sanitize_filename(original_name)):
+            if candidate not in self._current_names: break
+        try:
+            stored_name = self._current.add(candidate, content)
+        except ZipError:
+            # Jika arsip aktif sampai dibuang, file berikutnya masuk ke arsip baru.
+            if self._current.aborted: self._discard_current()
+            raise
+        if stored_name:
+            self._current_names.add(stored_name)
+            self.file_count += 1
+        if self._current.file_count >= self.max_members: self.roll()
+        return stored_name
+
+    def roll(self):
+        """Memfinalisasi arsip aktif (jika ada isinya) sehingga langsung bisa dipakai."""
+        if self._current is None: return None
+        current, self._current = self._current, None
+        if current.file_count == 0:
+            current.abort()
+            return None
+        try:
+            current.close()
+        except ZipError:
+            self.discarded_count += current.file_count
+            raise
+        self.finalized_count += current.file_count
+        self.stats.merge(current.stats)
+        self.archives.append(current.save_path)
+        return current.save_path
+
+    def _discard_current(self):
+        self._current.abort()
+        self.discarded_count += self._current.file_count
+        self._current = None
 
+    def close(self):
+        self.roll()
+        logging.info(f"{self.file_count} file ditulis ke {len(self.archives)} arsip di {self.archive_dir}")
+
+    def abort(self):
+        if self._current is not None: self._discard_current()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+SPLIT_MANIFEST_VERSION = 1
+# Perkiraan byte per member di luar datanya: header lokal, entri central
+# directory (keduanya memuat nama), dan extra ZIP64.
+_MEMBER_OVERHEAD = 30 + 46 + 2 * 20
+_END_RECORD_SIZE = 22 + 56 + 20
+
+def split_part_path(save_path, number):
+    """'Hasil.zip' -> 'Hasil_part001.zip'."""
+    save_path = Path(save_path)
+    return save_path.with_name(f"{save_path.stem}_part{number:03d}.zip")
+
+def split_manifest_path(save_path):
+    """'Hasil.zip' -> 'Hasil_parts.json', ringkasan nama file per bagian."""
+    save_path = Path(save_path)
+    return save_path.with_name(f"{save_path.stem}_parts.json")
+
+class SplitZipWriter:
+    """
+    Menulis satu output ZIP sebagai beberapa bagian 'Nama_part001.zip',
+    'Nama_part002.zip', ... yang masing-masing dibatasi max_bytes dan/atau
+    max_members. Bagian aktif difinalisasi begitu penuh, sehingga bagian
+    yang sudah selesai bisa langsung diunggah atau diverifikasi selagi batch
+    berjalan. Nama file unik di seluruh bagian. Setelah setiap bagian
+    selesai, manifest 'Nama_parts.json' ditulis ulang dengan daftar nama
+    file per bagian.
+
+    Batas ukuran memakai perkiraan (ukuran sumber + overhead per member)
+    sebelum file ditulis; file yang sendirian sudah melebihi batas ditulis
+    ke bagiannya sendiri. Dengan resume_names (nama yang tercatat selesai di
+    jurnal job), bagian yang sudah selesai dipertahankan dan bagian yang
+    terputus dipulihkan, sama seperti ZipStreamWriter.
+    Antarmukanya sama dengan ZipStreamWriter (add/close/abort).
+    """
+    def __init__(self, save_path, max_bytes=None, max_members=None, compression=None, resume_names=None):
+        is_valid_path, path_error_msg = validate_zip_path(save_path)
+        if not is_valid_path:
+            raise ZipValidationError(f"Path tidak valid: {path_error_msg}")
+        if not max_bytes and not max_members:
+            raise ZipValidationError("Batas ukuran atau jumlah file per bagian harus diisi")
+        if (max_bytes is not None and max_bytes < 1) or (max_members is not None and max_members < 1):
+            raise ZipValidationError("Batas per bagian minimal 1")
+
+        self.save_path = Path(save_path)
+        self.manifest_path = split_manifest_path(save_path)
+        self.max_bytes = max_bytes
+        self.max_members = max_members
+        self.compression = compression or CompressionPolicy()
+        self.compression.validate()
+        self.file_count = 0
+        self.aborted = False
+        self.parts = []
+        self.existing_names = set()
+        self.stats = CompressionStats(policy=self.compression.mode)
+        self._resume_names = None if resume_names is None else set(resume_names)
+        self._current = None
+        self._current_names = []
+        self._directory_bytes = 0
+        if self._resume_names is not None:
+            self._load_finished_parts()
+            # Bagian yang terputus dipulihkan sekarang agar isinya sudah masuk existing_names.
+            if split_part_path(self.save_path, len(self.parts) + 1).with_suffix('.tmp').exists(): self._open_part()
+
+    def _load_finished_parts(self):
+        """Mempertahankan bagian dari run sebelumnya yang utuh dan seluruh isinya tercatat selesai."""
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                parts = json.load(f).get("parts", [])
+        except (OSError, ValueError, AttributeError):
+            return
+        for part in parts:
+            path = self.save_path.with_name(part.get("file", ""))
+            members = part.get("members", [])
+            if not path.is_file() or not set(members) <= self._resume_names: break
+            self.parts.append(part)
+            self.existing_names.update(members)
+        logging.info(f"{len(self.parts)} bagian arsip dari run sebelumnya dipertahankan")
+
+    def _open_part(self):
+        path = split_part_path(self.save_path, len(self.parts) + 1)
+        self._current = ZipStreamWriter(path, self.compression, self._resume_names)
+        self._current_names = sorted(self._current.existing_names)
+        self._directory_bytes = sum(_MEMBER_OVERHEAD + len(name.encode('utf-8')) for name in self._current_names)
+        self.existing_names.update(self._current_names)
+
+    def _is_full(self, next_size, next_name):
+        if self._current is None or not self._current_names: return False
+        if self.max_members and len(self._current_names) >= self.max_members: return True
+        if not self.max_bytes: return False
+        # Deflate bisa sedikit memperbesar data yang tidak bisa dikompres.
+        estimate = (self._current.bytes_written + self._directory_bytes + _END_RECORD_SIZE
+                    + next_size + next_size // 1000 + _MEMBER_OVERHEAD + len(next_name.encode('utf-8')))
+        return estimate > self.max_bytes
+
+    def add(self, original_name, content):
+        for candidate in _candidate_names(sanitize_filename(original_name)):
+            if candidate not in self.existing_names: break
+        if self._is_full(_source_size(content), candidate): self.roll()
+        if self._current is None: self._open_part()
+        try:
+            stored_name = self._current.add(candidate, content)
+        except ZipError:
+            if self._current.aborted: self.abort()
+            raise
+        if stored_name:
+            self._current_names.append(stored_name)
+            self._directory_bytes += _MEMBER_OVERHEAD + len(stored_name.encode('utf-8'))
+            self.existing_names.add(stored_name)
+            self.file_count += 1
+        if self.max_members and len(self._current_names) >= self.max_members: self.roll()
+        return stored_name
+
+    def roll(self):
+        """Memfinalisasi bagian aktif (jika ada isinya) dan memperbarui manifest."""
+        if self._current is None: return None
+        current, self._current = self._current, None
+        if not self._current_names:
+            current.abort()
+            return None
+        try:
+            current.close()
+        except ZipError:
+            # Isi bagian ini hilang; jangan sampai tetap terhitung tersimpan.
+            self.aborted = True
+            self.existing_names.difference_update(self._current_names)
+            self.file_count -= len(self._current_names)
+            self._current_names = []
+            raise
+        self.stats.merge(current.stats)
+        self.parts.append({"file": current.save_path.name, "count": len(self._current_names),
+                           "bytes": current.save_path.stat().st_size, "members": self._current_names})
+        self._current_names = []
+        try:
+            self._write_manifest(complete=False)
+        except ZipError:
+            self.aborted = True
+            raise
+        logging.info(f"Bagian arsip selesai: {current.save_path}")
+        return current.save_path
+
+    def _write_manifest(self, complete):
+        data = {"version": SPLIT_MANIFEST_VERSION, "output": self.save_path.name, "complete": complete,
+                "total": sum(part["count"] for part in self.parts), "parts": self.parts}
+        temp_path = self.manifest_path.with_name(self.manifest_path.name + ".tmp")
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=1)
+            temp_path.replace(self.manifest_path)
+        except OSError as e:
+            logging.error(f"Gagal menyimpan manifest arsip: {e}")
+            raise ZipError(f"Gagal menyimpan manifest arsip: {e}")
+
+    def close(self):
+        self.roll()
+        self._write_manifest(complete=True)
+        total = sum(part["count"] for part in self.parts)
+        logging.info(f"{total} file di {len(self.parts)} bagian arsip: {self.manifest_path}")
+        logging.info(self.stats.summary())
+
+    def abort(self):
+        """Membuang bagian aktif; bagian yang sudah selesai tetap ada dan tercatat di manifest."""
+        self.aborted = True
+        if self._current is not None:
+            self._current.abort()
+            self._current = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+@dataclass
+class DirectoryStats:
+    """Ringkasan cara file ditempatkan ke folder output."""
+    linked_count: int = 0
+    moved_count: int = 0
+    copied_count: int = 0
+    bytes_copied: int = 0
+
+    def summary(self):
+        return (f"Output folder: {self.linked_count} hardlink, {self.moved_count} dipindah, "
+                f"{self.copied_count} disalin ({self.bytes_copied / 1024:.1f} KB)")
+
+def validate_output_dir(target_dir):
+    """Validates the output directory (dibuat jika belum ada)."""
+    try:
+        path_obj = Path(target_dir)
+        if path_obj.exists() and not path_obj.is_dir(): return False, f"Path bukan direktori: {path_obj}"
+        if not path_obj.exists():
+            if not path_obj.parent.exists(): return False, f"Direktori tidak ditemukan: {path_obj.parent}"
+            path_obj.mkdir()
+        if not os.access(path_obj, os.W_OK): return False, f"Tidak ada izin menulis di direktori: {path_obj}"
+        return True, ""
     except Exception as e:
-        if temp_path.exists():
+        return False, f"Error validasi path: {str(e)}"
+
+def _candidate_names(name):
+    """Nama asli, lalu nama_1, nama_2, ... untuk menghindari tabrakan dengan file yang sudah ada."""
+    yield name
+    stem, dot, ext = name.rpartition('.')
+    if not dot: stem, ext = name, ""
+    counter = 1
+    while True:
+        yield f"{stem}_{counter}.{ext}" if ext else f"{stem}_{counter}"
+        counter += 1
+
+def _place_no_clobber(src, dst):
+    """
+    Menempatkan src di dst tanpa pernah menimpa file yang sudah ada.
+    Memakai os.link (atomik, gagal dengan FileExistsError); jika filesystem
+    tidak mendukung hardlink, jatuh ke pengecekan + rename.
+    """
+    try:
+        os.link(src, dst)
+        return True
+    except FileExistsError:
+        raise
+    except OSError as e:
+        if e.errno not in (errno.EPERM, errno.EXDEV, errno.EMLINK, errno.ENOTSUP, errno.EOPNOTSUPP):
+            raise
+    if os.path.lexists(dst): raise FileExistsError(errno.EEXIST, "File sudah ada", dst)
+    return False
+
+def _copy_file_fast(src_file, dst_file):
+    """
+    Menyalin isi file lewat jalur cepat kernel: os.copy_file_range (bisa
+    reflink / server-side copy), lalu os.sendfile, dan terakhir copyfileobj.
+    Isi file tidak pernah dimuat utuh ke memori Python.
+    """
+    src_fd, dst_fd = src_file.fileno(), dst_file.fileno()
+    size = os.fstat(src_fd).st_size
+    offset = 0
+    for fast_copy in (_copy_range_chunk, _sendfile_chunk):
+        try:
+            while offset < size:
+                copied = fast_copy(src_fd, dst_fd, offset, min(COPY_CHUNK_SIZE * 8, size - offset))
+                if copied == 0: break
+                offset += copied
+            if offset >= size: return size
+        except (OSError, AttributeError) as e:
+            logging.debug(f"Jalur salin cepat tidak tersedia ({fast_copy.__name__}): {e}")
+    src_file.seek(offset)
+    dst_file.seek(offset)
+    shutil.copyfileobj(src_file, dst_file, COPY_CHUNK_SIZE)
+    return size
+
+def _copy_range_chunk(src_fd, dst_fd, offset, count):
+    return os.copy_file_range(src_fd, dst_fd, count, offset, offset)
+
+def _sendfile_chunk(src_fd, dst_fd, offset, count):
+    os.lseek(dst_fd, offset, os.SEEK_SET)
+    return os.sendfile(dst_fd, src_fd, offset, count)
+
+class DirectoryWriter:
+    """
+    Output ke folder sebagai alternatif ZIP, dengan antarmuka yang sama
+    seperti ZipStreamWriter (add/close/abort).
+
+    method:
+    - auto: hardlink jika sumber berada di filesystem yang sama, selain itu salin.
+    - link: selalu coba hardlink, jatuh ke salin lintas filesystem.
+    - move: pindahkan (rename atomik) file sumber, jatuh ke salin lintas filesystem.
+    - copy: selalu salin lewat jalur cepat kernel.
+    Nama yang bertabrakan dengan file yang sudah ada diberi akhiran _1, _2, ...
+    """
+    def __init__(self, target_dir, method=OUTPUT_AUTO):
+        if method not in OUTPUT_METHODS:
+            raise ZipValidationError(f"Metode output tidak dikenal: {method}")
+        is_valid_path, path_error_msg = validate_output_dir(target_dir)
+        if not is_valid_path:
+            raise ZipValidationError(f"Path tidak valid: {path_error_msg}")
+
+        self.target_dir = Path(target_dir)
+        self.method = method
+        self.file_count = 0
+        self.stats = DirectoryStats()
+        self._target_dev = os.stat(self.target_dir).st_dev
+
+    def add(self, original_name, content):
+        """Menempatkan satu file di folder output. Mengembalikan nama akhirnya, atau None jika dilewati."""
+        safe_name = sanitize_filename(original_name)
+
+        if original_name != safe_name:
+            logging.warning(f"Nama file diubah demi keamanan: '{original_name}' -> '{safe_name}'")
+
+        source_size = _source_size(content)
+        if not source_size:
+            logging.warning(f"File kosong atau konten tidak valid dilewati: {safe_name}")
+            return None
+
+        try:
+            if isinstance(content, bytes):
+                final_name = self._write_bytes(safe_name, content)
+            elif self.method != OUTPUT_COPY and os.stat(content).st_dev == self._target_dev:
+                final_name = self._link_or_move(safe_name, content)
+            else:
+                final_name = self._copy_file(safe_name, content)
+        except Exception as e:
+            logging.error(f"Terjadi kesalahan saat menulis ke folder output: {e}")
+            raise ZipError(f"Terjadi kesalahan saat menulis ke folder output: {e}")
+        self.file_count += 1
+        return final_name
+
+    def _claim(self, safe_name, src):
+        for candidate in _candidate_names(safe_name):
+            dst = self.target_dir / candidate
             try:
-                temp_path.unlink()
-            except OSError:
-                pass
-        logging.error(f"Terjadi kesalahan saat membuat file Zip: {e}")
-        raise ZipError(f"Terjadi kesalahan saat membuat file Zip: {e}")
+                linked = _place_no_clobber(src, dst)
+            except FileExistsError:
+                continue
+            return candidate, dst, linked
+
+    def _link_or_move(self, safe_name, file_path):
+        final_name, dst, linked = self._claim(safe_name, file_path)
+        if self.method == OUTPUT_MOVE:
+            if linked: os.unlink(file_path)
+            else: os.replace(file_path, dst)
+            self.stats.moved_count += 1
+        elif linked:
+            self.stats.linked_count += 1
+        else:
+            # Filesystem tanpa hardlink: salin lewat file sementara agar nama
+            # akhir tidak pernah berisi file setengah jadi.
+            return self._copy_file(safe_name, file_path)
+        return final_name
+
+    def _copy_file(self, safe_name, file_path):
+        fd, temp_name = tempfile.mkstemp(prefix=".", suffix=".tmp", dir=self.target_dir)
+        try:
+            with open(file_path, 'rb') as src, os.fdopen(fd, 'wb') as out:
+                copied = _copy_file_fast(src, out)
+            final_name = self._commit_temp(safe_name, temp_name)
+        except BaseException:
+            if os.path.exists(temp_name): os.unlink(temp_name)
+            raise
+        if self.method == OUTPUT_MOVE: os.unlink(file_path)
+        self.stats.copied_count += 1
+        self.stats.bytes_copied += copied
+        return final_name
+
+    def _write_bytes(self, safe_name, content_bytes):
+        fd, temp_name = tempfile.mkstemp(prefix=".", suffix=".tmp", dir=self.target_dir)
+        try:
+            with os.fdopen(fd, 'wb') as out: out.write(content_bytes)
+            final_name = self._commit_temp(safe_name, temp_name)
+        except BaseException:
+            if os.path.exists(temp_name): os.unlink(temp_name)
+            raise
+        self.stats.copied_count += 1
+        self.stats.bytes_copied += len(content_bytes)
+        return final_name
+
+    def _commit_temp(self, safe_name, temp_name):
+        """Memberi nama akhir pada file sementara yang sudah lengkap."""
+        final_name, dst, linked = self._claim(safe_name, temp_name)
+        if linked: os.unlink(temp_name)
+        else: os.replace(temp_name, dst)
+        return final_name
 
-def verify_zip_file(zip_path):
-    """Verifies the integrity of a ZIP file."""
+    def close(self):
+        logging.info(f"{self.file_count} file ditulis ke folder: {self.target_dir}")
+        logging.info(self.stats.summary())
+
+    def abort(self):
+        # File yang sudah ditempatkan adalah file utuh; dibiarkan di folder output.
+        logging.info(f"Penulisan ke folder dihentikan setelah {self.file_count} file: {self.target_dir}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+def save_to_directory(renamed_data, target_dir, method=OUTPUT_AUTO):
+    """
+    Menulis file hasil rename ke sebuah folder, bukan ke arsip ZIP.
+    Nilai dict boleh berupa bytes atau path file sumber. Mengembalikan
+    dict nama yang diminta -> nama akhir di folder.
+    """
+    is_valid_data, data_error_msg = validate_zip_data(renamed_data)
+    if not is_valid_data:
+        raise ZipValidationError(f"Data tidak valid: {data_error_msg}")
+
+    logging.info(f"Menulis {len(renamed_data)} file ke folder {target_dir}...")
+    placed = {}
+    with DirectoryWriter(target_dir, method) as writer:
+        for original_name, content in renamed_data.items():
+            final_name = writer.add(original_name, content)
+            if final_name: placed[original_name] = final_name
+    return placed
+
+def read_checksum_manifest(zf):
+    """{nama: MemberChecksum} dari manifest checksum di dalam arsip, atau None jika tidak ada/rusak."""
+    try:
+        data = json.loads(zf.read(CHECKSUM_MEMBER_NAME))
+        return {name: MemberChecksum(entry["size"], entry["crc"], entry.get("sha256"))
+                for name, entry in data["members"].items()}
+    except KeyError:
+        return None
+    except (ValueError, TypeError, AttributeError, zipfile.BadZipFile, zlib.error) as e:
+        logging.warning(f"Manifest checksum tidak bisa dibaca: {e}")
+        return None
+
+def _check_directory(infos, checksums):
+    """Mencocokkan central directory dengan manifest checksum tanpa membaca data member."""
+    names = {zinfo.filename for zinfo in infos}
+    missing = sorted(set(checksums) - names)
+    if missing: return f"File hilang dari arsip: {missing[0]}"
+    for zinfo in infos:
+        expected = checksums.get(zinfo.filename)
+        if expected is None: return f"File tidak tercatat di manifest: {zinfo.filename}"
+        if (zinfo.file_size, zinfo.CRC) != (expected.size, expected.crc): return f"Checksum tidak cocok: {zinfo.filename}"
+    return ""
+
+def _verify_members(zip_path, infos, checksums):
+    """
+    Membaca ulang data sekelompok member, berurutan menurut offset, dan
+    mencocokkan CRC serta SHA-256-nya. Mengembalikan nama member rusak
+    pertama, atau None.
+    """
+    with open(zip_path, 'rb') as f:
+        for zinfo in infos:
+            f.seek(zinfo.header_offset)
+            header = f.read(_LOCAL_HEADER.size)
+            if len(header) != _LOCAL_HEADER.size: return zinfo.filename
+            fields = _LOCAL_HEADER.unpack(header)
+            if fields[0] != _LOCAL_SIGNATURE: return zinfo.filename
+            if zinfo.compress_type not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED): return zinfo.filename
+            data_offset = zinfo.header_offset + _LOCAL_HEADER.size + fields[-2] + fields[-1]
+            expected = checksums.get(zinfo.filename)
+            digest = hashlib.sha256() if expected is not None and expected.sha256 else None
+            result = _read_member_data(f, data_offset, zinfo.compress_size, zinfo.compress_type, digest)
+            if result != (zinfo.file_size, zinfo.CRC): return zinfo.filename
+            if digest is not None and digest.hexdigest() != expected.sha256: return zinfo.filename
+    return None
+
+def verify_zip_file(zip_path, full=False, workers=VERIFY_WORKERS):
+    """
+    Memverifikasi arsip ZIP.
+
+    Default-nya cepat: central directory (nama, ukuran, CRC) dicocokkan
+    dengan manifest checksum yang ditulis ZipStreamWriter, tanpa membaca
+    data member. full=True juga membaca ulang data setiap member dan
+    mencocokkan CRC serta SHA-256-nya; member dibagi per rentang offset ke
+    beberapa thread, masing-masing dengan file handle sendiri. Arsip tanpa
+    manifest selalu diverifikasi penuh (CRC saja). Mengembalikan (ok, pesan,
+    jumlah file); manifest checksum tidak ikut dihitung.
+    """
     try:
         path_obj = Path(zip_path)
         if not path_obj.exists(): return False, "File ZIP tidak ditemukan", 0
         with zipfile.ZipFile(zip_path, 'r') as zf:
-            bad_files = zf.testzip()
-            if bad_files: return False, f"File ZIP rusak: {bad_files}", 0
-            return True, "", len(zf.namelist())
+            checksums = read_checksum_manifest(zf)
+            infos = [zinfo for zinfo in zf.infolist() if zinfo.filename != CHECKSUM_MEMBER_NAME]
+        if checksums is not None:
+            problem = _check_directory(infos, checksums)
+            if problem: return False, f"File ZIP rusak: {problem}", 0
+        if full or checksums is None:
+            infos.sort(key=lambda zinfo: zinfo.header_offset)
+            workers = max(1, min(workers, len(infos)))
+            step = -(-len(infos) // workers) if infos else 1
+            groups = [infos[i:i + step] for i in range(0, len(infos), step)]
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                bad_files = [name for name in pool.map(lambda group: _verify_members(zip_path, group, checksums or {}),
+                                                       groups) if name]
+            if bad_files: return False, f"File ZIP rusak: {bad_files[0]}", 0
+        return True, "", len(infos)
     except Exception as e:
-        return False, f"Error verifikasi ZIP: {e}", 0
\ No newline at end of file
+        return False, f"Error verifikasi ZIP: {e}", 0
+
+def _snapshot_unfinished(writer):
+    """
+    Untuk pengujian: meniru crash setelah checkpoint. Isi .tmp disalin,
+    writer dibatalkan (.tmp dihapus), lalu salinannya dikembalikan tanpa
+    central directory, seperti yang tertinggal di disk setelah proses mati.
+    """
+    writer.checkpoint()
+    data = writer.temp_path.read_bytes()
+    offsets = [zinfo.header_offset for zinfo in writer._zf.infolist()]
+    writer.abort()
+    writer.temp_path.write_bytes(data)
+    return offsets
+
+def test_recover_zip():
+    """
+    Arsip .tmp yang terpotong di tengah member dipulihkan sampai member
+    utuh terakhir, dan keep= memotong arsip di member pertama yang tidak
+    tercatat di jurnal.
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_dir = Path(temp_dir)
+        source = temp_dir / "sumber.pdf"
+        source.write_bytes(os.urandom(50_000))
+        writer = ZipStreamWriter(temp_dir / "hasil.zip")
+        names = [writer.add("A.pdf", b"%PDF-A " * 2000), writer.add("B.pdf", str(source)),
+                 writer.add("C.pdf", os.urandom(20_000)), writer.add("D.pdf", b"%PDF-D " * 10)]
+        offsets = _snapshot_unfinished(writer)
+
+        # Potong di tengah data member ketiga.
+        with open(writer.temp_path, 'r+b') as f: f.truncate(offsets[2] + _LOCAL_HEADER.size + 5 + 1000)
+        recovered = recover_zip(writer.temp_path, temp_dir / "pulih.zip")
+        assert recovered == names[:2], f"Hasil pemulihan salah: {recovered}"
+        with zipfile.ZipFile(temp_dir / "pulih.zip") as zf:
+            assert zf.testzip() is None, "Arsip hasil pemulihan rusak"
+            assert zf.read("B.pdf") == source.read_bytes(), "Isi member berbeda setelah pemulihan"
+
+        # B belum tercatat di jurnal: semua member setelahnya ikut dibuang.
+        recovered = recover_zip(writer.temp_path, temp_dir / "sebagian.zip", keep={"A.pdf", "C.pdf"})
+        assert recovered == ["A.pdf"], f"keep tidak memotong di member pertama yang tidak tercatat: {recovered}"
+    print("Pemulihan ZIP OK: member utuh diselamatkan, keep= memotong di member pertama yang tidak tercatat.")
+
+def test_resume_writer():
+    """ZipStreamWriter dengan resume_names menambah ke .tmp yang dipulihkan, bukan menimpanya."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        save_path = Path(temp_dir) / "hasil.zip"
+        writer = ZipStreamWriter(save_path)
+        for name in ("A.pdf", "B.pdf", "C.pdf"): writer.add(name, f"%PDF {name}".encode() * 100)
+        _snapshot_unfinished(writer)
+
+        # C.pdf belum sempat dicatat di jurnal sebelum crash.
+        writer = ZipStreamWriter(save_path, resume_names=["A.pdf", "B.pdf"])
+        assert writer.existing_names == {"A.pdf", "B.pdf"}, f"Member yang dipertahankan salah: {writer.existing_names}"
+        writer.add("D.pdf", b"%PDF D" * 100)
+        writer.close()
+        with zipfile.ZipFile(save_path) as zf:
+            names = [name for name in zf.namelist() if name != CHECKSUM_MEMBER_NAME]
+            assert names == ["A.pdf", "B.pdf", "D.pdf"], f"Arsip lanjutan salah: {names}"
+            assert zf.read("A.pdf") == b"%PDF A.pdf" * 100, "Member lama berubah setelah resume"
+        ok, message, count = verify_zip_file(save_path, full=True)
+        assert ok and count == 3, message
+    print("Resume ZipStreamWriter OK: member tercatat dipertahankan dan file baru ditambahkan.")
+
+def test_discard_failed_member():
+    """Member yang sumbernya rusak dibuang tanpa merusak arsip; tanpa atribut internal zipfile, arsip dibatalkan."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_dir = Path(temp_dir)
+        source_path = temp_dir / "sumber.zip"
+        with zipfile.ZipFile(source_path, 'w', zipfile.ZIP_DEFLATED) as zf: zf.writestr("Rusak.pdf", b"%PDF rusak " * 500)
+        with zipfile.ZipFile(source_path) as zf: data_offset = zf.getinfo("Rusak.pdf").header_offset + 30 + len("Rusak.pdf")
+        with open(source_path, 'r+b') as f:
+            f.seek(data_offset + 10)
+            f.write(b"\xff" * 8)
+
+        save_path = temp_dir / "Hasil.zip"
+        writer = ZipStreamWriter(save_path)
+        writer.add("A.pdf", b"%PDF a" * 50)
+        with zipfile.ZipFile(source_path) as source_zip:
+            try:
+                writer.copy_member(source_zip, "Rusak.pdf")
+                assert False, "Sumber rusak tidak dilaporkan"
+            except ZipError:
+                pass
+        assert not writer.aborted, "Arsip dibatalkan padahal hanya satu sumber yang rusak"
+        writer.add("B.pdf", b"%PDF b" * 50)
+        writer.close()
+        ok, message, count = verify_zip_file(save_path, full=True)
+        assert ok and count == 2, f"Arsip rusak setelah member dibuang: {message}"
+        with zipfile.ZipFile(save_path) as zf:
+            assert "Rusak.pdf" not in zf.namelist(), "Member gagal masih ada di arsip"
+
+        # Meniru versi zipfile yang tidak punya salah satu atribut internal.
+        global _ZIPFILE_STATE
+        saved_state, _ZIPFILE_STATE = _ZIPFILE_STATE, _ZIPFILE_STATE + ("_atribut_tidak_ada",)
+        writer = ZipStreamWriter(temp_dir / "Tanpa.zip")
+        writer.add("A.pdf", b"%PDF a" * 50)
+        try:
+            with zipfile.ZipFile(source_path) as source_zip:
+                writer.copy_member(source_zip, "Rusak.pdf")
+            assert False, "Sumber rusak tidak dilaporkan"
+        except ZipError:
+            pass
+        finally:
+            _ZIPFILE_STATE = saved_state
+        assert writer.aborted and not writer.temp_path.exists(), "Arsip tidak dibatalkan saat member tidak bisa dibuang"
+    print("Pembuangan member gagal OK: arsip tetap valid, atau dibatalkan jika zipfile tidak mendukung.")
+
+def test_split_zip_writer():
+    """Pembagian per jumlah file, nama unik lintas bagian, manifest, dan resume bagian yang terputus."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        save_path = Path(temp_dir) / "Hasil.zip"
+        writer = SplitZipWriter(save_path, max_members=2)
+        stored = [writer.add(name, f"%PDF {i}".encode() * 50) for i, name in enumerate(["A.pdf", "B.pdf", "A.pdf"])]
+        assert stored == ["A.pdf", "B.pdf", "A_1.pdf"], f"Nama tidak unik lintas bagian: {stored}"
+        _snapshot_unfinished(writer._current)
+
+        writer = SplitZipWriter(save_path, max_members=2, resume_names=stored)
+        assert len(writer.parts) == 1 and writer.existing_names == set(stored), "Bagian lama tidak dipertahankan"
+        stored += [writer.add(name, b"%PDF baru" * 50) for name in ("C.pdf", "A.pdf")]
+        writer.close()
+        with open(split_manifest_path(save_path), encoding='utf-8') as f: manifest = json.load(f)
+        assert manifest["complete"] and manifest["total"] == 5, f"Manifest salah: {manifest}"
+        members = [name for part in manifest["parts"] for name in part["members"]]
+        assert members == ["A.pdf", "B.pdf", "A_1.pdf", "C.pdf", "A_2.pdf"], f"Isi bagian salah: {members}"
+        for part in manifest["parts"]:
+            ok, message, count = verify_zip_file(save_path.with_name(part["file"]), full=True)
+            assert ok and count == part["count"], f"{part['file']}: {message}"
+    print(f"SplitZipWriter OK: {len(manifest['parts'])} bagian, {manifest['total']} file.")
+
+def test_split_zip_writer_failed_close():
+    """Bagian yang gagal difinalisasi menghentikan batch dan isinya tidak terhitung tersimpan."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        writer = SplitZipWriter(Path(temp_dir) / "Hasil.zip", max_members=2)
+        writer.add("A.pdf", b"%PDF a" * 50)
+        part = writer._current
+
+        def failing_close():
+            part.abort()
+            raise ZipError("disk penuh")
+        part.close = failing_close
+        try:
+            writer.add("B.pdf", b"%PDF b" * 50)
+            assert False, "Kegagalan finalisasi bagian tidak dilaporkan"
+        except ZipError:
+            pass
+        assert writer.aborted, "Writer tidak ditandai batal setelah bagian gagal ditutup"
+        assert writer.file_count == 0 and not writer.existing_names, \
+            f"File yang hilang masih terhitung: {writer.file_count}, {writer.existing_names}"
+        assert not writer.parts and not list(Path(temp_dir).glob("*_part*.zip")), "Bagian rusak tercatat"
+    print("SplitZipWriter gagal tutup OK: batch dihentikan, tidak ada file terhitung ganda.")
+
+def test_verify_zip_file():
+    """Verifikasi cepat dan penuh, data member yang rusak, dan arsip tanpa manifest checksum."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        save_path = Path(temp_dir) / "hasil.zip"
+        with ZipStreamWriter(save_path) as writer:
+            for i in range(8): writer.add(f"F{i}.pdf", os.urandom(30_000) if i % 2 else b"%PDF teks " * 3000)
+        assert verify_zip_file(save_path)[:2] == (True, ""), "Verifikasi cepat gagal pada arsip utuh"
+        assert verify_zip_file(save_path, full=True, workers=3) == (True, "", 8), "Verifikasi penuh gagal pada arsip utuh"
+
+        with zipfile.ZipFile(save_path) as zf: target = zf.getinfo("F5.pdf")
+        with open(save_path, 'r+b') as f:
+            f.seek(target.header_offset + _LOCAL_HEADER.size + len("F5.pdf") + 100)
+            byte = f.read(1)
+            f.seek(-1, os.SEEK_CUR)
+            f.write(bytes([byte[0] ^ 0xFF]))
+        # Central directory tidak berubah, jadi hanya verifikasi penuh yang bisa menemukannya.
+        assert verify_zip_file(save_path)[0], "Verifikasi cepat seharusnya tidak membaca data member"
+        ok, message, _ = verify_zip_file(save_path, full=True, workers=3)
+        assert not ok and "F5.pdf" in message, f"Member rusak tidak terdeteksi: {message}"
+
+        plain_path = Path(temp_dir) / "biasa.zip"
+        with zipfile.ZipFile(plain_path, 'w', zipfile.ZIP_DEFLATED) as zf: zf.writestr("X.pdf", b"%PDF x" * 100)
+        assert verify_zip_file(plain_path) == (True, "", 1), "Arsip tanpa manifest gagal diverifikasi"
+    print("verify_zip_file OK: arsip utuh lolos, member rusak terdeteksi pada verifikasi penuh.")
+
+if __name__ == "__main__":
+    # Jalankan pengujian jika file ini dieksekusi
+    test_recover_zip()
+    test_resume_writer()
+    test_discard_failed_member()
+    test_split_zip_writer()
+    test_split_zip_writer_failed_close()
+    test_verify_zip_file()